@@ -1,12 +1,49 @@
 import streamlit as st
-import sqlite3
 import os
 from datetime import datetime
-import PyPDF2
-import io
-import hashlib
-import requests
 import json
+import sqlite3
+import time
+import biblioteca
+from biblioteca import (
+    init_database, obter_cache_consultas, obter_cache_tokens, chave_conta_servico,
+    obter_estatisticas_cache_google_books, obter_capas, pasta_uploads, limpar_uploads_antigos,
+    carregar_pdf, localizar_pdf, migrar_pdfs_para_subpastas, verificar_integridade, indexar_conteudo_pdf,
+    reindexar_conteudo, buscar_conteudo, procurar_duplicatas, listar_pares_duplicados,
+    calcular_assinaturas_pendentes, importar_em_lote, buscar_livros_pagina, contar_facetas, normalizar_facetas,
+    deletar_livro, atualizar_livro, obter_estatisticas, obter_livros_por_categoria, obter_livros_por_ano,
+    livros_incompletos, iniciar_servidor_pdfs, gerar_link_pdf, exportar_livros, importar_livros, fazer_backup,
+    arquivar_pdfs, sincronizar_pasta, iniciar_sincronizacao_periodica, selecionar_biblioteca, criar_biblioteca,
+    nome_biblioteca_atual, obter_registro_bibliotecas
+)
+from ingestao import gravar_temporario_com_hash, executar_com_limites
+import duplicatas
+import enriquecimento
+import metricas
+
+# Tamanho máximo de um PDF enviado pelo botão de download (memória por download)
+LIMITE_DOWNLOAD_MB = int(os.environ.get('BIBLIOTECA_LIMITE_DOWNLOAD_MB', '200'))
+
+# Servidor de PDFs (Range/ETag, links assinados): BIBLIOTECA_PORTA_PDFS o inicia junto com o app e
+# BIBLIOTECA_URL_PDFS é o endereço usado nos links (ex.: um `python servidor_pdfs.py` separado)
+PORTA_SERVIDOR_PDFS = os.environ.get('BIBLIOTECA_PORTA_PDFS')
+URL_SERVIDOR_PDFS = os.environ.get('BIBLIOTECA_URL_PDFS') or (
+    f'http://localhost:{PORTA_SERVIDOR_PDFS}' if PORTA_SERVIDOR_PDFS else None
+)
+
+# Pasta monitorada: BIBLIOTECA_PASTA_MONITORADA é sincronizada em segundo plano a cada
+# BIBLIOTECA_INTERVALO_SINCRONIZACAO segundos
+PASTA_MONITORADA = os.environ.get('BIBLIOTECA_PASTA_MONITORADA')
+INTERVALO_SINCRONIZACAO = int(os.environ.get('BIBLIOTECA_INTERVALO_SINCRONIZACAO', '60'))
+
+# Modo multiusuário: com BIBLIOTECA_MULTIUSUARIO cada leitor usa a biblioteca do endereço
+# (?biblioteca=<nome>), em bibliotecas/<nome>/; as conexões abertas são compartilhadas entre as sessões
+MULTIUSUARIO = bool(os.environ.get('BIBLIOTECA_MULTIUSUARIO'))
+
+# Só as bibliotecas já criadas (cli.py libraries --criar) são abertas; com BIBLIOTECA_BIBLIOTECAS_PERMITIDAS
+# (nomes separados por vírgula) só essas, criadas no primeiro acesso
+BIBLIOTECAS_PERMITIDAS = {nome.strip() for nome in os.environ.get('BIBLIOTECA_BIBLIOTECAS_PERMITIDAS', '').split(',')
+                          if nome.strip()}
 
 # Configuração da página
 st.set_page_config(
@@ -15,56 +52,15 @@ st.set_page_config(
     layout="wide"
 )
 
-# Inicializar banco de dados
-def init_database():
-    conn = sqlite3.connect('biblioteca.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS livros (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            titulo TEXT NOT NULL,
-            autor TEXT,
-            ano INTEGER,
-            categoria TEXT,
-            idioma TEXT,
-            num_paginas INTEGER,
-            tamanho_kb INTEGER,
-            hash_arquivo TEXT UNIQUE,
-            nome_arquivo TEXT,
-            data_adicao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            notas TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Extrair metadados do PDF
+# Extrair metadados do PDF, exibindo o erro (e usando valores vazios) se a leitura falhar
 def extrair_metadata_pdf(pdf_file):
     try:
-        pdf_file.seek(0)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        metadata = {
-            'num_paginas': len(pdf_reader.pages),
-            'titulo': '',
-            'autor': ''
-        }
-        
-        # Tentar extrair metadados se disponíveis
-        if pdf_reader.metadata:
-            metadata['titulo'] = pdf_reader.metadata.get('/Title', '') or ''
-            metadata['autor'] = pdf_reader.metadata.get('/Author', '') or ''
-        
-        return metadata
+        return biblioteca.extrair_metadata_pdf(pdf_file)
     except Exception as e:
         st.error(f"Erro ao extrair metadados: {str(e)}")
         return {'num_paginas': 0, 'titulo': '', 'autor': ''}
 
-# Calcular hash do arquivo
-def calcular_hash(file_bytes):
-    return hashlib.md5(file_bytes).hexdigest()
-
-# Buscar livros na Google Books API
+# Token de acesso da conta de serviço configurada na sessão
 def obter_token_service_account():
     """Obtém token de acesso OAuth2 usando credenciais da conta de serviço"""
     service_account_info = st.session_state.get('service_account_json', None)
@@ -73,252 +69,167 @@ def obter_token_service_account():
         return None
     
     try:
-        import time
-        import base64
-        from urllib.parse import urlencode
-        
-        # Criar JWT
-        header = {
-            "alg": "RS256",
-            "typ": "JWT"
-        }
-        
-        now = int(time.time())
-        claim_set = {
-            "iss": service_account_info["client_email"],
-            "scope": "https://www.googleapis.com/auth/books",
-            "aud": "https://oauth2.googleapis.com/token",
-            "exp": now + 3600,
-            "iat": now
-        }
-        
-        # Usar biblioteca PyJWT se disponível, senão retornar None
-        try:
-            import jwt
-            private_key = service_account_info["private_key"]
-            token = jwt.encode(claim_set, private_key, algorithm="RS256", headers=header)
-            
-            # Trocar JWT por token de acesso
-            token_url = "https://oauth2.googleapis.com/token"
-            data = {
-                "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
-                "assertion": token
-            }
-            
-            response = requests.post(token_url, data=data)
-            if response.status_code == 200:
-                return response.json().get("access_token")
-        except ImportError:
-            st.warning("⚠️ Biblioteca PyJWT não instalada. Use chave API ao invés de conta de serviço.")
-            return None
+        return biblioteca.obter_token(service_account_info)
+    except ImportError as e:
+        st.warning(f"⚠️ {str(e)}")
+        return None
     except Exception as e:
         st.error(f"Erro ao obter token: {str(e)}")
         return None
 
+# Buscar livros na Google Books API com as credenciais da sessão (erros são exibidos)
 def buscar_google_books(query, max_results=10):
-    # Tentar usar token de conta de serviço primeiro
     access_token = obter_token_service_account()
-    
-    if access_token:
-        # Usar token OAuth2
-        url = f'https://www.googleapis.com/books/v1/volumes?q={query}&maxResults={max_results}'
-        headers = {"Authorization": f"Bearer {access_token}"}
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('items', [])
-            elif response.status_code == 403:
-                st.error("⚠️ Erro de autorização. Verifique as permissões da conta de serviço.")
-                return []
-            else:
-                st.error(f"Erro na busca: {response.status_code}")
-                return []
-        except Exception as e:
-            st.error(f"Erro ao buscar livros: {str(e)}")
-            return []
-    
-    # Caso contrário, tentar usar chave API
-    api_key = st.session_state.get('google_api_key', '')
-    
-    if api_key:
-        url = f'https://www.googleapis.com/books/v1/volumes?q={query}&maxResults={max_results}&key={api_key}'
-    else:
-        url = f'https://www.googleapis.com/books/v1/volumes?q={query}&maxResults={max_results}'
-    
     try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get('items', [])
-        elif response.status_code == 403:
-            st.error("⚠️ Limite de requisições atingido ou chave API inválida. Configure sua chave API ou conta de serviço nas configurações.")
-            return []
-        else:
-            st.error(f"Erro na busca: {response.status_code}")
-            return []
-    except requests.exceptions.Timeout:
-        st.error("⏱️ Tempo de espera esgotado. Tente novamente.")
+        return biblioteca.buscar_google_books(
+            query, max_results,
+            access_token=access_token,
+            api_key=st.session_state.get('google_api_key', '')
+        )
+    except biblioteca.TokenExpirado as e:
+        # Token revogado ou expirado antes do previsto: solicitar outro na próxima busca
+        obter_cache_tokens().invalidar(chave_conta_servico(st.session_state['service_account_json']))
+        st.error(str(e))
         return []
-    except Exception as e:
-        st.error(f"Erro ao buscar livros: {str(e)}")
+    except biblioteca.ErroGoogleBooks as e:
+        st.error(str(e))
         return []
 
-# Salvar arquivo PDF no disco
-def salvar_pdf(file_bytes, hash_arquivo):
-    # Criar diretório pdfs se não existir
-    if not os.path.exists('pdfs'):
-        os.makedirs('pdfs')
-    
-    # Salvar arquivo com o hash como nome
-    caminho_arquivo = os.path.join('pdfs', f'{hash_arquivo}.pdf')
-    with open(caminho_arquivo, 'wb') as f:
-        f.write(file_bytes)
-    return caminho_arquivo
+# Enriquecer os livros incompletos com as credenciais da sessão
+def enriquecer_biblioteca(limite=None, taxa=None, repetir_sem_resultado=False, progresso=None):
+    return biblioteca.enriquecer_biblioteca(
+        limite, taxa, repetir_sem_resultado, progresso,
+        service_account_info=st.session_state.get('service_account_json'),
+        api_key=st.session_state.get('google_api_key', '')
+    )
 
-# Carregar arquivo PDF do disco
-def carregar_pdf(hash_arquivo):
-    caminho_arquivo = os.path.join('pdfs', f'{hash_arquivo}.pdf')
-    if os.path.exists(caminho_arquivo):
-        with open(caminho_arquivo, 'rb') as f:
-            return f.read()
-    return None
-
-# Adicionar livro ao banco de dados
-def adicionar_livro(dados_livro, file_bytes=None):
+# Adicionar livro, exibindo os erros na página
+def adicionar_livro(dados_livro, file_bytes=None, caminho_temporario=None):
     try:
-        conn = sqlite3.connect('biblioteca.db')
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO livros (titulo, autor, ano, categoria, idioma, num_paginas, 
-                               tamanho_kb, hash_arquivo, nome_arquivo, notas)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            dados_livro['titulo'],
-            dados_livro['autor'],
-            dados_livro['ano'],
-            dados_livro['categoria'],
-            dados_livro['idioma'],
-            dados_livro['num_paginas'],
-            dados_livro['tamanho_kb'],
-            dados_livro['hash_arquivo'],
-            dados_livro['nome_arquivo'],
-            dados_livro['notas']
-        ))
-        conn.commit()
-        conn.close()
-        
-        # Salvar arquivo PDF se fornecido
-        if file_bytes:
-            salvar_pdf(file_bytes, dados_livro['hash_arquivo'])
-        
-        return True
-    except sqlite3.IntegrityError:
-        return False
+        if not biblioteca.adicionar_livro(dados_livro, file_bytes, caminho_temporario, indexar=False):
+            return False
     except Exception as e:
         st.error(f"Erro ao adicionar livro: {str(e)}")
         return False
+    
+    if file_bytes or caminho_temporario:
+        try:
+            indexar_conteudo_pdf(dados_livro['hash_arquivo'])
+        except Exception as e:
+            st.warning(f"⚠️ Não foi possível indexar o conteúdo do PDF: {str(e)}")
+    return True
 
-# Buscar livros
-def buscar_livros(filtro='', categoria='Todas'):
-    conn = sqlite3.connect('biblioteca.db')
-    c = conn.cursor()
-    
-    if categoria == 'Todas':
-        c.execute('''
-            SELECT * FROM livros 
-            WHERE titulo LIKE ? OR autor LIKE ?
-            ORDER BY data_adicao DESC
-        ''', (f'%{filtro}%', f'%{filtro}%'))
-    else:
-        c.execute('''
-            SELECT * FROM livros 
-            WHERE (titulo LIKE ? OR autor LIKE ?) AND categoria = ?
-            ORDER BY data_adicao DESC
-        ''', (f'%{filtro}%', f'%{filtro}%', categoria))
-    
-    livros = c.fetchall()
-    conn.close()
-    return livros
+# Preparar o upload uma única vez: gravar em disco calculando o hash e ler os metadados
+def preparar_upload(uploaded_file):
+    """Resultado memorizado por upload na sessão, reutilizado nas próximas execuções do script"""
+    chave = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+    preparado = st.session_state.get('upload_preparado')
+    if preparado and preparado['chave'] == chave:
+        return preparado
+    
+    descartar_upload()
+    limpar_uploads_antigos()
+    
+    uploaded_file.seek(0)
+    with metricas.medir(metricas.ARQUIVO, 'gravar_temporario_com_hash'):
+        caminho_temporario, hash_arquivo, tamanho = gravar_temporario_com_hash(uploaded_file, pasta_uploads())
+    metadata = extrair_metadata_pdf(caminho_temporario)
+    
+    # Assinatura do texto para procurar quase duplicatas (mesmos limites da leitura dos metadados)
+    try:
+        with metricas.medir(metricas.PDF, 'assinatura_texto_pdf'):
+            assinatura_texto = executar_com_limites(duplicatas.assinatura_texto_pdf, caminho_temporario)
+    except Exception:
+        assinatura_texto = None
+    
+    preparado = {
+        'chave': chave,
+        'temporario': caminho_temporario,
+        'hash_arquivo': hash_arquivo,
+        'tamanho_kb': tamanho // 1024,
+        'metadata': metadata,
+        'assinatura_texto': assinatura_texto
+    }
+    st.session_state['upload_preparado'] = preparado
+    return preparado
 
-# Obter categorias únicas
-def obter_categorias():
-    conn = sqlite3.connect('biblioteca.db')
-    c = conn.cursor()
-    c.execute('SELECT DISTINCT categoria FROM livros WHERE categoria IS NOT NULL ORDER BY categoria')
-    categorias = [row[0] for row in c.fetchall()]
-    conn.close()
-    return categorias
+# Descartar o upload preparado (remove o arquivo temporário, se ainda existir)
+def descartar_upload():
+    preparado = st.session_state.pop('upload_preparado', None)
+    if preparado and preparado['temporario'] and os.path.exists(preparado['temporario']):
+        os.remove(preparado['temporario'])
 
-# Deletar livro
-def deletar_livro(livro_id):
-    conn = sqlite3.connect('biblioteca.db')
-    c = conn.cursor()
-    
-    # Obter hash do arquivo antes de deletar
-    c.execute('SELECT hash_arquivo FROM livros WHERE id = ?', (livro_id,))
-    resultado = c.fetchone()
-    
-    if resultado:
-        hash_arquivo = resultado[0]
-        # Deletar arquivo PDF se existir
-        caminho_arquivo = os.path.join('pdfs', f'{hash_arquivo}.pdf')
-        if os.path.exists(caminho_arquivo):
-            os.remove(caminho_arquivo)
-    
-    c.execute('DELETE FROM livros WHERE id = ?', (livro_id,))
-    conn.commit()
-    conn.close()
+# Facetas da biblioteca: nome -> (rótulo, texto para os livros sem valor)
+ROTULOS_FACETAS = {
+    'categoria': ("Categoria", "Sem categoria"),
+    'idioma': ("Idioma", "Sem idioma"),
+    'decada': ("Década", "Sem ano"),
+    'autor': ("Autor", "Autor desconhecido"),
+}
 
-# Atualizar livro
-def atualizar_livro(livro_id, dados_livro):
-    conn = sqlite3.connect('biblioteca.db')
-    c = conn.cursor()
-    c.execute('''
-        UPDATE livros 
-        SET titulo=?, autor=?, ano=?, categoria=?, idioma=?, notas=?
-        WHERE id=?
-    ''', (
-        dados_livro['titulo'],
-        dados_livro['autor'],
-        dados_livro['ano'],
-        dados_livro['categoria'],
-        dados_livro['idioma'],
-        dados_livro['notas'],
-        livro_id
-    ))
-    conn.commit()
-    conn.close()
+def rotulo_valor_faceta(nome, valor, sem_valor):
+    if valor is None:
+        return sem_valor
+    if nome == 'decada':
+        return f"{valor}–{valor + 9}"
+    return valor
 
-# Obter estatísticas
-def obter_estatisticas():
-    conn = sqlite3.connect('biblioteca.db')
-    c = conn.cursor()
-    
-    c.execute('SELECT COUNT(*) FROM livros')
-    total_livros = c.fetchone()[0]
-    
-    c.execute('SELECT SUM(num_paginas) FROM livros')
-    total_paginas = c.fetchone()[0] or 0
-    
-    c.execute('SELECT COUNT(DISTINCT autor) FROM livros WHERE autor IS NOT NULL AND autor != ""')
-    total_autores = c.fetchone()[0]
-    
-    c.execute('SELECT COUNT(DISTINCT categoria) FROM livros WHERE categoria IS NOT NULL AND categoria != ""')
-    total_categorias = c.fetchone()[0]
-    
-    conn.close()
-    
-    return {
-        'total_livros': total_livros,
-        'total_paginas': total_paginas,
-        'total_autores': total_autores,
-        'total_categorias': total_categorias
-    }
+# Preparar download sob demanda (apenas um livro por sessão fica em memória)
+def preparar_download(livro_id):
+    st.session_state['download_ativo'] = livro_id
+
+def liberar_download():
+    st.session_state.pop('download_ativo', None)
+
+# Painel de desempenho: mede as operações desta execução do script (ligado na barra lateral
+# ou pela variável de ambiente BIBLIOTECA_METRICAS)
+if 'painel_desempenho' not in st.session_state:
+    st.session_state['painel_desempenho'] = bool(os.environ.get('BIBLIOTECA_METRICAS'))
+if st.session_state['painel_desempenho']:
+    # Uma execução interrompida (st.rerun) não chega ao painel; somá-la ao total da sessão agora
+    execucao_interrompida = st.session_state.pop('metricas_execucao', None)
+    if execucao_interrompida is not None:
+        st.session_state.setdefault('metricas_sessao', metricas.Coletor()).incorporar(execucao_interrompida)
+    st.session_state['metricas_execucao'] = metricas.iniciar_coleta()
+else:
+    metricas.encerrar_coleta()
+
+# Selecionar a biblioteca desta sessão (vale para a thread do script, então é refeito a cada execução)
+if MULTIUSUARIO:
+    nome_biblioteca = st.query_params.get('biblioteca')
+    if not nome_biblioteca:
+        st.title("📚 Biblioteca de Livros PDF")
+        nome_informado = st.text_input("Nome da biblioteca", help="Letras minúsculas, dígitos, '-' e '_'")
+        if nome_informado:
+            st.query_params['biblioteca'] = nome_informado.strip().lower()
+            st.rerun()
+        st.stop()
+    try:
+        if BIBLIOTECAS_PERMITIDAS:
+            if nome_biblioteca not in BIBLIOTECAS_PERMITIDAS:
+                raise ValueError(f"Biblioteca não encontrada: '{nome_biblioteca}'")
+            criar_biblioteca(nome_biblioteca)
+        selecionar_biblioteca(nome_biblioteca)
+    except ValueError as e:
+        st.error(f"❌ {str(e)}")
+        st.stop()
+else:
+    selecionar_biblioteca(None)
 
 # Inicializar banco de dados
 init_database()
 
+# Iniciar o servidor de PDFs (uma vez por processo)
+if PORTA_SERVIDOR_PDFS:
+    try:
+        iniciar_servidor_pdfs(os.environ.get('BIBLIOTECA_HOST_PDFS', '127.0.0.1'), int(PORTA_SERVIDOR_PDFS))
+    except OSError as e:
+        st.warning(f"⚠️ Servidor de PDFs não iniciado na porta {PORTA_SERVIDOR_PDFS}: {str(e)}")
+
+# Iniciar a sincronização da pasta monitorada (uma vez por processo; só fora do modo multiusuário)
+if PASTA_MONITORADA and not MULTIUSUARIO:
+    iniciar_sincronizacao_periodica(os.path.abspath(PASTA_MONITORADA), INTERVALO_SINCRONIZACAO)
+
 # Interface principal
 st.title("📚 Biblioteca de Livros PDF")
 st.markdown("### Bem-vinda, Skárlath! 🦅")
@@ -333,17 +244,61 @@ menu = st.sidebar.selectbox(
 if menu == "📥 Adicionar Livro":
     st.header("Adicionar Novo Livro")
     
-    uploaded_file = st.file_uploader("Selecione um arquivo PDF", type=['pdf'])
+    modo = st.radio("Modo", ["Um arquivo", "Importação em lote"], horizontal=True)
     
-    if uploaded_file:
-        # Ler arquivo
-        file_bytes = uploaded_file.read()
-        file_size_kb = len(file_bytes) // 1024
-        file_hash = calcular_hash(file_bytes)
+    if modo == "Importação em lote":
+        st.markdown("Importa todos os PDFs de uma pasta (incluindo subpastas) ou de um arquivo ZIP do servidor. "
+                    "Livros já cadastrados são ignorados.")
+        origem = st.text_input("Caminho da pasta ou do arquivo ZIP", placeholder="Ex: /home/usuario/livros ou /home/usuario/livros.zip")
+        processos = st.number_input("Processos em paralelo", min_value=1, max_value=32, value=os.cpu_count() or 1, step=1)
         
-        # Extrair metadados
-        uploaded_file.seek(0)
-        metadata = extrair_metadata_pdf(uploaded_file)
+        if st.button("📦 Importar", type="primary"):
+            if not origem or not os.path.exists(origem):
+                st.error("Por favor, informe um caminho existente.")
+            else:
+                progresso = st.progress(0.0)
+                inicio = time.time()
+                relatorio = None
+                origem_valida = True
+                try:
+                    for etapa, atual, total, relatorio in importar_em_lote(origem, max_workers=int(processos)):
+                        taxa = atual / max(time.time() - inicio, 1e-6)
+                        descricao = "Calculando hashes" if etapa == 'hash' else "Lendo metadados e gravando"
+                        progresso.progress(atual / total, text=f"{descricao}: {atual}/{total} ({taxa:.1f} arquivos/s)")
+                except ValueError as e:
+                    origem_valida = False
+                    st.error(f"❌ {str(e)}")
+                
+                if relatorio is not None:
+                    duracao = time.time() - inicio
+                    col1, col2, col3, col4 = st.columns(4)
+                    col1.metric("✅ Importados", relatorio['importados'])
+                    col2.metric("♻️ Duplicados", relatorio['duplicados'])
+                    col3.metric("❌ Erros", len(relatorio['erros']))
+                    col4.metric("⏱️ Tempo", f"{duracao:.1f} s")
+                    
+                    if relatorio['erros']:
+                        st.subheader("Relatório de erros")
+                        st.dataframe(
+                            [{'Arquivo': arquivo, 'Erro': erro} for arquivo, erro in relatorio['erros']],
+                            use_container_width=True
+                        )
+                    if relatorio['importados']:
+                        st.info("💡 Use \"Indexar PDFs pendentes\" em Configurações para indexar o conteúdo dos livros importados.")
+                elif origem_valida:
+                    st.info("Nenhum PDF encontrado.")
+    
+    uploaded_file = st.file_uploader("Selecione um arquivo PDF", type=['pdf']) if modo == "Um arquivo" else None
+    
+    if uploaded_file is None:
+        descartar_upload()
+    
+    if uploaded_file:
+        # Gravar em disco calculando o hash e ler os metadados (apenas na primeira execução para este arquivo)
+        preparado = preparar_upload(uploaded_file)
+        file_size_kb = preparado['tamanho_kb']
+        file_hash = preparado['hash_arquivo']
+        metadata = preparado['metadata']
         
         st.success(f"Arquivo carregado: {uploaded_file.name} ({file_size_kb} KB)")
         
@@ -360,7 +315,20 @@ if menu == "📥 Adicionar Livro":
             st.metric("Páginas", metadata['num_paginas'])
         
         notas = st.text_area("Notas/Observações", placeholder="Adicione anotações sobre o livro...")
-        
+    
+        # Outras edições, digitalizações ou cópias do mesmo livro já cadastradas
+        possiveis_duplicatas = procurar_duplicatas(titulo, autor, preparado['assinatura_texto'], ignorar_hash=file_hash)
+        if possiveis_duplicatas:
+            linhas = []
+            for _, titulo_duplicata, autor_duplicata, sim_texto, sim_metadados in possiveis_duplicatas:
+                detalhes = []
+                if sim_texto is not None:
+                    detalhes.append(f"texto {sim_texto:.0%}")
+                if sim_metadados is not None:
+                    detalhes.append(f"título/autor {sim_metadados:.0%}")
+                linhas.append(f"- **{titulo_duplicata}** ({autor_duplicata or 'autor desconhecido'}): {', '.join(detalhes)}")
+            st.warning("⚠️ Possíveis duplicatas já na biblioteca:\n" + "\n".join(linhas))
+    
         if st.button("💾 Salvar na Biblioteca", type="primary"):
             if titulo:
                 dados_livro = {
@@ -376,7 +344,9 @@ if menu == "📥 Adicionar Livro":
                     'notas': notas or None
                 }
                 
-                if adicionar_livro(dados_livro, file_bytes):
+                if preparado['temporario'] and adicionar_livro(dados_livro, caminho_temporario=preparado['temporario']):
+                    # O temporário já foi movido para pdfs/
+                    preparado['temporario'] = None
                     st.success("✅ Livro adicionado com sucesso!")
                     st.balloons()
                 else:
@@ -387,42 +357,109 @@ if menu == "📥 Adicionar Livro":
 elif menu == "📖 Biblioteca":
     st.header("Minha Biblioteca")
     
-    col1, col2 = st.columns([3, 1])
+    col1, col2 = st.columns([4, 1])
     with col1:
-        filtro = st.text_input("🔍 Buscar por título ou autor")
+        filtro = st.text_input("🔍 Buscar por título, autor, categoria ou notas")
     with col2:
-        categorias = ['Todas'] + obter_categorias()
-        categoria_filtro = st.selectbox("Categoria", categorias)
-    
-    livros = buscar_livros(filtro, categoria_filtro)
+        por_pagina = st.selectbox("Por página", [10, 20, 50, 100], index=1)
+    
+    # Facetas: as contagens consideram a busca e as outras facetas selecionadas
+    selecionadas = {nome: st.session_state.get(f'faceta_{nome}', []) for nome in ROTULOS_FACETAS}
+    facetas = normalizar_facetas(selecionadas)
+    contagens = contar_facetas(filtro, facetas)
+    for coluna, (nome, (rotulo, sem_valor)) in zip(st.columns(len(ROTULOS_FACETAS)), ROTULOS_FACETAS.items()):
+        totais = dict(contagens[nome])
+        # Valores selecionados que não aparecem mais na contagem continuam como opção (com total 0)
+        opcoes = [valor for valor, _ in contagens[nome]]
+        opcoes += [valor for valor in selecionadas[nome] if valor not in totais]
+        with coluna:
+            st.multiselect(
+                rotulo, opcoes, key=f'faceta_{nome}',
+                format_func=lambda valor, nome=nome, sem_valor=sem_valor, totais=totais:
+                    f"{rotulo_valor_faceta(nome, valor, sem_valor)} ({totais.get(valor, 0)})"
+            )
+    
+    buscar_no_conteudo = st.checkbox("📄 Procurar também dentro dos PDFs")
+    
+    if filtro and buscar_no_conteudo:
+        trechos = buscar_conteudo(filtro)
+        if trechos:
+            st.subheader("📄 Encontrado no conteúdo")
+            for livro_id, titulo, autor, paginas_encontradas in trechos:
+                with st.expander(f"📄 {titulo} - {autor or 'Autor desconhecido'} ({len(paginas_encontradas)} página(s))"):
+                    for pagina, trecho in paginas_encontradas:
+                        st.markdown(f"**Página {pagina}:** {trecho}")
+        else:
+            st.info("Nenhum trecho encontrado no conteúdo dos PDFs.")
+        st.markdown("---")
+    
+    # Voltar à primeira página quando a busca muda
+    assinatura_busca = (filtro, facetas, por_pagina)
+    if st.session_state.get('pagina_busca') != assinatura_busca:
+        st.session_state['pagina_busca'] = assinatura_busca
+        st.session_state['pagina_cursor'] = None
+    
+    cursor_pagina = st.session_state.get('pagina_cursor')
+    if cursor_pagina:
+        livros, tem_anterior, tem_proxima = buscar_livros_pagina(
+            filtro, 'Todas', por_pagina, cursor_pagina[0], cursor_pagina[1], facetas
+        )
+    else:
+        livros, tem_anterior, tem_proxima = buscar_livros_pagina(filtro, 'Todas', por_pagina, facetas=facetas)
     
     if livros:
-        st.info(f"📚 {len(livros)} livro(s) encontrado(s)")
+        st.info(f"📚 {len(livros)} livro(s) nesta página")
+        
+        col_anterior, col_proxima = st.columns(2)
+        with col_anterior:
+            if st.button("⬅️ Anterior", disabled=not tem_anterior):
+                # livro[10] é a chave de ordenação e livro[0] o id
+                st.session_state['pagina_cursor'] = ((livros[0][10], livros[0][0]), 'anterior')
+                st.rerun()
+        with col_proxima:
+            if st.button("Próxima ➡️", disabled=not tem_proxima):
+                st.session_state['pagina_cursor'] = ((livros[-1][10], livros[-1][0]), 'proxima')
+                st.rerun()
         
         for livro in livros:
             with st.expander(f"📖 {livro[1]} - {livro[2] or 'Autor desconhecido'}"):
                 st.write(f"**Título:** {livro[1]}")
                 st.write(f"**Autor:** {livro[2] or 'Autor desconhecido'}")
                 
-                if livro[11]:
-                    st.write(f"**Notas:** {livro[11]}")
+                if livro[8]:
+                    st.write(f"**Notas:** {livro[8]}")
                 
                 # Botões de ação
                 col_download, col_edit, col_delete = st.columns(3)
                 
                 with col_download:
-                    # Botão de download
-                    pdf_bytes = carregar_pdf(livro[8])  # livro[8] é o hash_arquivo
-                    if pdf_bytes:
-                        st.download_button(
-                            label="📥 Download",
-                            data=pdf_bytes,
-                            file_name=livro[9],  # livro[9] é o nome_arquivo
-                            mime="application/pdf",
-                            key=f"download_{livro[0]}"
-                        )
+                    # Botão de download: o PDF só é lido quando o usuário pede este livro
+                    caminho_arquivo = localizar_pdf(livro[6])  # livro[6] é o hash_arquivo
+                    if caminho_arquivo is None:
+                        st.button("📥 Indisponível", key=f"download_{livro[0]}", disabled=True)
+                    elif st.session_state.get('download_ativo') == livro[0]:
+                        pdf_bytes = carregar_pdf(livro[6], limite_bytes=LIMITE_DOWNLOAD_MB * 1024 * 1024)
+                        if pdf_bytes:
+                            st.download_button(
+                                label="📥 Download",
+                                data=pdf_bytes,
+                                file_name=livro[7],  # livro[7] é o nome_arquivo
+                                mime="application/pdf",
+                                key=f"download_{livro[0]}",
+                                on_click=liberar_download
+                            )
+                        else:
+                            st.warning(f"⚠️ Arquivo maior que {LIMITE_DOWNLOAD_MB} MB.")
                     else:
-                        st.button(f"📥 Indisponível", key=f"download_{livro[0]}", disabled=True)
+                        st.button(
+                            "📥 Preparar Download",
+                            key=f"preparar_{livro[0]}",
+                            on_click=preparar_download,
+                            args=(livro[0],)
+                        )
+                    # Abrir no navegador pelo servidor de PDFs: só as páginas lidas são transferidas
+                    if caminho_arquivo is not None and URL_SERVIDOR_PDFS:
+                        st.link_button("📖 Abrir", gerar_link_pdf(URL_SERVIDOR_PDFS, livro[6], livro[7]))
                 
                 with col_edit:
                     if st.button(f"✏️ Editar", key=f"edit_{livro[0]}"):
@@ -453,7 +490,7 @@ elif menu == "📖 Biblioteca":
                                                    index=["Português", "Inglês", "Espanhol", "Francês", "Alemão", "Outro"].index(livro[5]) if livro[5] in ["Português", "Inglês", "Espanhol", "Francês", "Alemão", "Outro"] else 0,
                                                    key=f"idioma_{livro[0]}")
                     
-                    novas_notas = st.text_area("Notas", value=livro[11] or "", key=f"notas_{livro[0]}")
+                    novas_notas = st.text_area("Notas", value=livro[8] or "", key=f"notas_{livro[0]}")
                     
                     col_save, col_cancel = st.columns(2)
                     
@@ -492,6 +529,11 @@ elif menu == "� Buscar no Google Books":
                 if resultados:
                     st.success(f"✅ {len(resultados)} livro(s) encontrado(s)")
                     
+                    # Capas servidas do cache local (as que faltam são baixadas em paralelo)
+                    capas = obter_capas(
+                        item.get('volumeInfo', {}).get('imageLinks', {}).get('thumbnail', '') for item in resultados
+                    )
+                    
                     for item in resultados:
                         volume_info = item.get('volumeInfo', {})
                         
@@ -510,7 +552,7 @@ elif menu == "� Buscar no Google Books":
                             
                             with col1:
                                 if thumbnail:
-                                    st.image(thumbnail, width=100)
+                                    st.image(capas.get(thumbnail, thumbnail), width=100)
                             
                             with col2:
                                 st.write(f"**Título:** {titulo}")
@@ -566,19 +608,9 @@ elif menu == "�📊 Estatísticas":
     
     # Gráficos
     if stats['total_livros'] > 0:
-        conn = sqlite3.connect('biblioteca.db')
-        c = conn.cursor()
-        
         # Livros por categoria
         st.subheader("📊 Livros por Categoria")
-        c.execute('''
-            SELECT categoria, COUNT(*) as total 
-            FROM livros 
-            WHERE categoria IS NOT NULL AND categoria != ""
-            GROUP BY categoria 
-            ORDER BY total DESC
-        ''')
-        categorias_data = c.fetchall()
+        categorias_data = obter_livros_por_categoria()
         
         if categorias_data:
             import pandas as pd
@@ -587,20 +619,12 @@ elif menu == "�📊 Estatísticas":
         
         # Livros por ano
         st.subheader("📅 Livros por Ano de Publicação")
-        c.execute('''
-            SELECT ano, COUNT(*) as total 
-            FROM livros 
-            WHERE ano IS NOT NULL
-            GROUP BY ano 
-            ORDER BY ano DESC
-        ''')
-        anos_data = c.fetchall()
+        anos_data = obter_livros_por_ano()
         
         if anos_data:
+            import pandas as pd
             df_anos = pd.DataFrame(anos_data, columns=['Ano', 'Quantidade'])
             st.line_chart(df_anos.set_index('Ano'))
-        
-        conn.close()
 
 elif menu == "⚙️ Configurações":
     st.header("Configurações")
@@ -713,11 +737,280 @@ elif menu == "⚙️ Configurações":
     else:
         st.warning("⚠️ Usando quota gratuita (até 1000 requisições/dia)")
     
+    cache_consultas = obter_cache_consultas().estatisticas()
+    st.write(
+        f"⚡ Cache de consultas da biblioteca: **{cache_consultas['acertos']}** acerto(s), "
+        f"{cache_consultas['falhas']} falha(s), {cache_consultas['entradas']} resultado(s) guardado(s) "
+        f"(geração {cache_consultas['geracao']})"
+    )
+    
+    if MULTIUSUARIO:
+        registro = obter_registro_bibliotecas().estatisticas()
+        st.write(
+            f"🗃️ Bibliotecas abertas no servidor: **{registro['bibliotecas']}**, com {registro['conexoes_abertas']} "
+            f"conexão(ões) SQLite ({registro['aberturas']} aberta(s) desde o início)"
+        )
+    
+    cache_google = obter_estatisticas_cache_google_books()
+    consultas = cache_google['acertos'] + cache_google['falhas']
+    st.write(
+        f"🗄️ Cache de buscas: **{cache_google['acertos']}** de {consultas} busca(s) atendidas sem usar a quota "
+        f"({cache_google['entradas']} resposta(s) guardada(s))"
+    )
+    
     st.markdown("---")
     st.subheader("📊 Status da Biblioteca")
     stats = obter_estatisticas()
     st.write(f"📚 Total de livros cadastrados: **{stats['total_livros']}**")
+    
+    st.markdown("---")
+    st.subheader("🗂️ Armazenamento dos PDFs")
+    st.markdown("Os PDFs ficam em subpastas pelo hash (`pdfs/ab/cd/<hash>.pdf`). "
+                "Bibliotecas antigas podem ser migradas; a migração pode ser interrompida e retomada.")
+    
+    col_migrar, col_verificar = st.columns(2)
+    with col_migrar:
+        if st.button("📦 Migrar PDFs para subpastas"):
+            movidos = 0
+            with st.spinner("Movendo arquivos..."):
+                for movidos in migrar_pdfs_para_subpastas():
+                    pass
+            st.success(f"✅ {movidos} arquivo(s) movido(s).")
+    with col_verificar:
+        conferir_conteudo = st.checkbox("Conferir o hash do conteúdo (lê todos os arquivos)", value=True)
+        verificar = st.button("🧹 Verificar integridade")
+    
+    if verificar:
+        progresso = st.progress(0.0)
+        relatorio = None
+        for atual, total, relatorio in verificar_integridade(conferir_conteudo):
+            if total:
+                progresso.progress(atual / total, text=f"{atual}/{total} arquivos conferidos")
+        progresso.progress(1.0)
+        
+        col1, col2, col3 = st.columns(3)
+        col1.metric("❓ Sem arquivo", len(relatorio['ausentes']))
+        col2.metric("👻 Arquivos órfãos", len(relatorio['orfaos']))
+        col3.metric("⚠️ Conteúdo divergente", len(relatorio['divergentes']) + len(relatorio['erros']))
+        
+        if relatorio['ausentes']:
+            st.write("**Livros cadastrados sem arquivo:**")
+            st.code("\n".join(relatorio['ausentes']))
+        if relatorio['orfaos']:
+            st.write("**Arquivos sem livro cadastrado:**")
+            st.code("\n".join(relatorio['orfaos']))
+        if relatorio['divergentes']:
+            st.write("**Arquivos cujo conteúdo não corresponde ao hash:**")
+            st.code("\n".join(relatorio['divergentes']))
+        for caminho_arquivo, erro in relatorio['erros']:
+            st.error(f"❌ {caminho_arquivo}: {erro}")
+    
+    st.markdown("---")
+    st.subheader("📂 Pasta Monitorada")
+    st.markdown("Importa os PDFs novos ou alterados de uma pasta do servidor. Arquivos com o mesmo tamanho, data de "
+                "modificação e inode da última sincronização não são lidos de novo.")
+    
+    if PASTA_MONITORADA and not MULTIUSUARIO:
+        estado = iniciar_sincronizacao_periodica(os.path.abspath(PASTA_MONITORADA), INTERVALO_SINCRONIZACAO)
+        st.caption(f"🔄 `{PASTA_MONITORADA}` é sincronizada a cada {INTERVALO_SINCRONIZACAO} s.")
+        if estado['erro']:
+            st.error(f"❌ Última sincronização: {estado['erro']}")
+        elif estado['fim'] and estado['relatorio']:
+            ultimo = estado['relatorio']
+            st.caption(f"Última sincronização em {datetime.fromtimestamp(estado['fim']):%d/%m/%Y %H:%M:%S}: "
+                       f"{ultimo['arquivos']} arquivo(s), {ultimo['importados']} importado(s), {len(ultimo['erros'])} erro(s).")
+    
+    pasta_sincronizar = st.text_input("Pasta", value=PASTA_MONITORADA or "")
+    if st.button("🔄 Sincronizar agora", disabled=not pasta_sincronizar):
+        progresso = st.progress(0.0)
+        relatorio = None
+        try:
+            for etapa, atual, total, relatorio in sincronizar_pasta(pasta_sincronizar):
+                descricao = {'varredura': "Verificando arquivos", 'hash': "Calculando hashes"}.get(etapa, "Lendo metadados e gravando")
+                progresso.progress(atual / total if total else 1.0, text=f"{descricao}: {atual}/{total}")
+        except ValueError as e:
+            st.error(f"❌ {str(e)}")
+        
+        if relatorio is not None:
+            progresso.progress(1.0)
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("📄 Arquivos", relatorio['arquivos'])
+            col2.metric("⏭️ Inalterados", relatorio['inalterados'])
+            col3.metric("✅ Importados", relatorio['importados'])
+            col4.metric("❌ Erros", len(relatorio['erros']))
+            for caminho, erro in relatorio['erros']:
+                st.error(f"❌ {caminho}: {erro}")
+    
+    st.markdown("---")
+    st.subheader("💾 Exportação e Backup")
+    st.markdown("Os arquivos são gravados no servidor. A exportação e a importação leem o catálogo em blocos; "
+                "o backup do banco pode ser feito com o app em uso, e a cópia dos PDFs só leva os arquivos novos.")
+    
+    col_exportar, col_importar = st.columns(2)
+    with col_exportar:
+        caminho_exportacao = st.text_input("Exportar para (.csv, .jsonl ou .parquet)", value="catalogo.csv")
+        if st.button("📤 Exportar catálogo"):
+            progresso = st.progress(0.0)
+            try:
+                exportados = exportar_livros(
+                    caminho_exportacao,
+                    progresso=lambda atual, total: progresso.progress(min(atual / total, 1.0), text=f"{atual}/{total} livros")
+                )
+                st.success(f"✅ {exportados} livro(s) exportado(s) para {caminho_exportacao}.")
+            except (ValueError, ImportError, OSError) as e:
+                st.error(f"Erro ao exportar: {str(e)}")
+    with col_importar:
+        caminho_importacao = st.text_input("Importar de (.csv, .jsonl ou .parquet)")
+        if st.button("📥 Importar catálogo", disabled=not caminho_importacao):
+            try:
+                with st.spinner("Importando..."):
+                    relatorio = importar_livros(caminho_importacao)
+                st.success(f"✅ {relatorio['importados']} importado(s), {relatorio['duplicados']} já cadastrado(s), "
+                           f"{relatorio['invalidos']} inválido(s) (sem título ou ilegíveis).")
+            except (ValueError, ImportError, OSError) as e:
+                st.error(f"Erro ao importar: {str(e)}")
+    
+    col_backup, col_pdfs = st.columns(2)
+    with col_backup:
+        destino_backup = st.text_input("Backup do banco em", value=f"backup_{datetime.now():%Y%m%d}.db")
+        if st.button("🗄️ Fazer backup do banco"):
+            try:
+                tamanho = fazer_backup(destino_backup)
+                st.success(f"✅ Banco copiado para {destino_backup} ({tamanho / (1024 * 1024):.1f} MB).")
+            except (sqlite3.Error, OSError) as e:
+                st.error(f"Erro no backup: {str(e)}")
+    with col_pdfs:
+        destino_pdfs = st.text_input("Cópia dos PDFs em")
+        if st.button("📁 Copiar PDFs novos", disabled=not destino_pdfs):
+            progresso = st.progress(0.0)
+            try:
+                for atual, total, relatorio in arquivar_pdfs(destino_pdfs):
+                    if total:
+                        progresso.progress(atual / total, text=f"{atual}/{total} PDFs")
+                st.success(f"✅ {relatorio['copiados']} PDF(s) copiado(s) "
+                           f"({relatorio['bytes'] / (1024 * 1024):.1f} MB), {relatorio['existentes']} já no destino.")
+            except OSError as e:
+                st.error(f"Erro ao copiar os PDFs: {str(e)}")
+    
+    st.markdown("---")
+    st.subheader("📄 Índice de Conteúdo dos PDFs")
+    st.markdown("Indexa o texto dos livros que ainda não foram indexados (livros adicionados antes desta função).")
+    
+    if st.button("🔄 Indexar PDFs pendentes"):
+        progresso = st.progress(0.0)
+        erros = []
+        total = 0
+        for atual, total, hash_arquivo, erro in reindexar_conteudo():
+            progresso.progress(atual / total, text=f"{atual}/{total} PDFs")
+            if erro:
+                erros.append((hash_arquivo, erro))
+        if total == 0:
+            st.info("✅ Todos os PDFs já estão indexados.")
+        else:
+            st.success(f"✅ {total - len(erros)} de {total} PDF(s) indexado(s).")
+        for hash_arquivo, erro in erros:
+            st.error(f"❌ {hash_arquivo}: {erro}")
+    
+    st.markdown("---")
+    st.subheader("✨ Completar Metadados pelo Google Books")
+    st.markdown("Procura no Google Books os livros sem autor, sem categoria ou com o ano padrão e preenche apenas os campos vazios. "
+                "Pode ser interrompido: a próxima execução continua dos livros ainda não processados.")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        limite_enriquecimento = st.number_input("Livros nesta execução", min_value=1, max_value=10000, value=100, step=10)
+    with col2:
+        taxa_enriquecimento = st.number_input("Requisições por segundo", min_value=0.1, max_value=10.0,
+                                              value=enriquecimento.TAXA_REQUISICOES, step=0.1)
+    with col3:
+        repetir_sem_resultado = st.checkbox("Tentar de novo os sem resultado")
+    
+    st.caption(f"📚 {len(livros_incompletos(repetir_sem_resultado=repetir_sem_resultado))} livro(s) pendente(s)")
+    
+    if st.button("✨ Completar metadados"):
+        progresso = st.progress(0.0)
+        relatorio = enriquecer_biblioteca(
+            limite=int(limite_enriquecimento),
+            taxa=taxa_enriquecimento,
+            repetir_sem_resultado=repetir_sem_resultado,
+            progresso=lambda atual, total, _: progresso.progress(atual / total, text=f"{atual}/{total} livros")
+        )
+        st.success(
+            f"✅ {relatorio['atualizados']} livro(s) atualizado(s), "
+            f"{relatorio['sem_resultado']} sem resultado, {relatorio['erros']} erro(s)."
+        )
+        if relatorio['erros']:
+            st.info("💡 Os livros com erro serão tentados de novo na próxima execução.")
+    
+    st.markdown("---")
+    st.subheader("🧬 Quase Duplicatas")
+    st.markdown("Encontra edições, digitalizações ou cópias do mesmo livro com arquivos diferentes, comparando o texto indexado.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🔄 Calcular assinaturas pendentes"):
+            gravadas = calcular_assinaturas_pendentes()
+            st.success(f"✅ {gravadas} assinatura(s) calculada(s).")
+    with col2:
+        procurar_pares = st.button("🔍 Procurar duplicatas na biblioteca")
+    
+    if procurar_pares:
+        pares = listar_pares_duplicados()
+        if not pares:
+            st.info("✅ Nenhuma quase duplicata encontrada.")
+        else:
+            st.dataframe(
+                [{'Similaridade': f"{valor:.0%}", 'Livro': f"{titulo_a} (#{id_a})", 'Parecido com': f"{titulo_b} (#{id_b})"}
+                 for valor, (id_a, titulo_a), (id_b, titulo_b) in pares],
+                use_container_width=True
+            )
+
+# Painel de desempenho
+st.sidebar.markdown("---")
+st.sidebar.checkbox("⏱️ Painel de desempenho", key='painel_desempenho',
+                    help="Mede consultas SQLite, leitura de arquivos, PDFs e requisições HTTP em cada execução")
+execucao = st.session_state.pop('metricas_execucao', None)
+metricas.encerrar_coleta()
+if execucao is not None:
+    metricas_sessao = st.session_state.setdefault('metricas_sessao', metricas.Coletor())
+    metricas_sessao.incorporar(execucao)
+    
+    with st.sidebar.expander("⏱️ Desempenho", expanded=True):
+        totais_execucao = execucao.totais_por_categoria()
+        linhas = []
+        for categoria, (contagem, segundos) in sorted(metricas_sessao.totais_por_categoria().items()):
+            contagem_execucao, segundos_execucao = totais_execucao.get(categoria, (0, 0.0))
+            linhas.append({
+                'Categoria': categoria,
+                'Execução': f"{contagem_execucao} em {segundos_execucao * 1000:.1f} ms",
+                'Sessão': f"{contagem} em {segundos * 1000:.1f} ms"
+            })
+        st.dataframe(linhas, use_container_width=True)
+        st.caption("Operações mais demoradas desta execução (os tempos de PDFs e arquivos incluem as consultas feitas dentro deles):")
+        st.dataframe(
+            [
+                {'Categoria': categoria, 'Operação': operacao, 'Chamadas': contagem,
+                 'Total (ms)': round(segundos * 1000, 2), 'Máx. (ms)': round(maximo * 1000, 2)}
+                for categoria, operacao, contagem, segundos, maximo in execucao.linhas()[:15]
+            ],
+            use_container_width=True
+        )
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("JSON", metricas.exportar_json(metricas.coletor_processo()),
+                               file_name='metricas.json', mime='application/json')
+        with col2:
+            st.download_button("Prometheus", metricas.exportar_prometheus(metricas.coletor_processo()),
+                               file_name='metricas.prom', mime='text/plain')
+    
+    # Exportação contínua para um coletor externo (ex.: textfile collector do node_exporter)
+    arquivo_metricas = os.environ.get('BIBLIOTECA_METRICAS_ARQUIVO')
+    if arquivo_metricas:
+        metricas.gravar_metricas(arquivo_metricas)
 
 # Rodapé
 st.sidebar.markdown("---")
+if MULTIUSUARIO:
+    st.sidebar.caption(f"📚 Biblioteca: **{nome_biblioteca_atual()}**")
 st.sidebar.info("📚 Biblioteca de Livros PDF\n\nGerenciador de livros com SQLite")
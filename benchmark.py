@@ -0,0 +1,324 @@
+"""Benchmark das funções principais da biblioteca sobre uma biblioteca sintética.
+
+Uso:
+    python benchmark.py --livros 100000 --pdfs 20 --saida resultados.json
+    python benchmark.py --livros 100000 --comparar resultados_antigos.json
+
+A biblioteca é gerada em uma pasta de trabalho (temporária por padrão, ou
+--pasta para reaproveitá-la entre execuções) e o núcleo (biblioteca.py) é
+importado dentro dela, sem o Streamlit. Os resultados (percentis de latência e picos de memória)
+vão para um JSON, para comparar versões.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Vocabulário dos títulos, autores e textos sintéticos
+SILABAS = ['ba', 'ca', 'da', 'fe', 'ga', 'le', 'ma', 'no', 'pa', 'ri', 'sa', 'te', 'vo', 'xu', 'lo', 'mi', 'ra', 'to']
+CATEGORIAS = ['Ficção', 'Romance', 'Técnico', 'História', 'Filosofia', 'Poesia', 'Ciência', 'Biografia',
+              'Fantasia', 'Suspense', 'Infantil', 'Religião', 'Arte', 'Economia', 'Direito', 'Medicina']
+IDIOMAS = ['Português', 'Inglês', 'Espanhol', 'Francês', 'Alemão', 'Outro']
+
+# Livros inseridos por transação ao gerar a biblioteca
+TAMANHO_LOTE_GERACAO = 10000
+
+# Palavra sintética (2 a 4 sílabas)
+def gerar_palavra(aleatorio):
+    return ''.join(aleatorio.choice(SILABAS) for _ in range(aleatorio.randint(2, 4)))
+
+def gerar_frase(aleatorio, palavras):
+    return ' '.join(gerar_palavra(aleatorio) for _ in range(palavras))
+
+# Escapar texto para uma string literal de PDF
+def _texto_pdf(texto):
+    return texto.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+# Gerar um PDF válido com texto em todas as páginas e dicionário Info (sem dependências)
+def gerar_pdf(num_paginas, titulo, autor, aleatorio, linhas_por_pagina=40):
+    objetos = []
+    num_fonte = 3
+    num_info = 4
+    primeiro_objeto_pagina = 5
+    paginas = [primeiro_objeto_pagina + 2 * i for i in range(num_paginas)]
+
+    objetos.append(b'<< /Type /Catalog /Pages 2 0 R >>')
+    objetos.append(f'<< /Type /Pages /Kids [{" ".join(f"{n} 0 R" for n in paginas)}] /Count {num_paginas} >>'.encode())
+    objetos.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    objetos.append(f'<< /Title ({_texto_pdf(titulo)}) /Author ({_texto_pdf(autor)}) >>'.encode('latin-1', 'replace'))
+    for numero in paginas:
+        linhas = ' T* '.join(f'({_texto_pdf(gerar_frase(aleatorio, 10))}) Tj' for _ in range(linhas_por_pagina))
+        conteudo = f'BT /F1 10 Tf 14 TL 40 800 Td {linhas} ET'.encode()
+        objetos.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            f'/Resources << /Font << /F1 {num_fonte} 0 R >> >> /Contents {numero + 1} 0 R >>'.encode()
+        )
+        objetos.append(b'<< /Length %d >>\nstream\n' % len(conteudo) + conteudo + b'\nendstream')
+
+    saida = bytearray(b'%PDF-1.4\n')
+    posicoes = []
+    for indice, objeto in enumerate(objetos, start=1):
+        posicoes.append(len(saida))
+        saida += b'%d 0 obj\n' % indice + objeto + b'\nendobj\n'
+    inicio_xref = len(saida)
+    saida += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1)
+    for posicao in posicoes:
+        saida += b'%010d 00000 n \n' % posicao
+    saida += (f'trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R /Info {num_info} 0 R >>\n'
+              f'startxref\n{inicio_xref}\n%%EOF\n').encode()
+    return bytes(saida)
+
+# Dados de um livro sintético
+def gerar_dados_livro(aleatorio, indice, autores):
+    titulo = gerar_frase(aleatorio, aleatorio.randint(1, 5)).title()
+    return {
+        'titulo': titulo,
+        'autor': aleatorio.choice(autores),
+        'ano': aleatorio.randint(1850, 2025),
+        'categoria': aleatorio.choice(CATEGORIAS),
+        'idioma': aleatorio.choice(IDIOMAS),
+        'num_paginas': aleatorio.randint(20, 900),
+        'tamanho_kb': aleatorio.randint(100, 50000),
+        'hash_arquivo': hashlib.md5(f'sintetico-{indice}'.encode()).hexdigest(),
+        'nome_arquivo': f'{titulo}.pdf',
+        'notas': gerar_frase(aleatorio, 8) if aleatorio.random() < 0.2 else None
+    }
+
+# Completar a biblioteca até num_livros livros (pode ser retomada com a mesma semente)
+def gerar_biblioteca(biblioteca, num_livros, semente=42):
+    with biblioteca.conexao_leitura() as conn:
+        existentes = conn.execute('SELECT COUNT(*) FROM livros').fetchone()[0]
+    if existentes >= num_livros:
+        return existentes
+
+    aleatorio = random.Random(semente + existentes)
+    autores = [gerar_frase(aleatorio, 2).title() for _ in range(max(10, num_livros // 10))]
+    for inicio in range(existentes, num_livros, TAMANHO_LOTE_GERACAO):
+        fim = min(inicio + TAMANHO_LOTE_GERACAO, num_livros)
+        with biblioteca.conexao_escrita() as conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO livros (titulo, autor, ano, categoria, idioma, num_paginas,
+                                              tamanho_kb, hash_arquivo, nome_arquivo, notas)
+                VALUES (:titulo, :autor, :ano, :categoria, :idioma, :num_paginas,
+                        :tamanho_kb, :hash_arquivo, :nome_arquivo, :notas)
+            ''', (gerar_dados_livro(aleatorio, indice, autores) for indice in range(inicio, fim)))
+        print(f'  {fim}/{num_livros} livros', file=sys.stderr)
+    biblioteca.invalidar_consultas()
+    return num_livros
+
+# Gerar os PDFs sintéticos na pasta de trabalho
+def gerar_pdfs(pasta, quantidade, paginas, semente=42):
+    aleatorio = random.Random(semente)
+    os.makedirs(pasta, exist_ok=True)
+    caminhos = []
+    for indice in range(quantidade):
+        caminho = os.path.join(pasta, f'sintetico_{indice:04d}.pdf')
+        if not os.path.exists(caminho):
+            with open(caminho, 'wb') as f:
+                f.write(gerar_pdf(paginas, gerar_frase(aleatorio, 3).title(), gerar_frase(aleatorio, 2).title(), aleatorio))
+        caminhos.append(caminho)
+    return caminhos
+
+# Percentil (interpolação linear) de uma lista ordenada
+def percentil(valores, p):
+    if len(valores) == 1:
+        return valores[0]
+    posicao = (len(valores) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (posicao - inferior)
+
+# Medir uma função: latências de `repeticoes` chamadas e pico de memória de uma chamada extra
+def medir(nome, funcao, argumentos, antes=None):
+    """argumentos: lista com a tupla de argumentos de cada chamada"""
+    # A última tupla fica para a medição de memória (chamadas como adicionar_livro não podem se repetir)
+    medidos = argumentos[:-1] if len(argumentos) > 1 else argumentos
+    latencias = []
+    for args in medidos:
+        if antes:
+            antes()
+        inicio = time.perf_counter()
+        funcao(*args)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+    # O tracemalloc deixa as chamadas mais lentas, por isso a memória é medida à parte
+    if antes:
+        antes()
+    tracemalloc.start()
+    funcao(*argumentos[-1])
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencias.sort()
+    return {
+        'nome': nome,
+        'amostras': len(latencias),
+        'media_ms': round(sum(latencias) / len(latencias), 3),
+        'p50_ms': round(percentil(latencias, 50), 3),
+        'p95_ms': round(percentil(latencias, 95), 3),
+        'p99_ms': round(percentil(latencias, 99), 3),
+        'max_ms': round(latencias[-1], 3),
+        'pico_memoria_kb': pico // 1024
+    }
+
+# Importar o núcleo com o banco e as pastas dentro da pasta de trabalho
+def importar_biblioteca(pasta):
+    os.chdir(pasta)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import biblioteca
+    biblioteca.init_database()
+    return biblioteca
+
+# Executar o benchmark completo
+def executar(num_livros, num_pdfs, paginas_pdf, repeticoes, pasta, semente=42):
+    biblioteca = importar_biblioteca(pasta)
+
+    inicio = time.perf_counter()
+    gerar_biblioteca(biblioteca, num_livros, semente)
+    tempo_geracao = time.perf_counter() - inicio
+    pdfs = gerar_pdfs(os.path.join(pasta, 'sinteticos'), num_pdfs, paginas_pdf, semente)
+
+    aleatorio = random.Random(semente)
+    with biblioteca.conexao_leitura() as conn:
+        titulos = [row[0] for row in conn.execute('SELECT titulo FROM livros ORDER BY RANDOM() LIMIT ?', (repeticoes,))]
+        autores = [row[0] for row in conn.execute('SELECT autor FROM livros ORDER BY RANDOM() LIMIT ?', (repeticoes,))]
+    termos = [titulo.split()[0][:3] for titulo in titulos]
+
+    def ciclo(argumentos):
+        return [argumentos[i % len(argumentos)] for i in range(repeticoes + 1)]
+
+    resultados = []
+    frio = biblioteca.invalidar_consultas
+
+    resultados.append(medir('buscar_livros[sem filtro]', biblioteca.buscar_livros, ciclo([()]), antes=frio))
+    resultados.append(medir('buscar_livros[titulo]', biblioteca.buscar_livros, ciclo([(t,) for t in titulos]), antes=frio))
+    resultados.append(medir('buscar_livros[autor]', biblioteca.buscar_livros, ciclo([(a,) for a in autores]), antes=frio))
+    resultados.append(medir('buscar_livros[prefixo]', biblioteca.buscar_livros, ciclo([(t,) for t in termos]), antes=frio))
+    resultados.append(medir('buscar_livros[categoria]', biblioteca.buscar_livros,
+                            ciclo([('', c) for c in CATEGORIAS]), antes=frio))
+    resultados.append(medir('buscar_livros[titulo+categoria]', biblioteca.buscar_livros,
+                            ciclo([(t, aleatorio.choice(CATEGORIAS)) for t in termos]), antes=frio))
+    resultados.append(medir('buscar_livros_pagina[primeira]', biblioteca.buscar_livros_pagina, ciclo([()]), antes=frio))
+    resultados.append(medir('buscar_livros[titulo, cache]', biblioteca.buscar_livros, ciclo([(titulos[0],)])))
+    resultados.append(medir('obter_categorias', biblioteca.obter_categorias, ciclo([()]), antes=frio))
+    resultados.append(medir('obter_estatisticas', biblioteca.obter_estatisticas, ciclo([()]), antes=frio))
+
+    with open(pdfs[0], 'rb') as f:
+        pdf_bytes = f.read()
+    resultados.append(medir('calcular_hash[bytes]', biblioteca.calcular_hash, ciclo([(pdf_bytes,)])))
+
+    def hash_arquivo(caminho):
+        with open(caminho, 'rb') as f:
+            return biblioteca.calcular_hash(f)
+    resultados.append(medir('calcular_hash[arquivo]', hash_arquivo, ciclo([(p,) for p in pdfs])))
+    resultados.append(medir('extrair_metadata_pdf', biblioteca.extrair_metadata_pdf, ciclo([(p,) for p in pdfs])))
+
+    # Cada adição usa um PDF novo (hash diferente); os livros adicionados são removidos em seguida
+    autores_novos = [gerar_frase(aleatorio, 2).title() for _ in range(10)]
+    adicoes = []
+    for indice in range(repeticoes + 1):
+        conteudo = gerar_pdf(paginas_pdf, gerar_frase(aleatorio, 3).title(), aleatorio.choice(autores_novos), aleatorio)
+        dados = gerar_dados_livro(aleatorio, f'novo-{time.time_ns()}-{indice}', autores_novos)
+        dados['hash_arquivo'] = biblioteca.calcular_hash(conteudo)
+        adicoes.append((dados, conteudo))
+    resultados.append(medir('adicionar_livro', biblioteca.adicionar_livro, adicoes))
+
+    with biblioteca.conexao_leitura() as conn:
+        ids = [row[0] for row in conn.execute(
+            f"SELECT id FROM livros WHERE hash_arquivo IN ({', '.join('?' * len(adicoes))})",
+            [dados['hash_arquivo'] for dados, _ in adicoes]
+        )]
+    resultados.append(medir('deletar_livro', biblioteca.deletar_livro, [(i,) for i in ids] or [(-1,)]))
+
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'versao': versao_codigo(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'parametros': {
+            'livros': num_livros,
+            'pdfs': num_pdfs,
+            'paginas_pdf': paginas_pdf,
+            'repeticoes': repeticoes,
+            'semente': semente
+        },
+        'geracao_s': round(tempo_geracao, 2),
+        'pico_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'resultados': resultados
+    }
+
+# Commit atual do código (se for um repositório git)
+def versao_codigo():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+# Comparar com um resultado anterior: razão entre os p50 e os p95 (acima de 1 = mais lento agora)
+def comparar(atual, anterior, tolerancia=1.2):
+    """Retorna as linhas do relatório; as que passam da tolerância são marcadas como regressão"""
+    anteriores = {r['nome']: r for r in anterior['resultados']}
+    linhas = []
+    for resultado in atual['resultados']:
+        base = anteriores.get(resultado['nome'])
+        if not base:
+            continue
+        razao_p50 = resultado['p50_ms'] / base['p50_ms'] if base['p50_ms'] else float('inf')
+        razao_p95 = resultado['p95_ms'] / base['p95_ms'] if base['p95_ms'] else float('inf')
+        marca = '  REGRESSÃO' if max(razao_p50, razao_p95) > tolerancia else ''
+        linhas.append(f"{resultado['nome']:<36} p50 x{razao_p50:.2f}  p95 x{razao_p95:.2f}{marca}")
+    return linhas
+
+def imprimir(relatorio):
+    print(f"{'função':<36} {'p50':>10} {'p95':>10} {'p99':>10} {'máx':>10} {'memória':>10}")
+    for r in relatorio['resultados']:
+        print(f"{r['nome']:<36} {r['p50_ms']:>8.2f}ms {r['p95_ms']:>8.2f}ms {r['p99_ms']:>8.2f}ms "
+              f"{r['max_ms']:>8.2f}ms {r['pico_memoria_kb']:>8}KB")
+    print(f"geração da biblioteca: {relatorio['geracao_s']} s, pico de RSS: {relatorio['pico_rss_kb']} KB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark da biblioteca sobre dados sintéticos')
+    parser.add_argument('--livros', type=int, default=1000, help='livros na biblioteca sintética (ex.: 1000, 100000, 1000000)')
+    parser.add_argument('--pdfs', type=int, default=10, help='PDFs sintéticos gerados')
+    parser.add_argument('--paginas', type=int, default=20, help='páginas de cada PDF sintético')
+    parser.add_argument('--repeticoes', type=int, default=50, help='chamadas medidas por função')
+    parser.add_argument('--pasta', help='pasta de trabalho (reaproveitada entre execuções); padrão: temporária')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', default='benchmark.json', help='arquivo JSON com os resultados')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar')
+    args = parser.parse_args(argv)
+
+    saida = os.path.abspath(args.saida)
+    comparar_com = os.path.abspath(args.comparar) if args.comparar else None
+    pasta = os.path.abspath(args.pasta) if args.pasta else tempfile.mkdtemp(prefix='benchmark_biblioteca_')
+    os.makedirs(pasta, exist_ok=True)
+
+    relatorio = executar(args.livros, args.pdfs, args.paginas, args.repeticoes, pasta, args.semente)
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    imprimir(relatorio)
+    print(f'resultados gravados em {saida}')
+    if comparar_com:
+        with open(comparar_com, encoding='utf-8') as f:
+            anterior = json.load(f)
+        print(f"\ncomparação com {anterior.get('versao') or comparar_com}:")
+        for linha in comparar(relatorio, anterior):
+            print(linha)
+
+if __name__ == '__main__':
+    main()
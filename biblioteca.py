@@ -0,0 +1,2488 @@
+"""Núcleo da biblioteca, sem interface: banco de dados, livros, PDFs e Google Books.
+
+Usado pelo app.py (Streamlit) e pelo cli.py. Não depende do Streamlit e
+importa PyPDF2, requests e as partes pesadas só quando são usadas, para que
+scripts e a linha de comando iniciem rápido. Os recursos compartilhados
+(conexões, caches, sessão HTTP) são únicos por processo.
+
+No modo multiusuário cada biblioteca tem a sua pasta em bibliotecas/<nome>/,
+com banco, PDFs e capas próprios. A biblioteca usada pelas funções é a da
+thread atual (selecionar_biblioteca, como a coleta de métricas); sem
+seleção, é a da pasta atual, como antes.
+"""
+import functools
+import hashlib
+import itertools
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import duplicatas
+import exportacao
+import metricas
+from ingestao import (calcular_hash, sondar_metadata_pdf, sondar_metadata_com_limites,
+                      limitar_memoria_processo, contexto_processos, listar_pdfs, varrer_pdfs, nome_item,
+                      hash_item, metadata_item, copiar_item, extrair_paginas_pdf)
+
+# Caminho do banco de dados SQLite
+CAMINHO_BANCO = 'biblioteca.db'
+
+# Conexões SQLite compartilhadas pelo processo
+class GerenciadorConexoes:
+    """Um escritor protegido por lock e um pool limitado de conexões de leitura.
+    
+    Em modo WAL os leitores não bloqueiam o escritor (nem o contrário), e o
+    busy_timeout cobre a concorrência com outros processos. `registro` (se
+    houver) é avisado de cada conexão aberta ou fechada, para limitar o total
+    do processo; fechar_ociosas() libera as conexões que não estão em uso.
+    """
+    
+    def __init__(self, caminho, max_leitores=8, registro=None):
+        self.caminho = caminho
+        self.registro = registro
+        self._lock_escrita = threading.Lock()
+        self._escritor = None
+        self._leitores = queue.LifoQueue()
+        self._vagas_leitura = threading.BoundedSemaphore(max_leitores)
+        self.esquema_criado = False
+        self.fechado = False
+    
+    def _abrir(self):
+        if self.registro is not None:
+            self.registro.reservar_conexao(self)
+        conn = None
+        try:
+            # As consultas são medidas pelo painel de desempenho (sem custo quando desligado)
+            conn = sqlite3.connect(self.caminho, timeout=10, check_same_thread=False, cached_statements=256,
+                                   factory=metricas.ConexaoInstrumentada)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=10000')
+            conn.execute('PRAGMA mmap_size=268435456')
+            conn.execute('PRAGMA temp_store=MEMORY')
+        except BaseException:
+            # A conexão reservada não chegou a ser aberta
+            if conn is not None:
+                conn.close()
+            if self.registro is not None:
+                self.registro.liberar_conexao()
+            raise
+        return conn
+    
+    def _fechar(self, conn):
+        conn.close()
+        if self.registro is not None:
+            self.registro.liberar_conexao()
+    
+    @contextmanager
+    def leitura(self):
+        with self._vagas_leitura:
+            try:
+                conn = self._leitores.get_nowait()
+            except queue.Empty:
+                conn = self._abrir()
+            try:
+                yield conn
+            finally:
+                # Depois de fechar() as conexões em uso são fechadas ao serem devolvidas
+                if self.fechado:
+                    self._fechar(conn)
+                else:
+                    self._leitores.put(conn)
+    
+    @contextmanager
+    def escrita(self):
+        """Transação de escrita: commit ao sair, rollback em caso de erro"""
+        with self._lock_escrita:
+            if self._escritor is None:
+                self._escritor = self._abrir()
+            try:
+                yield self._escritor
+                self._escritor.commit()
+            except BaseException:
+                self._escritor.rollback()
+                raise
+            finally:
+                if self.fechado:
+                    self._fechar(self._escritor)
+                    self._escritor = None
+    
+    def fechar_ociosas(self):
+        """Fechar as conexões que não estão em uso (são reabertas quando necessário); retorna quantas"""
+        fechadas = 0
+        while True:
+            try:
+                conn = self._leitores.get_nowait()
+            except queue.Empty:
+                break
+            self._fechar(conn)
+            fechadas += 1
+        if self._lock_escrita.acquire(blocking=False):
+            try:
+                if self._escritor is not None:
+                    self._fechar(self._escritor)
+                    self._escritor = None
+                    fechadas += 1
+            finally:
+                self._lock_escrita.release()
+        return fechadas
+    
+    def fechar(self):
+        """Fechar todas as conexões: as ociosas agora e as em uso quando forem devolvidas"""
+        self.fechado = True
+        self.fechar_ociosas()
+
+# Pasta com uma subpasta por biblioteca no modo multiusuário (bibliotecas/<nome>/biblioteca.db, pdfs/, capas/)
+PASTA_BIBLIOTECAS = 'bibliotecas'
+
+# Nome de uma biblioteca (é o nome da pasta): letras minúsculas, dígitos, '-' e '_'
+PADRAO_NOME_BIBLIOTECA = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+
+# Bibliotecas mantidas abertas (conexões e cache de consultas) e conexões SQLite abertas no processo,
+# somando todas elas; cada conexão usa 2 ou 3 descritores de arquivo (banco, WAL e memória compartilhada)
+MAX_BIBLIOTECAS_ABERTAS = 128
+MAX_CONEXOES_ABERTAS = 256
+
+# Uma biblioteca: pasta raiz, conexões e cache de consultas
+class Biblioteca:
+    def __init__(self, nome, raiz, registro):
+        """nome None é a biblioteca da pasta atual (raiz '')"""
+        self.nome = nome
+        self.raiz = raiz
+        self.conexoes = GerenciadorConexoes(os.path.join(raiz, CAMINHO_BANCO), registro=registro)
+        self.cache = CacheConsultas()
+        self.acessos_google_books = AcessosPendentes()
+    
+    # Caminho de um arquivo ou pasta dentro da biblioteca
+    def caminho(self, *partes):
+        return os.path.join(self.raiz, *partes)
+
+# Bibliotecas abertas no processo, compartilhadas entre as sessões
+class RegistroBibliotecas:
+    """LRU das bibliotecas abertas, com um limite de conexões SQLite somando todas.
+    
+    Ao passar de max_bibliotecas a menos usada sai do registro e tem as
+    conexões fechadas (as em uso, quando forem devolvidas). Ao abrir uma
+    conexão além de max_conexoes, as conexões ociosas das bibliotecas menos
+    usadas são fechadas antes. O limite só é ultrapassado se todas estiverem
+    em uso, para nunca bloquear uma consulta.
+    """
+    
+    def __init__(self, pasta=PASTA_BIBLIOTECAS, max_bibliotecas=MAX_BIBLIOTECAS_ABERTAS,
+                 max_conexoes=MAX_CONEXOES_ABERTAS):
+        self.pasta = pasta
+        self.max_bibliotecas = max_bibliotecas
+        self.max_conexoes = max_conexoes
+        self.conexoes_abertas = 0
+        self.aberturas = 0
+        self._bibliotecas = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obter(self, nome=None):
+        """Levanta ValueError se o nome for inválido ou a biblioteca não existir (ver criar())"""
+        with self._lock:
+            biblioteca = self._bibliotecas.get(nome)
+            if biblioteca is not None:
+                self._bibliotecas.move_to_end(nome)
+                return biblioteca
+        
+        raiz = '' if nome is None else self._raiz(nome)
+        if nome is not None and not os.path.isdir(raiz):
+            raise ValueError(f"Biblioteca não encontrada: '{nome}'")
+        nova = Biblioteca(nome, raiz, self)
+        
+        removidas = []
+        with self._lock:
+            # Outra thread pode ter aberto a mesma biblioteca ao mesmo tempo
+            biblioteca = self._bibliotecas.setdefault(nome, nova)
+            self._bibliotecas.move_to_end(nome)
+            while len(self._bibliotecas) > self.max_bibliotecas:
+                removidas.append(self._bibliotecas.popitem(last=False)[1])
+        for removida in removidas:
+            removida.conexoes.fechar()
+        return biblioteca
+    
+    def criar(self, nome):
+        """Criar a pasta de uma biblioteca; retorna False se ela já existia"""
+        raiz = self._raiz(nome)
+        if os.path.isdir(raiz):
+            return False
+        os.makedirs(raiz, exist_ok=True)
+        return True
+    
+    def _raiz(self, nome):
+        if not PADRAO_NOME_BIBLIOTECA.match(nome):
+            raise ValueError(f"Nome de biblioteca inválido: '{nome}' (use letras minúsculas, dígitos, '-' e '_')")
+        return os.path.join(self.pasta, nome)
+    
+    def reservar_conexao(self, gerenciador):
+        """Chamado antes de abrir uma conexão de `gerenciador`"""
+        with self._lock:
+            self.conexoes_abertas += 1
+            self.aberturas += 1
+            if self.conexoes_abertas <= self.max_conexoes:
+                return
+            # Menos usadas primeiro
+            candidatos = [b.conexoes for b in self._bibliotecas.values() if b.conexoes is not gerenciador]
+        for candidato in candidatos:
+            if self.conexoes_abertas <= self.max_conexoes:
+                break
+            candidato.fechar_ociosas()
+    
+    def liberar_conexao(self):
+        with self._lock:
+            self.conexoes_abertas -= 1
+    
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'bibliotecas': len(self._bibliotecas),
+                'conexoes_abertas': self.conexoes_abertas,
+                'aberturas': self.aberturas
+            }
+
+@functools.lru_cache(maxsize=None)
+def obter_registro_bibliotecas():
+    return RegistroBibliotecas()
+
+# Biblioteca selecionada na thread atual (None é a da pasta atual)
+_local = threading.local()
+
+def nome_biblioteca_atual():
+    return getattr(_local, 'biblioteca', None)
+
+# Selecionar a biblioteca usada pelas funções deste módulo nesta thread (app.py: uma vez por execução do script)
+def selecionar_biblioteca(nome=None):
+    """Levanta ValueError se o nome for inválido ou a biblioteca não existir"""
+    obter_registro_bibliotecas().obter(nome)
+    _local.biblioteca = nome
+
+# Usar outra biblioteca dentro de um bloco (ex.: no servidor de PDFs)
+@contextmanager
+def usar_biblioteca(nome):
+    anterior = nome_biblioteca_atual()
+    selecionar_biblioteca(nome)
+    try:
+        yield
+    finally:
+        _local.biblioteca = anterior
+
+def biblioteca_atual():
+    return obter_registro_bibliotecas().obter(nome_biblioteca_atual())
+
+# Levar a biblioteca da thread atual para funções executadas em outras threads (ex.: executor.map)
+def propagar_biblioteca(funcao):
+    nome = nome_biblioteca_atual()
+    
+    @functools.wraps(funcao)
+    def envoltorio(*args, **kwargs):
+        with usar_biblioteca(nome):
+            return funcao(*args, **kwargs)
+    return envoltorio
+
+# Criar uma biblioteca do modo multiusuário (as bibliotecas não são criadas ao serem abertas)
+def criar_biblioteca(nome):
+    """Cria a pasta e o banco; retorna False se a biblioteca já existia. Levanta ValueError se o nome for inválido"""
+    criada = obter_registro_bibliotecas().criar(nome)
+    with usar_biblioteca(nome):
+        init_database()
+    return criada
+
+# Bibliotecas existentes no modo multiusuário
+def listar_bibliotecas():
+    if not os.path.isdir(PASTA_BIBLIOTECAS):
+        return []
+    return sorted(entrada.name for entrada in os.scandir(PASTA_BIBLIOTECAS)
+                  if entrada.is_dir() and PADRAO_NOME_BIBLIOTECA.match(entrada.name))
+
+def obter_conexoes():
+    return biblioteca_atual().conexoes
+
+def conexao_leitura():
+    return obter_conexoes().leitura()
+
+def conexao_escrita():
+    return obter_conexoes().escrita()
+
+# Acessos ao cache da Google Books API ainda não gravados no banco
+class AcessosPendentes:
+    """Acertos, falhas e último acesso de cada chave, acumulados em memória.
+    
+    Assim a leitura do cache não disputa a conexão de escrita a cada busca;
+    retirar() entrega o lote para ser gravado e recomeça a contagem. Os
+    acessos de um processo encerrado antes de gravar são perdidos (só
+    afetam as estatísticas e a ordem de remoção do cache).
+    """
+    
+    def __init__(self):
+        self.acertos = 0
+        self.falhas = 0
+        self._ultimo_acesso = {}
+        self._lock = threading.Lock()
+    
+    def registrar(self, chave, agora):
+        """chave None é uma falha; retorna quantos acessos estão pendentes"""
+        with self._lock:
+            if chave is None:
+                self.falhas += 1
+            else:
+                self.acertos += 1
+                self._ultimo_acesso[chave] = agora
+            return self.acertos + self.falhas
+    
+    def contadores(self):
+        with self._lock:
+            return self.acertos, self.falhas
+    
+    def retirar(self):
+        with self._lock:
+            lote = (self.acertos, self.falhas, self._ultimo_acesso)
+            self.acertos = 0
+            self.falhas = 0
+            self._ultimo_acesso = {}
+        return lote
+
+# Intervalo mínimo (segundos) entre duas leituras da geração do banco pelo cache de consultas: é o atraso
+# máximo para ver as alterações feitas por outros processos (as deste processo invalidam o cache na hora)
+INTERVALO_VERIFICACAO_GERACAO = 1.0
+
+# Cache de resultados de consultas, válido enquanto a biblioteca não muda
+class CacheConsultas:
+    """LRU de resultados por (função, argumentos) com um contador de geração.
+    
+    Toda alteração na biblioteca incrementa a geração e descarta os resultados
+    guardados: as deste processo por invalidar(), e as de qualquer processo
+    (cli.py, a sincronização da pasta) pela geração gravada no banco, que
+    sincronizar() confere no máximo a cada intervalo_verificacao segundos;
+    entre uma conferência e outra um acerto não usa o banco. Os valores são
+    compartilhados entre sessões e não devem ser modificados por quem os recebe.
+    """
+    
+    def __init__(self, max_entradas=512, intervalo_verificacao=INTERVALO_VERIFICACAO_GERACAO):
+        self.max_entradas = max_entradas
+        self.intervalo_verificacao = intervalo_verificacao
+        self.geracao = 0
+        self.geracao_banco = None
+        self.verificado_em = float('-inf')
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obter(self, chave, calcular):
+        with self._lock:
+            geracao = self.geracao
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            self.falhas += 1
+        
+        valor = calcular()
+        
+        with self._lock:
+            # Não guardar um resultado calculado antes de uma alteração concorrente
+            if geracao == self.geracao:
+                self._itens[chave] = valor
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.max_entradas:
+                    self._itens.popitem(last=False)
+        return valor
+    
+    def invalidar(self):
+        with self._lock:
+            self.geracao += 1
+            self._itens.clear()
+            # A própria alteração mudou a geração do banco: ler de novo na próxima consulta
+            self.geracao_banco = None
+            self.verificado_em = float('-inf')
+    
+    def sincronizar(self, ler_geracao_banco):
+        """Descartar os resultados se a geração do banco mudou desde a última conferência.
+        
+        ler_geracao_banco() só é chamada se a última conferência foi há mais de intervalo_verificacao segundos.
+        """
+        agora = time.monotonic()
+        with self._lock:
+            if agora - self.verificado_em < self.intervalo_verificacao:
+                return
+            # As outras threads não conferem de novo enquanto esta lê o banco
+            self.verificado_em = agora
+        geracao_banco = ler_geracao_banco()
+        with self._lock:
+            if geracao_banco != self.geracao_banco:
+                self.geracao_banco = geracao_banco
+                self.geracao += 1
+                self._itens.clear()
+    
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'geracao': self.geracao,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'entradas': len(self._itens)
+            }
+
+# Cache de consultas da biblioteca atual
+def obter_cache_consultas():
+    return biblioteca_atual().cache
+
+# Geração do banco: os gatilhos da migração 5 a incrementam a cada alteração nos livros, em qualquer processo
+def ler_geracao_banco():
+    with conexao_leitura() as conn:
+        return conn.execute('SELECT valor FROM geracao_consultas WHERE id = 1').fetchone()[0]
+
+# Decorador: guarda o resultado da consulta até a próxima alteração na biblioteca
+def cache_por_geracao(funcao):
+    @functools.wraps(funcao)
+    def consulta(*args, **kwargs):
+        chave = (funcao.__name__, args, tuple(sorted(kwargs.items())))
+        cache = obter_cache_consultas()
+        cache.sincronizar(ler_geracao_banco)
+        return cache.obter(chave, lambda: funcao(*args, **kwargs))
+    return consulta
+
+# Sinalizar que a biblioteca mudou (chamar depois do commit)
+def invalidar_consultas():
+    obter_cache_consultas().invalidar()
+
+# Executar um script SQL comando a comando na transação atual (o executescript faria commit antes)
+def executar_script(c, script):
+    comando = ''
+    for parte in script.split(';'):
+        comando += parte + ';'
+        # Os gatilhos têm ';' entre BEGIN e END: acumular até o comando estar completo
+        if sqlite3.complete_statement(comando):
+            if comando.strip(' \n;'):
+                c.execute(comando)
+            comando = ''
+
+# Migração 1: esquema original (livros, índices FTS5, páginas, assinaturas, caches e estatísticas)
+def migracao_esquema_inicial(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS livros (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titulo TEXT NOT NULL,
+            autor TEXT,
+            ano INTEGER,
+            categoria TEXT,
+            idioma TEXT,
+            num_paginas INTEGER,
+            tamanho_kb INTEGER,
+            hash_arquivo TEXT UNIQUE,
+            nome_arquivo TEXT,
+            data_adicao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            notas TEXT
+        )
+    ''')
+    
+    # Índice de texto completo (FTS5) sobre os metadados, sem acentos e com prefixos
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'livros_fts'")
+    fts_existia = c.fetchone() is not None
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS livros_fts USING fts5(
+            titulo, autor, categoria, notas,
+            content='livros', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    executar_script(c, '''
+        CREATE TRIGGER IF NOT EXISTS livros_fts_insert AFTER INSERT ON livros BEGIN
+            INSERT INTO livros_fts (rowid, titulo, autor, categoria, notas)
+            VALUES (new.id, new.titulo, new.autor, new.categoria, new.notas);
+        END;
+        CREATE TRIGGER IF NOT EXISTS livros_fts_delete AFTER DELETE ON livros BEGIN
+            INSERT INTO livros_fts (livros_fts, rowid, titulo, autor, categoria, notas)
+            VALUES ('delete', old.id, old.titulo, old.autor, old.categoria, old.notas);
+        END;
+        CREATE TRIGGER IF NOT EXISTS livros_fts_update AFTER UPDATE OF titulo, autor, categoria, notas ON livros BEGIN
+            INSERT INTO livros_fts (livros_fts, rowid, titulo, autor, categoria, notas)
+            VALUES ('delete', old.id, old.titulo, old.autor, old.categoria, old.notas);
+            INSERT INTO livros_fts (rowid, titulo, autor, categoria, notas)
+            VALUES (new.id, new.titulo, new.autor, new.categoria, new.notas);
+        END;
+    ''')
+    if not fts_existia:
+        # Indexar livros cadastrados antes da criação do índice
+        c.execute("INSERT INTO livros_fts (livros_fts) VALUES ('rebuild')")
+    
+    # Texto das páginas dos PDFs e seu índice FTS5 (conteúdo externo em paginas)
+    executar_script(c, '''
+        CREATE TABLE IF NOT EXISTS paginas (
+            id INTEGER PRIMARY KEY,
+            hash_arquivo TEXT NOT NULL,
+            pagina INTEGER NOT NULL,
+            texto TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_paginas_hash ON paginas (hash_arquivo, pagina);
+        CREATE TABLE IF NOT EXISTS conteudo_indexado (
+            hash_arquivo TEXT PRIMARY KEY,
+            paginas_com_texto INTEGER,
+            data_indexacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS paginas_fts USING fts5(
+            texto,
+            content='paginas', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS paginas_fts_insert AFTER INSERT ON paginas BEGIN
+            INSERT INTO paginas_fts (rowid, texto) VALUES (new.id, new.texto);
+        END;
+        CREATE TRIGGER IF NOT EXISTS paginas_fts_delete AFTER DELETE ON paginas BEGIN
+            INSERT INTO paginas_fts (paginas_fts, rowid, texto) VALUES ('delete', old.id, old.texto);
+        END;
+        CREATE TRIGGER IF NOT EXISTS livros_paginas_delete AFTER DELETE ON livros BEGIN
+            DELETE FROM paginas WHERE hash_arquivo = old.hash_arquivo;
+            DELETE FROM conteudo_indexado WHERE hash_arquivo = old.hash_arquivo;
+        END;
+    ''')
+    
+    # Assinaturas MinHash e bandas LSH para encontrar quase duplicatas (tipo: 'texto' ou 'metadados')
+    executar_script(c, '''
+        CREATE TABLE IF NOT EXISTS assinaturas (
+            hash_arquivo TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            assinatura BLOB NOT NULL,
+            PRIMARY KEY (hash_arquivo, tipo)
+        );
+        CREATE TABLE IF NOT EXISTS bandas_lsh (
+            tipo TEXT NOT NULL,
+            banda INTEGER NOT NULL,
+            valor INTEGER NOT NULL,
+            hash_arquivo TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_bandas_lsh_chave ON bandas_lsh (tipo, banda, valor);
+        CREATE INDEX IF NOT EXISTS idx_bandas_lsh_hash ON bandas_lsh (hash_arquivo, tipo);
+        CREATE TRIGGER IF NOT EXISTS livros_assinaturas_delete AFTER DELETE ON livros BEGIN
+            DELETE FROM assinaturas WHERE hash_arquivo = old.hash_arquivo;
+            DELETE FROM bandas_lsh WHERE hash_arquivo = old.hash_arquivo;
+        END;
+    ''')
+    
+    # Livros já processados pelo enriquecimento de metadados (permite retomar de onde parou)
+    executar_script(c, '''
+        CREATE TABLE IF NOT EXISTS enriquecimento (
+            livro_id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL,
+            tentado_em REAL NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS livros_enriquecimento_delete AFTER DELETE ON livros BEGIN
+            DELETE FROM enriquecimento WHERE livro_id = old.id;
+        END;
+    ''')
+    
+    # Cache persistente das respostas da Google Books API
+    executar_script(c, '''
+        CREATE TABLE IF NOT EXISTS cache_google_books (
+            chave TEXT PRIMARY KEY,
+            resposta TEXT NOT NULL,
+            criado_em REAL NOT NULL,
+            ultimo_acesso REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_cache_google_books_acesso ON cache_google_books (ultimo_acesso);
+        CREATE TABLE IF NOT EXISTS contadores_cache (
+            nome TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL DEFAULT 0
+        );
+    ''')
+    
+    # Cache de capas: arquivos endereçados pelo hash do conteúdo e as URLs que apontam para eles
+    executar_script(c, '''
+        CREATE TABLE IF NOT EXISTS capas (
+            hash TEXT PRIMARY KEY,
+            extensao TEXT NOT NULL,
+            tamanho INTEGER NOT NULL,
+            ultimo_acesso REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_capas_acesso ON capas (ultimo_acesso);
+        CREATE TABLE IF NOT EXISTS capas_urls (
+            url TEXT PRIMARY KEY,
+            hash TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_capas_urls_hash ON capas_urls (hash);
+    ''')
+    
+    # Agregados das estatísticas, mantidos por gatilhos
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'estatisticas_totais'")
+    estatisticas_existiam = c.fetchone() is not None
+    executar_script(c, sql_estatisticas())
+    if not estatisticas_existiam:
+        recalcular_estatisticas(c)
+
+# Migração 2: índices para a listagem por data, o filtro por categoria e os agrupamentos das estatísticas
+def migracao_indices_consultas(c):
+    executar_script(c, '''
+        CREATE INDEX IF NOT EXISTS idx_livros_data_adicao ON livros (data_adicao);
+        CREATE INDEX IF NOT EXISTS idx_livros_categoria_data ON livros (categoria, data_adicao);
+        CREATE INDEX IF NOT EXISTS idx_livros_autor ON livros (autor);
+        CREATE INDEX IF NOT EXISTS idx_livros_ano ON livros (ano);
+    ''')
+
+# Migração 3: um índice de cobertura por faceta (a coluna da faceta primeiro, as das outras em seguida),
+# para a contagem de cada faceta agrupar na ordem do índice, filtrando pelas outras sem ler a tabela.
+# Os índices de autor e ano da migração 2 viram prefixos destes.
+def migracao_indices_facetas(c):
+    executar_script(c, '''
+        CREATE INDEX IF NOT EXISTS idx_livros_facetas_categoria ON livros (categoria, idioma, ano, autor);
+        CREATE INDEX IF NOT EXISTS idx_livros_facetas_idioma ON livros (idioma, categoria, ano, autor);
+        CREATE INDEX IF NOT EXISTS idx_livros_facetas_ano ON livros (ano, categoria, idioma, autor);
+        CREATE INDEX IF NOT EXISTS idx_livros_facetas_autor ON livros (autor, categoria, idioma, ano);
+        DROP INDEX IF EXISTS idx_livros_autor;
+        DROP INDEX IF EXISTS idx_livros_ano;
+    ''')
+
+# Migração 4: índice da pasta monitorada, (caminho, tamanho, mtime, inode) -> hash, para não ler de novo
+# os arquivos que não mudaram
+def migracao_arquivos_sincronizados(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS arquivos_sincronizados (
+            caminho TEXT PRIMARY KEY,
+            tamanho INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            hash_arquivo TEXT,
+            erro TEXT
+        ) WITHOUT ROWID
+    ''')
+
+# Migração 5: geração do banco para o cache de consultas, incrementada pelas alterações que mudam os
+# resultados guardados (livros e conteúdo indexado), inclusive as feitas por outros processos
+def migracao_geracao_consultas(c):
+    executar_script(c, '''
+        CREATE TABLE IF NOT EXISTS geracao_consultas (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            valor INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO geracao_consultas (id, valor) VALUES (1, 0);
+    ''')
+    for tabela in ('livros', 'conteudo_indexado'):
+        for evento in ('INSERT', 'UPDATE', 'DELETE'):
+            c.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS geracao_{tabela}_{evento.lower()} AFTER {evento} ON {tabela} BEGIN
+                    UPDATE geracao_consultas SET valor = valor + 1 WHERE id = 1;
+                END
+            ''')
+
+# Migração 6: estatisticas_anos com a chave sem tipo (era INTEGER PRIMARY KEY, que recusava anos não inteiros
+# e abortava a inclusão ou edição do livro); a tabela é recriada e os agregados recalculados
+def migracao_estatisticas_anos(c):
+    for evento in ('insert', 'delete', 'update'):
+        c.execute(f'DROP TRIGGER IF EXISTS estatisticas_anos_livros_{evento}')
+    c.execute('DROP TABLE IF EXISTS estatisticas_anos')
+    executar_script(c, sql_estatisticas())
+    recalcular_estatisticas(c)
+
+# Migrações do esquema, em ordem: (versão, função). PRAGMA user_version guarda a última aplicada.
+# Cada migração roda em uma transação, junto com a atualização do user_version: se falhar no meio,
+# nada dela fica no banco. Use executar_script (não executescript, que faz commit) nos scripts.
+MIGRACOES = [
+    (1, migracao_esquema_inicial),
+    (2, migracao_indices_consultas),
+    (3, migracao_indices_facetas),
+    (4, migracao_arquivos_sincronizados),
+    (5, migracao_geracao_consultas),
+    (6, migracao_estatisticas_anos),
+]
+
+def versao_esquema(c):
+    return c.execute('PRAGMA user_version').fetchone()[0]
+
+# Aplicar as migrações pendentes; retorna as versões aplicadas
+def aplicar_migracoes(c):
+    versao_atual = versao_esquema(c)
+    versao_codigo = MIGRACOES[-1][0]
+    if versao_atual > versao_codigo:
+        raise RuntimeError(f'O banco está na versão {versao_atual} do esquema, mais nova que a deste código ({versao_codigo})')
+    
+    aplicadas = []
+    for versao, migracao in MIGRACOES:
+        if versao > versao_atual:
+            # Sem o BEGIN explícito o módulo sqlite3 executaria os CREATE fora de transação
+            c.execute('BEGIN IMMEDIATE')
+            try:
+                migracao(c)
+                c.execute(f'PRAGMA user_version = {versao}')
+                c.execute('COMMIT')
+            except BaseException:
+                c.execute('ROLLBACK')
+                raise
+            aplicadas.append(versao)
+    
+    if aplicadas:
+        # Estatísticas para o planejador escolher os índices novos (amostradas, para não ler o banco todo)
+        c.execute('PRAGMA analysis_limit = 1000')
+        c.execute('ANALYZE')
+    return aplicadas
+
+# Inicializar banco de dados (uma vez por processo; as chamadas seguintes não fazem nada)
+def init_database():
+    gerenciador = obter_conexoes()
+    if gerenciador.esquema_criado:
+        return
+    
+    with gerenciador.escrita() as conn:
+        c = conn.cursor()
+        aplicar_migracoes(c)
+        # Atualiza as estatísticas do planejador só onde elas ficaram desatualizadas
+        c.execute('PRAGMA optimize')
+    gerenciador.esquema_criado = True
+
+# Agrupamentos das estatísticas: (tabela, coluna de livros, condição para contar o valor)
+GRUPOS_ESTATISTICAS = [
+    ('estatisticas_categorias', 'categoria', "{v}.categoria IS NOT NULL AND {v}.categoria != ''"),
+    ('estatisticas_autores', 'autor', "{v}.autor IS NOT NULL AND {v}.autor != ''"),
+    ('estatisticas_anos', 'ano', '{v}.ano IS NOT NULL'),
+]
+
+# Tabelas e gatilhos que mantêm os agregados das estatísticas atualizados
+def sql_estatisticas():
+    sql = '''
+        CREATE TABLE IF NOT EXISTS estatisticas_totais (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_livros INTEGER NOT NULL DEFAULT 0,
+            total_paginas INTEGER NOT NULL DEFAULT 0,
+            total_autores INTEGER NOT NULL DEFAULT 0,
+            total_categorias INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TRIGGER IF NOT EXISTS estatisticas_livros_insert AFTER INSERT ON livros BEGIN
+            UPDATE estatisticas_totais
+            SET total_livros = total_livros + 1, total_paginas = total_paginas + COALESCE(new.num_paginas, 0)
+            WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS estatisticas_livros_delete AFTER DELETE ON livros BEGIN
+            UPDATE estatisticas_totais
+            SET total_livros = total_livros - 1, total_paginas = total_paginas - COALESCE(old.num_paginas, 0)
+            WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS estatisticas_livros_update_paginas AFTER UPDATE OF num_paginas ON livros BEGIN
+            UPDATE estatisticas_totais
+            SET total_paginas = total_paginas - COALESCE(old.num_paginas, 0) + COALESCE(new.num_paginas, 0)
+            WHERE id = 1;
+        END;
+    '''
+    
+    for tabela, coluna, condicao in GRUPOS_ESTATISTICAS:
+        contar = f'''
+            INSERT INTO {tabela} ({coluna}, total) SELECT new.{coluna}, 1 WHERE {condicao.format(v='new')}
+            ON CONFLICT({coluna}) DO UPDATE SET total = total + 1;
+        '''
+        descontar = f'''
+            UPDATE {tabela} SET total = total - 1 WHERE {coluna} = old.{coluna};
+            DELETE FROM {tabela} WHERE {coluna} = old.{coluna} AND total <= 0;
+        '''
+        # ano sem tipo: livros.ano aceita qualquer valor ('', 's.d.', 1999.5) e INTEGER PRIMARY KEY
+        # (apelido do rowid) recusaria os que não são inteiros, abortando a alteração em livros
+        sql += f'''
+            CREATE TABLE IF NOT EXISTS {tabela} (
+                {coluna} {'' if coluna == 'ano' else 'TEXT'} PRIMARY KEY,
+                total INTEGER NOT NULL
+            );
+            CREATE TRIGGER IF NOT EXISTS {tabela}_livros_insert AFTER INSERT ON livros BEGIN
+                {contar}
+            END;
+            CREATE TRIGGER IF NOT EXISTS {tabela}_livros_delete AFTER DELETE ON livros BEGIN
+                {descontar}
+            END;
+            CREATE TRIGGER IF NOT EXISTS {tabela}_livros_update AFTER UPDATE OF {coluna} ON livros
+            WHEN old.{coluna} IS NOT new.{coluna} BEGIN
+                {descontar}
+                {contar}
+            END;
+        '''
+    
+    # Número de autores e categorias distintos acompanha as linhas das tabelas de referência
+    for tabela, total in [('estatisticas_autores', 'total_autores'), ('estatisticas_categorias', 'total_categorias')]:
+        sql += f'''
+            CREATE TRIGGER IF NOT EXISTS {tabela}_insert AFTER INSERT ON {tabela} BEGIN
+                UPDATE estatisticas_totais SET {total} = {total} + 1 WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS {tabela}_delete AFTER DELETE ON {tabela} BEGIN
+                UPDATE estatisticas_totais SET {total} = {total} - 1 WHERE id = 1;
+            END;
+        '''
+    return sql
+
+# Contagem de livros por valor de uma coluna (recálculo das estatísticas)
+def sql_contagem_grupo(coluna, condicao):
+    return f'''
+        SELECT {coluna}, COUNT(*) FROM livros
+        WHERE {condicao.format(v='livros')}
+        GROUP BY {coluna}
+    '''
+
+# Recalcular do zero os agregados das estatísticas a partir da tabela livros
+def recalcular_estatisticas(c):
+    # Limpar as tabelas de referência antes de recriar os totais: os gatilhos delas descontam
+    # total_autores e total_categorias a cada linha removida
+    for tabela, _, _ in GRUPOS_ESTATISTICAS:
+        c.execute(f'DELETE FROM {tabela}')
+    c.execute('DELETE FROM estatisticas_totais')
+    c.execute('''
+        INSERT INTO estatisticas_totais (id, total_livros, total_paginas)
+        SELECT 1, COUNT(*), COALESCE(SUM(num_paginas), 0) FROM livros
+    ''')
+    for tabela, coluna, condicao in GRUPOS_ESTATISTICAS:
+        # Os gatilhos das tabelas de referência atualizam total_autores e total_categorias
+        c.execute(f'INSERT INTO {tabela} ({coluna}, total) {sql_contagem_grupo(coluna, condicao)}')
+
+# Pesos do bm25 para titulo, autor, categoria e notas
+PESOS_BM25 = '10.0, 5.0, 2.0, 1.0'
+
+# Converter o texto digitado em uma consulta FTS5 (todos os termos, com prefixo)
+def montar_consulta_fts(filtro):
+    termos = re.findall(r'\w+', filtro or '')
+    return ' '.join(f'"{termo}"*' for termo in termos)
+
+# Extrair metadados do PDF (caminhos são lidos em um processo separado, com limites)
+@metricas.instrumentar(metricas.PDF)
+def extrair_metadata_pdf(pdf_file):
+    """Levanta exceção se o PDF não puder ser lido"""
+    if isinstance(pdf_file, str):
+        return sondar_metadata_com_limites(pdf_file)
+    return sondar_metadata_pdf(pdf_file)
+
+# Endpoint padrão de tokens OAuth2 (o JSON da conta de serviço pode definir outro em token_uri)
+URL_TOKEN_GOOGLE = "https://oauth2.googleapis.com/token"
+
+# Renovar o token alguns segundos antes de expirar
+MARGEM_RENOVACAO_TOKEN = 120
+
+# Cache de tokens de acesso por conta de serviço, compartilhado entre sessões
+class CacheTokens:
+    """Guarda (token, instante de expiração) por conta e renova um de cada vez"""
+    
+    def __init__(self, margem=MARGEM_RENOVACAO_TOKEN):
+        self.margem = margem
+        self._tokens = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+    
+    def obter(self, chave, solicitar):
+        """Retorna o token válido da chave ou chama solicitar() -> (token, expires_in)"""
+        with self._lock:
+            lock_chave = self._locks.setdefault(chave, threading.Lock())
+        
+        # Apenas uma sessão por conta solicita um token novo; as outras aguardam e reutilizam
+        with lock_chave:
+            token, expira_em = self._tokens.get(chave, (None, 0))
+            if token and time.time() < expira_em - self.margem:
+                return token
+            
+            token, expires_in = solicitar()
+            if token:
+                self._tokens[chave] = (token, time.time() + expires_in)
+            else:
+                self._tokens.pop(chave, None)
+            return token
+    
+    def invalidar(self, chave):
+        with self._lock:
+            self._tokens.pop(chave, None)
+
+@functools.lru_cache(maxsize=None)
+def obter_cache_tokens():
+    return CacheTokens()
+
+# Chave do cache de tokens: identifica a conta de serviço e a chave privada usada
+def chave_conta_servico(service_account_info):
+    return (
+        service_account_info["client_email"],
+        service_account_info.get("private_key_id") or hashlib.sha256(service_account_info["private_key"].encode()).hexdigest(),
+        service_account_info.get("token_uri") or URL_TOKEN_GOOGLE
+    )
+
+# Assinar o JWT e trocá-lo por um token de acesso
+def solicitar_token_service_account(service_account_info):
+    """Retorna (access_token, expires_in) ou (None, 0) em caso de falha"""
+    token_url = service_account_info.get("token_uri") or URL_TOKEN_GOOGLE
+    
+    # Criar JWT
+    header = {
+        "alg": "RS256",
+        "typ": "JWT"
+    }
+    
+    now = int(time.time())
+    claim_set = {
+        "iss": service_account_info["client_email"],
+        "scope": "https://www.googleapis.com/auth/books",
+        "aud": token_url,
+        "exp": now + 3600,
+        "iat": now
+    }
+    
+    # A conta de serviço depende da biblioteca PyJWT
+    try:
+        import jwt
+    except ImportError:
+        raise ImportError("Biblioteca PyJWT não instalada. Use chave API ao invés de conta de serviço.")
+    
+    private_key = service_account_info["private_key"]
+    token = jwt.encode(claim_set, private_key, algorithm="RS256", headers=header)
+    
+    # Trocar JWT por token de acesso
+    data = {
+        "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
+        "assertion": token
+    }
+    
+    response = obter_sessao_http().post(token_url, data=data, timeout=10)
+    if response.status_code == 200:
+        dados = response.json()
+        return dados.get("access_token"), int(dados.get("expires_in", 3600))
+    return None, 0
+
+# Token de acesso da conta de serviço (compartilhado pelo cache de tokens)
+def obter_token(service_account_info):
+    return obter_cache_tokens().obter(
+        chave_conta_servico(service_account_info),
+        lambda: solicitar_token_service_account(service_account_info)
+    )
+
+# Endpoint de busca de volumes da Google Books API
+URL_GOOGLE_BOOKS = 'https://www.googleapis.com/books/v1/volumes'
+
+# Validade e tamanho máximo do cache de respostas da Google Books API
+TTL_CACHE_GOOGLE_BOOKS = 7 * 24 * 3600
+MAX_ENTRADAS_CACHE_GOOGLE_BOOKS = 2000
+
+# Leituras do cache acumuladas em memória antes de gravar os contadores e os acessos no banco
+MAX_ACESSOS_PENDENTES_GOOGLE_BOOKS = 100
+
+# Sessão HTTP compartilhada (conexões reutilizadas, novas tentativas com espera exponencial)
+@functools.lru_cache(maxsize=None)
+def obter_sessao_http():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'POST']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    sessao = requests.Session()
+    sessao.mount('https://', adapter)
+    sessao.mount('http://', adapter)
+    return metricas.instrumentar_sessao_http(sessao)
+
+# Chave do cache: consulta normalizada e número de resultados
+def chave_cache_google_books(query, max_results):
+    return f"{' '.join(query.lower().split())}|{max_results}"
+
+# Incrementar um contador persistente do cache
+def incrementar_contador(c, nome, quantidade=1):
+    c.execute('''
+        INSERT INTO contadores_cache (nome, valor) VALUES (?, ?)
+        ON CONFLICT(nome) DO UPDATE SET valor = valor + excluded.valor
+    ''', (nome, quantidade))
+
+# Gravar os acessos ao cache acumulados em memória (dentro de uma transação de escrita)
+def gravar_acessos_cache_google_books(c):
+    acertos, falhas, ultimo_acesso = biblioteca_atual().acessos_google_books.retirar()
+    if acertos:
+        incrementar_contador(c, 'google_books_acertos', acertos)
+    if falhas:
+        incrementar_contador(c, 'google_books_falhas', falhas)
+    c.executemany('UPDATE cache_google_books SET ultimo_acesso = MAX(ultimo_acesso, ?) WHERE chave = ?',
+                  [(agora, chave) for chave, agora in ultimo_acesso.items()])
+
+# Ler resposta do cache (None se ausente ou expirada)
+def ler_cache_google_books(chave):
+    """Só usa a conexão de escrita a cada MAX_ACESSOS_PENDENTES_GOOGLE_BOOKS leituras, para gravar os contadores"""
+    agora = time.time()
+    with conexao_leitura() as conn:
+        resultado = conn.execute(
+            'SELECT resposta FROM cache_google_books WHERE chave = ? AND criado_em > ?',
+            (chave, agora - TTL_CACHE_GOOGLE_BOOKS)
+        ).fetchone()
+    acessos = biblioteca_atual().acessos_google_books
+    if acessos.registrar(chave if resultado is not None else None, agora) >= MAX_ACESSOS_PENDENTES_GOOGLE_BOOKS:
+        with conexao_escrita() as conn:
+            gravar_acessos_cache_google_books(conn.cursor())
+    if resultado is None:
+        return None
+    return json.loads(resultado[0])
+
+# Gravar resposta no cache, removendo entradas expiradas e as menos usadas
+def gravar_cache_google_books(chave, itens):
+    agora = time.time()
+    with conexao_escrita() as conn:
+        c = conn.cursor()
+        # Os acessos pendentes entram antes da limpeza, que remove as entradas menos usadas
+        gravar_acessos_cache_google_books(c)
+        c.execute('''
+            INSERT OR REPLACE INTO cache_google_books (chave, resposta, criado_em, ultimo_acesso)
+            VALUES (?, ?, ?, ?)
+        ''', (chave, json.dumps(itens), agora, agora))
+        c.execute('DELETE FROM cache_google_books WHERE criado_em <= ?', (agora - TTL_CACHE_GOOGLE_BOOKS,))
+        c.execute('''
+            DELETE FROM cache_google_books WHERE chave IN (
+                SELECT chave FROM cache_google_books
+                ORDER BY ultimo_acesso DESC
+                LIMIT -1 OFFSET ?
+            )
+        ''', (MAX_ENTRADAS_CACHE_GOOGLE_BOOKS,))
+
+# Estatísticas do cache da Google Books API
+def obter_estatisticas_cache_google_books():
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute("SELECT nome, valor FROM contadores_cache WHERE nome LIKE 'google_books_%'")
+        contadores = dict(c.fetchall())
+        c.execute('SELECT COUNT(*) FROM cache_google_books')
+        entradas = c.fetchone()[0]
+    acertos, falhas = biblioteca_atual().acessos_google_books.contadores()
+    return {
+        'acertos': contadores.get('google_books_acertos', 0) + acertos,
+        'falhas': contadores.get('google_books_falhas', 0) + falhas,
+        'entradas': entradas
+    }
+
+# Pasta do cache de capas (ao lado de pdfs/), tamanho máximo e downloads simultâneos
+PASTA_CAPAS = 'capas'
+LIMITE_CACHE_CAPAS_MB = 100
+MAX_DOWNLOADS_CAPAS = 8
+
+# Tamanho máximo de uma capa (as miniaturas da Google Books têm dezenas de KB) e tempo limite do download
+TAMANHO_MAXIMO_CAPA = 512 * 1024
+TEMPO_LIMITE_CAPAS = 10
+
+# Extensões dos tipos de imagem aceitos como capa
+EXTENSOES_CAPAS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/gif': '.gif', 'image/webp': '.webp'}
+
+# Caminho de uma capa no disco
+def caminho_capa(hash_conteudo, extensao):
+    return biblioteca_atual().caminho(PASTA_CAPAS, hash_conteudo[:2], f'{hash_conteudo}{extensao}')
+
+# Baixar uma capa e gravá-la pelo hash do conteúdo (executado em threads)
+def baixar_capa(url):
+    """Retorna (url, hash, extensao, tamanho) ou (url, None, None, 0) se falhar ou passar de TAMANHO_MAXIMO_CAPA"""
+    try:
+        # Lida em partes, para não guardar na memória uma resposta maior que o limite
+        with obter_sessao_http().get(url, timeout=TEMPO_LIMITE_CAPAS, stream=True) as response:
+            tipo = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if response.status_code != 200 or tipo not in EXTENSOES_CAPAS:
+                return url, None, None, 0
+            tamanho_declarado = response.headers.get('Content-Length', '')
+            if tamanho_declarado.isdigit() and int(tamanho_declarado) > TAMANHO_MAXIMO_CAPA:
+                return url, None, None, 0
+            
+            partes = []
+            recebidos = 0
+            for parte in response.iter_content(64 * 1024):
+                recebidos += len(parte)
+                if recebidos > TAMANHO_MAXIMO_CAPA:
+                    return url, None, None, 0
+                partes.append(parte)
+        
+        conteudo = b''.join(partes)
+        hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+        extensao = EXTENSOES_CAPAS[tipo]
+        destino = caminho_capa(hash_conteudo, extensao)
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            temporario = f'{destino}.{threading.get_ident()}.tmp'
+            with open(temporario, 'wb') as f:
+                f.write(conteudo)
+            os.replace(temporario, destino)
+        return url, hash_conteudo, extensao, len(conteudo)
+    except Exception:
+        return url, None, None, 0
+
+# Remover as capas menos usadas até o cache caber no limite
+def reduzir_cache_capas(c, limite_bytes):
+    c.execute('SELECT COALESCE(SUM(tamanho), 0) FROM capas')
+    total = c.fetchone()[0]
+    if total <= limite_bytes:
+        return
+    
+    c.execute('SELECT hash, extensao, tamanho FROM capas ORDER BY ultimo_acesso')
+    removidas = []
+    for hash_conteudo, extensao, tamanho in c.fetchall():
+        if total <= limite_bytes:
+            break
+        removidas.append((hash_conteudo, extensao))
+        total -= tamanho
+    
+    c.executemany('DELETE FROM capas WHERE hash = ?', [(h,) for h, _ in removidas])
+    c.executemany('DELETE FROM capas_urls WHERE hash = ?', [(h,) for h, _ in removidas])
+    for hash_conteudo, extensao in removidas:
+        caminho = caminho_capa(hash_conteudo, extensao)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+# Obter as capas do cache local, baixando em paralelo as que faltam
+def obter_capas(urls):
+    """Retorna {url: caminho_local}; URLs que não puderam ser baixadas ficam de fora"""
+    urls = list(dict.fromkeys(url for url in urls if url))
+    if not urls:
+        return {}
+    
+    capas = {}
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute(f'''
+            SELECT capas_urls.url, capas.hash, capas.extensao FROM capas_urls
+            JOIN capas ON capas.hash = capas_urls.hash
+            WHERE capas_urls.url IN ({', '.join('?' * len(urls))})
+        ''', urls)
+        for url, hash_conteudo, extensao in c.fetchall():
+            caminho = caminho_capa(hash_conteudo, extensao)
+            if os.path.exists(caminho):
+                capas[url] = (caminho, hash_conteudo)
+    
+    faltando = [url for url in urls if url not in capas]
+    baixadas = []
+    if faltando:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(MAX_DOWNLOADS_CAPAS, len(faltando))) as executor:
+            baixadas = [resultado for resultado in executor.map(metricas.propagar(propagar_biblioteca(baixar_capa)), faltando) if resultado[1]]
+    
+    agora = time.time()
+    with conexao_escrita() as conn:
+        c = conn.cursor()
+        c.executemany('''
+            INSERT INTO capas (hash, extensao, tamanho, ultimo_acesso) VALUES (?, ?, ?, ?)
+            ON CONFLICT(hash) DO UPDATE SET ultimo_acesso = excluded.ultimo_acesso
+        ''', [(hash_conteudo, extensao, tamanho, agora) for _, hash_conteudo, extensao, tamanho in baixadas])
+        c.executemany(
+            'INSERT OR REPLACE INTO capas_urls (url, hash) VALUES (?, ?)',
+            [(url, hash_conteudo) for url, hash_conteudo, _, _ in baixadas]
+        )
+        c.executemany(
+            'UPDATE capas SET ultimo_acesso = ? WHERE hash = ?',
+            [(agora, hash_conteudo) for _, hash_conteudo in capas.values()]
+        )
+        reduzir_cache_capas(c, LIMITE_CACHE_CAPAS_MB * 1024 * 1024)
+    
+    resultado = {url: caminho for url, (caminho, _) in capas.items()}
+    for url, hash_conteudo, extensao, _ in baixadas:
+        caminho = caminho_capa(hash_conteudo, extensao)
+        if os.path.exists(caminho):
+            resultado[url] = caminho
+    return resultado
+
+# Erro na consulta à Google Books API (a mensagem pode ser exibida ao usuário)
+class ErroGoogleBooks(Exception):
+    pass
+
+# Token recusado pela API (revogado ou expirado antes do previsto)
+class TokenExpirado(ErroGoogleBooks):
+    pass
+
+# Buscar livros na Google Books API (com token de conta de serviço ou chave API, se houver)
+def buscar_google_books(query, max_results=10, access_token=None, api_key=''):
+    """Levanta ErroGoogleBooks se a busca falhar"""
+    import requests
+    
+    chave = chave_cache_google_books(query, max_results)
+    itens = ler_cache_google_books(chave)
+    if itens is not None:
+        return itens
+    
+    params = {'q': query, 'maxResults': max_results}
+    headers = None
+    if access_token:
+        headers = {"Authorization": f"Bearer {access_token}"}
+    elif api_key:
+        params['key'] = api_key
+    
+    try:
+        response = obter_sessao_http().get(URL_GOOGLE_BOOKS, params=params, headers=headers, timeout=10)
+    except requests.exceptions.Timeout:
+        raise ErroGoogleBooks("⏱️ Tempo de espera esgotado. Tente novamente.")
+    except Exception as e:
+        raise ErroGoogleBooks(f"Erro ao buscar livros: {str(e)}")
+    
+    if response.status_code == 200:
+        itens = response.json().get('items', [])
+        gravar_cache_google_books(chave, itens)
+        return itens
+    if response.status_code == 401 and access_token:
+        raise TokenExpirado("⚠️ Token de acesso expirado. Tente novamente.")
+    if response.status_code == 403:
+        if access_token:
+            raise ErroGoogleBooks("⚠️ Erro de autorização. Verifique as permissões da conta de serviço.")
+        raise ErroGoogleBooks("⚠️ Limite de requisições atingido ou chave API inválida. "
+                              "Configure sua chave API ou conta de serviço nas configurações.")
+    raise ErroGoogleBooks(f"Erro na busca: {response.status_code}")
+
+# Livros sem autor, sem categoria ou com o ano padrão do formulário (o ano em que foram cadastrados)
+def livros_incompletos(limite=None, repetir_sem_resultado=False):
+    """Ignora os livros já enriquecidos; os que deram erro são tentados de novo"""
+    status_ignorados = ('atualizado',) if repetir_sem_resultado else ('atualizado', 'sem_resultado')
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute(f'''
+            SELECT id, titulo, autor, categoria,
+                   ano IS NULL OR ano = CAST(strftime('%Y', data_adicao) AS INTEGER)
+            FROM livros
+            WHERE (autor IS NULL OR autor = '' OR categoria IS NULL OR categoria = ''
+                   OR ano IS NULL OR ano = CAST(strftime('%Y', data_adicao) AS INTEGER))
+              AND id NOT IN (
+                  SELECT livro_id FROM enriquecimento
+                  WHERE status IN ({', '.join('?' * len(status_ignorados))})
+              )
+            ORDER BY id
+            LIMIT ?
+        ''', (*status_ignorados, -1 if limite is None else limite))
+        return [
+            {'id': livro_id, 'titulo': titulo, 'autor': autor, 'categoria': categoria, 'ano_incompleto': bool(ano_incompleto)}
+            for livro_id, titulo, autor, categoria, ano_incompleto in c.fetchall()
+        ]
+
+# Gravar um lote do enriquecimento: preenche só os campos vazios e registra o status de cada livro
+def gravar_enriquecimento(lote):
+    """lote: lista de (livro_id, status, campos)"""
+    agora = time.time()
+    with conexao_escrita() as conn:
+        c = conn.cursor()
+        for livro_id, status, campos in lote:
+            if status == 'atualizado':
+                c.execute('''
+                    UPDATE livros
+                    SET autor = COALESCE(NULLIF(autor, ''), ?),
+                        categoria = COALESCE(NULLIF(categoria, ''), ?),
+                        ano = COALESCE(?, ano)
+                    WHERE id = ?
+                ''', (campos.get('autor'), campos.get('categoria'), campos.get('ano'), livro_id))
+                if 'autor' in campos:
+                    c.execute('SELECT hash_arquivo, titulo, autor FROM livros WHERE id = ?', (livro_id,))
+                    row = c.fetchone()
+                    if row and row[0]:
+                        registrar_assinatura(c, row[0], 'metadados', duplicatas.assinatura_metadados(row[1], row[2]))
+        c.executemany(
+            'INSERT OR REPLACE INTO enriquecimento (livro_id, status, tentado_em) VALUES (?, ?, ?)',
+            [(livro_id, status, agora) for livro_id, status, _ in lote]
+        )
+    invalidar_consultas()
+
+# Consulta da Google Books API usada pelo enriquecimento (roda em threads, sem st.*)
+def criar_consulta_enriquecimento(service_account_info=None, api_key=''):
+    """As credenciais são lidas da sessão antes, na thread do script"""
+    params = {'key': api_key} if api_key and not service_account_info else {}
+    
+    def obter_headers():
+        token = obter_cache_tokens().obter(
+            chave_conta_servico(service_account_info),
+            lambda: solicitar_token_service_account(service_account_info)
+        )
+        return {"Authorization": f"Bearer {token}"}
+    import enriquecimento
+    
+    consultar_api = enriquecimento.criar_consulta_http(obter_sessao_http(), URL_GOOGLE_BOOKS, params,
+                                                       obter_headers if service_account_info else None)
+    
+    # Mesmo cache das buscas manuais
+    def consultar(consulta):
+        chave = chave_cache_google_books(consulta, 5)
+        itens = ler_cache_google_books(chave)
+        if itens is None:
+            itens = consultar_api(consulta)
+            gravar_cache_google_books(chave, itens)
+        return itens
+    return consultar
+
+# Enriquecer os livros incompletos com a Google Books API
+def enriquecer_biblioteca(limite=None, taxa=None, repetir_sem_resultado=False, progresso=None,
+                          service_account_info=None, api_key=''):
+    """Retorna o relatório de enriquecimento.enriquecer_livros; pode ser interrompido e retomado"""
+    import enriquecimento
+    
+    consultar = metricas.propagar(propagar_biblioteca(criar_consulta_enriquecimento(service_account_info, api_key)))
+    livros = livros_incompletos(limite, repetir_sem_resultado)
+    return enriquecimento.enriquecer_livros(livros, consultar, gravar_enriquecimento,
+                                            taxa=taxa or enriquecimento.TAXA_REQUISICOES, progresso=progresso)
+
+# Pasta dos PDFs, organizada em subpastas pelo hash (pdfs/ab/cd/<hash>.pdf)
+PASTA_PDFS = 'pdfs'
+
+# Pasta dos uploads em andamento (no mesmo disco de pdfs/, para a renomeação ser atômica)
+PASTA_UPLOADS = os.path.join(PASTA_PDFS, '.uploads')
+
+# Pastas dos PDFs e dos uploads da biblioteca atual
+def pasta_pdfs():
+    return biblioteca_atual().caminho(PASTA_PDFS)
+
+def pasta_uploads():
+    return biblioteca_atual().caminho(PASTA_UPLOADS)
+
+# Salvar arquivo PDF no disco
+@metricas.instrumentar(metricas.ARQUIVO)
+def salvar_pdf(file_bytes, hash_arquivo):
+    # Salvar arquivo com o hash como nome, criando as subpastas se não existirem
+    caminho_arquivo = preparar_caminho_pdf(hash_arquivo)
+    with open(caminho_arquivo, 'wb') as f:
+        f.write(file_bytes)
+    return caminho_arquivo
+
+# Mover um upload já gravado em disco para o seu lugar definitivo (renomeação atômica)
+@metricas.instrumentar(metricas.ARQUIVO)
+def mover_pdf(caminho_temporario, hash_arquivo):
+    caminho_arquivo = preparar_caminho_pdf(hash_arquivo)
+    os.replace(caminho_temporario, caminho_arquivo)
+    return caminho_arquivo
+
+# Remover uploads abandonados há mais de um dia
+def limpar_uploads_antigos(idade_maxima=24 * 3600):
+    pasta = pasta_uploads()
+    if not os.path.isdir(pasta):
+        return
+    limite = time.time() - idade_maxima
+    for entrada in os.scandir(pasta):
+        if entrada.is_file() and entrada.stat().st_mtime < limite:
+            os.remove(entrada.path)
+
+# Caminho do arquivo PDF no disco
+def caminho_pdf(hash_arquivo):
+    return os.path.join(pasta_pdfs(), hash_arquivo[:2], hash_arquivo[2:4], f'{hash_arquivo}.pdf')
+
+# Caminho antigo, com todos os PDFs direto em pdfs/
+def caminho_pdf_antigo(hash_arquivo):
+    return os.path.join(pasta_pdfs(), f'{hash_arquivo}.pdf')
+
+# Caminho do PDF, criando as subpastas se necessário
+def preparar_caminho_pdf(hash_arquivo):
+    caminho_arquivo = caminho_pdf(hash_arquivo)
+    os.makedirs(os.path.dirname(caminho_arquivo), exist_ok=True)
+    return caminho_arquivo
+
+# Localizar o PDF no disco (nas subpastas ou, se ainda não migrado, em pdfs/)
+def localizar_pdf(hash_arquivo):
+    for caminho_arquivo in (caminho_pdf(hash_arquivo), caminho_pdf_antigo(hash_arquivo)):
+        if os.path.exists(caminho_arquivo):
+            return caminho_arquivo
+    return None
+
+# Localizar o PDF de uma biblioteca pelo nome (usado pelo servidor de PDFs, fora das threads do app)
+def localizar_pdf_biblioteca(hash_arquivo, nome=None):
+    with usar_biblioteca(nome):
+        return localizar_pdf(hash_arquivo)
+
+# Carregar arquivo PDF do disco
+@metricas.instrumentar(metricas.ARQUIVO)
+def carregar_pdf(hash_arquivo, limite_bytes=None):
+    """Lê o PDF do disco; retorna None se não existir ou exceder limite_bytes"""
+    caminho_arquivo = localizar_pdf(hash_arquivo)
+    if caminho_arquivo is None:
+        return None
+    if limite_bytes is not None and os.path.getsize(caminho_arquivo) > limite_bytes:
+        return None
+    with open(caminho_arquivo, 'rb') as f:
+        return f.read()
+
+# Chave dos links assinados do servidor de PDFs (compartilhada com `python servidor_pdfs.py` e,
+# no modo multiusuário, entre as bibliotecas: o nome da biblioteca entra na assinatura)
+CAMINHO_CHAVE_LINKS = '.chave_links'
+
+@functools.lru_cache(maxsize=None)
+def obter_chave_links():
+    import servidor_pdfs
+    return servidor_pdfs.obter_chave(CAMINHO_CHAVE_LINKS)
+
+# Servidor de PDFs rodando em uma thread deste processo (um por endereço)
+@functools.lru_cache(maxsize=None)
+def iniciar_servidor_pdfs(host, porta):
+    import servidor_pdfs
+    
+    servidor = servidor_pdfs.ServidorPDFs((host, porta), localizar_pdf_biblioteca, obter_chave_links(), silencioso=True)
+    threading.Thread(target=servidor.serve_forever, name='servidor-pdfs', daemon=True).start()
+    return servidor
+
+# Link assinado e temporário para abrir o PDF pelo servidor de PDFs
+def gerar_link_pdf(url_base, hash_arquivo, nome_arquivo=None, validade=None):
+    import servidor_pdfs
+    
+    return servidor_pdfs.gerar_link(url_base, obter_chave_links(), hash_arquivo, nome_arquivo,
+                                    validade or servidor_pdfs.VALIDADE_LINKS, nome_biblioteca_atual())
+
+# Nome de arquivo de um PDF armazenado (<md5>.pdf)
+PADRAO_ARQUIVO_PDF = re.compile(r'^([0-9a-f]{32})\.pdf$')
+
+# Migrar os PDFs de pdfs/ para as subpastas; pode ser interrompida e retomada
+def migrar_pdfs_para_subpastas():
+    """Gerador que produz o número de arquivos movidos até o momento"""
+    pasta = pasta_pdfs()
+    if not os.path.isdir(pasta):
+        return
+    movidos = 0
+    with os.scandir(pasta) as entradas:
+        for entrada in entradas:
+            correspondencia = PADRAO_ARQUIVO_PDF.match(entrada.name)
+            if correspondencia and entrada.is_file():
+                os.replace(entrada.path, preparar_caminho_pdf(correspondencia.group(1)))
+                movidos += 1
+                yield movidos
+
+# Listar os PDFs armazenados: {hash: caminho}
+def listar_pdfs_armazenados():
+    arquivos = {}
+    for raiz, pastas, nomes in os.walk(pasta_pdfs()):
+        # Ignorar uploads em andamento
+        pastas[:] = [pasta for pasta in pastas if not pasta.startswith('.')]
+        for nome in nomes:
+            correspondencia = PADRAO_ARQUIVO_PDF.match(nome)
+            if correspondencia:
+                arquivos[correspondencia.group(1)] = os.path.join(raiz, nome)
+    return arquivos
+
+# Conferir se o conteúdo do arquivo corresponde ao hash do nome (executado em threads)
+def conferir_hash_pdf(hash_e_caminho):
+    hash_arquivo, caminho_arquivo = hash_e_caminho
+    try:
+        with open(caminho_arquivo, 'rb') as f:
+            return hash_arquivo, caminho_arquivo, calcular_hash(f) == hash_arquivo, None
+    except OSError as e:
+        return hash_arquivo, caminho_arquivo, False, str(e)
+
+# Verificar a integridade entre a tabela livros e os arquivos em pdfs/
+def verificar_integridade(conferir_conteudo=True, max_workers=8):
+    """Gerador que produz (atual, total, relatorio).
+    
+    relatorio: {'ausentes': [hash], 'orfaos': [caminho], 'divergentes': [caminho],
+    'erros': [(caminho, erro)], 'verificados': n}
+    """
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute('SELECT hash_arquivo FROM livros WHERE hash_arquivo IS NOT NULL')
+        hashes_banco = {row[0] for row in c.fetchall()}
+    
+    arquivos = listar_pdfs_armazenados()
+    relatorio = {
+        'ausentes': sorted(hashes_banco - arquivos.keys()),
+        'orfaos': sorted(caminho for hash_arquivo, caminho in arquivos.items() if hash_arquivo not in hashes_banco),
+        'divergentes': [],
+        'erros': [],
+        'verificados': 0
+    }
+    
+    a_conferir = [(h, caminho) for h, caminho in arquivos.items() if h in hashes_banco] if conferir_conteudo else []
+    if not a_conferir:
+        yield 0, 0, relatorio
+        return
+    
+    from concurrent.futures import ThreadPoolExecutor
+    
+    # Leitura em paralelo: o cálculo do MD5 libera o GIL e o disco atende várias leituras
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for atual, (hash_arquivo, caminho_arquivo, confere, erro) in enumerate(executor.map(conferir_hash_pdf, a_conferir), start=1):
+            if erro:
+                relatorio['erros'].append((caminho_arquivo, erro))
+            elif not confere:
+                relatorio['divergentes'].append(caminho_arquivo)
+            relatorio['verificados'] = atual
+            yield atual, len(a_conferir), relatorio
+
+# Páginas gravadas por transação na indexação do conteúdo
+PAGINAS_POR_LOTE_INDEXACAO = 200
+
+# Indexar o conteúdo do PDF no índice de páginas
+@metricas.instrumentar(metricas.PDF)
+def indexar_conteudo_pdf(hash_arquivo):
+    """Indexa o texto de cada página do PDF; retorna o número de páginas com texto.
+    
+    O texto é extraído fora das transações e gravado em lotes de
+    PAGINAS_POR_LOTE_INDEXACAO páginas, cada um em uma transação curta, para
+    não segurar o escritor durante a leitura de um PDF grande. O livro só é
+    marcado como indexado no último lote: se a indexação for interrompida,
+    ele continua pendente e o primeiro lote da próxima apaga as páginas gravadas.
+    """
+    caminho_arquivo = localizar_pdf(hash_arquivo)
+    if caminho_arquivo is None:
+        return 0
+    
+    # As primeiras páginas ficam guardadas para a assinatura de duplicatas
+    primeiras_paginas = []
+    paginas = extrair_paginas_pdf(caminho_arquivo)
+    primeiro_lote = True
+    total = 0
+    while True:
+        lote = [(hash_arquivo, numero, texto) for numero, texto in itertools.islice(paginas, PAGINAS_POR_LOTE_INDEXACAO)]
+        for _, _, texto in lote:
+            if len(primeiras_paginas) < duplicatas.MAX_PAGINAS_ASSINATURA:
+                primeiras_paginas.append(texto)
+        ultimo_lote = len(lote) < PAGINAS_POR_LOTE_INDEXACAO
+        
+        with conexao_escrita() as conn:
+            c = conn.cursor()
+            if primeiro_lote:
+                c.execute('DELETE FROM conteudo_indexado WHERE hash_arquivo = ?', (hash_arquivo,))
+                c.execute('DELETE FROM paginas WHERE hash_arquivo = ?', (hash_arquivo,))
+            c.executemany('INSERT INTO paginas (hash_arquivo, pagina, texto) VALUES (?, ?, ?)', lote)
+            total += len(lote)
+            if ultimo_lote:
+                registrar_assinatura(c, hash_arquivo, 'texto',
+                                     duplicatas.calcular_assinatura(duplicatas.shingles_texto(primeiras_paginas)))
+                c.execute('''
+                    INSERT OR REPLACE INTO conteudo_indexado (hash_arquivo, paginas_com_texto)
+                    VALUES (?, ?)
+                ''', (hash_arquivo, total))
+        primeiro_lote = False
+        if ultimo_lote:
+            break
+    invalidar_consultas()
+    return total
+
+# Indexar o conteúdo dos livros que ainda não foram indexados
+def reindexar_conteudo():
+    """Gerador que indexa os PDFs pendentes e produz (atual, total, hash_arquivo, erro)"""
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute('''
+            SELECT hash_arquivo FROM livros
+            WHERE hash_arquivo IS NOT NULL
+              AND hash_arquivo NOT IN (SELECT hash_arquivo FROM conteudo_indexado)
+        ''')
+        pendentes = [row[0] for row in c.fetchall()]
+    
+    for atual, hash_arquivo in enumerate(pendentes, start=1):
+        try:
+            indexar_conteudo_pdf(hash_arquivo)
+            yield atual, len(pendentes), hash_arquivo, None
+        except Exception as e:
+            yield atual, len(pendentes), hash_arquivo, str(e)
+
+# Buscar trechos no conteúdo dos PDFs
+@cache_por_geracao
+def buscar_conteudo(filtro, limite=50):
+    """Retorna [(id, titulo, autor, [(pagina, trecho), ...])] ordenado por relevância"""
+    consulta_fts = montar_consulta_fts(filtro)
+    if not consulta_fts:
+        return []
+    
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute('''
+            SELECT livros.id, livros.titulo, livros.autor, paginas.pagina,
+                   snippet(paginas_fts, 0, '**', '**', '…', 16)
+            FROM paginas_fts
+            JOIN paginas ON paginas.id = paginas_fts.rowid
+            JOIN livros ON livros.hash_arquivo = paginas.hash_arquivo
+            WHERE paginas_fts MATCH ?
+            ORDER BY bm25(paginas_fts)
+            LIMIT ?
+        ''', (consulta_fts, limite))
+    
+        # Agrupar as páginas encontradas por livro, mantendo a ordem de relevância
+        resultados = {}
+        for livro_id, titulo, autor, pagina, trecho in c.fetchall():
+            if livro_id not in resultados:
+                resultados[livro_id] = (livro_id, titulo, autor, [])
+            resultados[livro_id][3].append((pagina, trecho))
+    return list(resultados.values())
+
+# Gravar a assinatura de um livro e as suas bandas LSH (substitui as anteriores do mesmo tipo)
+def registrar_assinatura(c, hash_arquivo, tipo, assinatura):
+    c.execute('DELETE FROM assinaturas WHERE hash_arquivo = ? AND tipo = ?', (hash_arquivo, tipo))
+    c.execute('DELETE FROM bandas_lsh WHERE hash_arquivo = ? AND tipo = ?', (hash_arquivo, tipo))
+    if assinatura is None:
+        return
+    c.execute('INSERT INTO assinaturas (hash_arquivo, tipo, assinatura) VALUES (?, ?, ?)',
+              (hash_arquivo, tipo, duplicatas.serializar(assinatura)))
+    c.executemany(
+        'INSERT INTO bandas_lsh (tipo, banda, valor, hash_arquivo) VALUES (?, ?, ?, ?)',
+        [(tipo, banda, valor, hash_arquivo) for banda, valor in duplicatas.bandas(assinatura)]
+    )
+
+# Livros com alguma banda LSH igual à da assinatura e similaridade estimada acima do limite
+def candidatos_duplicata(c, assinatura, tipo, limite_similaridade, ignorar_hash=None):
+    """Retorna {hash_arquivo: similaridade}; cada banda é uma busca no índice (tipo, banda, valor)"""
+    if assinatura is None:
+        return {}
+    candidatos = set()
+    for banda, valor in duplicatas.bandas(assinatura):
+        c.execute('SELECT hash_arquivo FROM bandas_lsh WHERE tipo = ? AND banda = ? AND valor = ?',
+                  (tipo, banda, valor))
+        candidatos.update(row[0] for row in c.fetchall())
+    candidatos.discard(ignorar_hash)
+    
+    similares = {}
+    for hash_candidato in candidatos:
+        c.execute('SELECT assinatura FROM assinaturas WHERE hash_arquivo = ? AND tipo = ?', (hash_candidato, tipo))
+        row = c.fetchone()
+        if row:
+            valor = duplicatas.similaridade(assinatura, duplicatas.desserializar(row[0]))
+            if valor >= limite_similaridade:
+                similares[hash_candidato] = valor
+    return similares
+
+# Similaridade mínima para apontar uma possível duplicata
+LIMITE_SIMILARIDADE_TEXTO = 0.5
+LIMITE_SIMILARIDADE_METADADOS = 0.7
+
+# Procurar possíveis duplicatas de um livro pelo texto e pelo título/autor
+def procurar_duplicatas(titulo, autor, assinatura_texto=None, ignorar_hash=None):
+    """Retorna [(id, titulo, autor, similaridade_texto, similaridade_metadados)], mais parecidos primeiro"""
+    assinatura_metadados = duplicatas.assinatura_metadados(titulo, autor)
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        por_texto = candidatos_duplicata(c, assinatura_texto, 'texto', LIMITE_SIMILARIDADE_TEXTO, ignorar_hash)
+        por_metadados = candidatos_duplicata(c, assinatura_metadados, 'metadados',
+                                             LIMITE_SIMILARIDADE_METADADOS, ignorar_hash)
+    
+        resultados = []
+        for hash_candidato in set(por_texto) | set(por_metadados):
+            c.execute('SELECT id, titulo, autor FROM livros WHERE hash_arquivo = ?', (hash_candidato,))
+            row = c.fetchone()
+            if row:
+                resultados.append((*row, por_texto.get(hash_candidato), por_metadados.get(hash_candidato)))
+    
+    resultados.sort(key=lambda r: (r[3] or 0, r[4] or 0), reverse=True)
+    return resultados
+
+# Pares de livros da biblioteca que parecem duplicados pelo texto
+def listar_pares_duplicados(limite_similaridade=LIMITE_SIMILARIDADE_TEXTO):
+    """Retorna [(similaridade, (id, titulo), (id, titulo))], mais parecidos primeiro"""
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute('''
+            SELECT DISTINCT a.hash_arquivo, b.hash_arquivo
+            FROM bandas_lsh a
+            JOIN bandas_lsh b ON b.tipo = a.tipo AND b.banda = a.banda AND b.valor = a.valor
+                             AND b.hash_arquivo > a.hash_arquivo
+            WHERE a.tipo = 'texto'
+        ''')
+        pares_candidatos = c.fetchall()
+    
+        livros = {}
+        for hash_arquivo in {h for par in pares_candidatos for h in par}:
+            c.execute('''
+                SELECT livros.id, livros.titulo, assinaturas.assinatura
+                FROM livros JOIN assinaturas ON assinaturas.hash_arquivo = livros.hash_arquivo
+                WHERE livros.hash_arquivo = ? AND assinaturas.tipo = 'texto'
+            ''', (hash_arquivo,))
+            row = c.fetchone()
+            if row:
+                livros[hash_arquivo] = ((row[0], row[1]), duplicatas.desserializar(row[2]))
+    
+    pares = []
+    for hash_a, hash_b in pares_candidatos:
+        if hash_a in livros and hash_b in livros:
+            valor = duplicatas.similaridade(livros[hash_a][1], livros[hash_b][1])
+            if valor >= limite_similaridade:
+                pares.append((valor, livros[hash_a][0], livros[hash_b][0]))
+    pares.sort(key=lambda par: par[0], reverse=True)
+    return pares
+
+# Calcular as assinaturas que faltam (livros cadastrados antes do índice de duplicatas)
+def calcular_assinaturas_pendentes():
+    """Usa o texto já indexado em paginas; retorna quantas assinaturas foram gravadas"""
+    with conexao_escrita() as conn:
+        c = conn.cursor()
+        c.execute('''
+            SELECT hash_arquivo, titulo, autor FROM livros
+            WHERE hash_arquivo IS NOT NULL
+              AND hash_arquivo NOT IN (SELECT hash_arquivo FROM assinaturas WHERE tipo = 'metadados')
+        ''')
+        sem_metadados = c.fetchall()
+        for hash_arquivo, titulo, autor in sem_metadados:
+            registrar_assinatura(c, hash_arquivo, 'metadados', duplicatas.assinatura_metadados(titulo, autor))
+    
+        c.execute('''
+            SELECT hash_arquivo FROM conteudo_indexado
+            WHERE paginas_com_texto > 0
+              AND hash_arquivo NOT IN (SELECT hash_arquivo FROM assinaturas WHERE tipo = 'texto')
+        ''')
+        sem_texto = [row[0] for row in c.fetchall()]
+        for hash_arquivo in sem_texto:
+            c.execute('SELECT texto FROM paginas WHERE hash_arquivo = ? ORDER BY pagina LIMIT ?',
+                      (hash_arquivo, duplicatas.MAX_PAGINAS_ASSINATURA))
+            paginas = [row[0] for row in c.fetchall()]
+            registrar_assinatura(c, hash_arquivo, 'texto',
+                                 duplicatas.calcular_assinatura(duplicatas.shingles_texto(paginas)))
+    return len(sem_metadados) + len(sem_texto)
+
+# Adicionar livro ao banco de dados
+def adicionar_livro(dados_livro, file_bytes=None, caminho_temporario=None, indexar=True):
+    """Retorna False se o livro já existir. Com indexar=True, uma falha ao indexar o
+    conteúdo só é registrada no log (o livro continua adicionado)."""
+    try:
+        with conexao_escrita() as conn:
+            c = conn.cursor()
+            c.execute('''
+                INSERT INTO livros (titulo, autor, ano, categoria, idioma, num_paginas, 
+                                   tamanho_kb, hash_arquivo, nome_arquivo, notas)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                dados_livro['titulo'],
+                dados_livro['autor'],
+                dados_livro['ano'],
+                dados_livro['categoria'],
+                dados_livro['idioma'],
+                dados_livro['num_paginas'],
+                dados_livro['tamanho_kb'],
+                dados_livro['hash_arquivo'],
+                dados_livro['nome_arquivo'],
+                dados_livro['notas']
+            ))
+            registrar_assinatura(c, dados_livro['hash_arquivo'], 'metadados',
+                                 duplicatas.assinatura_metadados(dados_livro['titulo'], dados_livro['autor']))
+    except sqlite3.IntegrityError:
+        return False
+    invalidar_consultas()
+    
+    # Salvar arquivo PDF se fornecido (em memória ou já gravado em um temporário)
+    if file_bytes or caminho_temporario:
+        if caminho_temporario:
+            mover_pdf(caminho_temporario, dados_livro['hash_arquivo'])
+        else:
+            salvar_pdf(file_bytes, dados_livro['hash_arquivo'])
+        if indexar:
+            try:
+                indexar_conteudo_pdf(dados_livro['hash_arquivo'])
+            except Exception:
+                import logging
+                logging.getLogger(__name__).warning('Não foi possível indexar o conteúdo do PDF %s', dados_livro['hash_arquivo'], exc_info=True)
+    
+    return True
+
+# Hashes (entre os informados) que já estão cadastrados
+def hashes_existentes(hashes):
+    existentes = set()
+    hashes = list(hashes)
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        for inicio in range(0, len(hashes), 500):
+            lote = hashes[inicio:inicio + 500]
+            c.execute(
+                f"SELECT hash_arquivo FROM livros WHERE hash_arquivo IN ({', '.join('?' * len(lote))})",
+                lote
+            )
+            existentes.update(row[0] for row in c.fetchall())
+    return existentes
+
+# Gravar um lote de livros importados: copia os PDFs e insere tudo em uma transação
+def gravar_lote_importacao(lote):
+    """lote: lista de (item, dados_livro); retorna quantos livros foram inseridos"""
+    for item, dados_livro in lote:
+        if localizar_pdf(dados_livro['hash_arquivo']) is None:
+            copiar_item(item, preparar_caminho_pdf(dados_livro['hash_arquivo']))
+    
+    inseridos = 0
+    with conexao_escrita() as conn:
+        c = conn.cursor()
+        for _, dados_livro in lote:
+            c.execute('''
+                INSERT OR IGNORE INTO livros (titulo, autor, ano, categoria, idioma, num_paginas,
+                                              tamanho_kb, hash_arquivo, nome_arquivo, notas)
+                VALUES (:titulo, :autor, :ano, :categoria, :idioma, :num_paginas,
+                        :tamanho_kb, :hash_arquivo, :nome_arquivo, :notas)
+            ''', dados_livro)
+            # rowcount é 0 se o hash já estava cadastrado: a assinatura do livro existente fica como está
+            if c.rowcount == 1:
+                inseridos += 1
+                registrar_assinatura(c, dados_livro['hash_arquivo'], 'metadados',
+                                     duplicatas.assinatura_metadados(dados_livro['titulo'], dados_livro['autor']))
+    invalidar_consultas()
+    return inseridos
+
+# Dados de um livro importado, a partir dos metadados do PDF
+def dados_livro_importado(item, metadata, hash_arquivo, tamanho_kb):
+    nome_arquivo = nome_item(item)
+    return {
+        'titulo': metadata['titulo'] or os.path.splitext(nome_arquivo)[0],
+        'autor': metadata['autor'] or None,
+        'ano': None,
+        'categoria': None,
+        'idioma': None,
+        'num_paginas': metadata['num_paginas'],
+        'tamanho_kb': tamanho_kb,
+        'hash_arquivo': hash_arquivo,
+        'nome_arquivo': nome_arquivo,
+        'notas': None
+    }
+
+# Importar em lote uma pasta ou um arquivo ZIP de PDFs
+def importar_em_lote(origem, max_workers=None, tamanho_lote=100):
+    """Gerador que produz (etapa, atual, total, relatorio) durante a importação.
+    
+    Os hashes e metadados são calculados em processos auxiliares; duplicatas
+    são descartadas pelo hash antes da leitura dos metadados. O relatório é
+    atualizado no lugar: {'importados', 'duplicados', 'erros': [(arquivo, erro)]}.
+    """
+    relatorio = {'importados': 0, 'duplicados': 0, 'erros': []}
+    itens = listar_pdfs(origem)
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    # Cada processo auxiliar tem a memória limitada; o tempo é limitado por arquivo em metadata_item
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=limitar_memoria_processo,
+                             mp_context=contexto_processos()) as executor:
+        # Etapa 1: hashes
+        hashes = {}
+        vistos = set()
+        for atual, (item, hash_arquivo, tamanho_kb, erro) in enumerate(executor.map(hash_item, itens, chunksize=8), start=1):
+            if erro:
+                relatorio['erros'].append((nome_item(item), erro))
+            elif hash_arquivo in vistos:
+                relatorio['duplicados'] += 1
+            else:
+                vistos.add(hash_arquivo)
+                hashes[item] = (hash_arquivo, tamanho_kb)
+            yield 'hash', atual, len(itens), relatorio
+        
+        # Descartar livros já cadastrados antes de ler os metadados
+        existentes = hashes_existentes(hash_arquivo for hash_arquivo, _ in hashes.values())
+        novos = [item for item, (hash_arquivo, _) in hashes.items() if hash_arquivo not in existentes]
+        relatorio['duplicados'] += len(hashes) - len(novos)
+        
+        # Etapa 2: metadados e gravação em lotes
+        lote = []
+        for atual, (item, metadata, erro) in enumerate(executor.map(metadata_item, novos, chunksize=4), start=1):
+            if erro:
+                relatorio['erros'].append((nome_item(item), erro))
+            else:
+                lote.append((item, dados_livro_importado(item, metadata, *hashes[item])))
+            
+            if len(lote) >= tamanho_lote or (atual == len(novos) and lote):
+                try:
+                    inseridos = gravar_lote_importacao(lote)
+                    relatorio['importados'] += inseridos
+                    relatorio['duplicados'] += len(lote) - inseridos
+                except Exception as e:
+                    relatorio['erros'].extend((nome_item(item_lote), str(e)) for item_lote, _ in lote)
+                lote = []
+            
+            yield 'metadados', atual, len(novos), relatorio
+
+# Arquivos modificados há menos que isto (segundos) podem estar sendo copiados e ficam para a próxima varredura
+IDADE_MINIMA_SINCRONIZACAO = 5
+
+# Entradas do índice da pasta monitorada: {caminho: (tamanho, mtime_ns, inode)}
+def ler_indice_sincronizacao(pasta):
+    # Intervalo de chaves com o prefixo da pasta (usa a chave primária, ao contrário de LIKE)
+    prefixo = os.path.join(pasta, '')
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute('''
+            SELECT caminho, tamanho, mtime_ns, inode FROM arquivos_sincronizados
+            WHERE caminho >= ? AND caminho < ?
+        ''', (prefixo, prefixo[:-1] + chr(ord(prefixo[-1]) + 1)))
+        return {caminho: (tamanho, mtime_ns, inode) for caminho, tamanho, mtime_ns, inode in c.fetchall()}
+
+# Gravar entradas do índice: [(caminho, tamanho, mtime_ns, inode, hash_arquivo, erro)]
+def gravar_indice_sincronizacao(c, entradas):
+    c.executemany('''
+        INSERT INTO arquivos_sincronizados (caminho, tamanho, mtime_ns, inode, hash_arquivo, erro)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(caminho) DO UPDATE SET
+            tamanho = excluded.tamanho, mtime_ns = excluded.mtime_ns, inode = excluded.inode,
+            hash_arquivo = excluded.hash_arquivo, erro = excluded.erro
+    ''', entradas)
+
+# Sincronizar a pasta monitorada: só os arquivos novos ou alterados são lidos
+def sincronizar_pasta(pasta, max_workers=None, tamanho_lote=100):
+    """Gerador que produz (etapa, atual, total, relatorio), como importar_em_lote.
+    
+    Arquivos com o mesmo (tamanho, mtime, inode) do índice não são abertos. Os
+    novos ou alterados têm o hash calculado em processos auxiliares; os que não
+    estão na biblioteca têm os metadados lidos e são gravados em lotes. A entrada
+    de um arquivo só vai para o índice depois que o seu livro foi gravado, então
+    uma sincronização interrompida é retomada na próxima. Arquivos com erro ficam
+    no índice e só são lidos de novo quando mudarem. O relatório é:
+    {'arquivos', 'inalterados', 'lidos', 'importados', 'duplicados', 'removidos', 'erros': [(caminho, erro)]}.
+    """
+    pasta = os.path.abspath(pasta)
+    if not os.path.isdir(pasta):
+        raise ValueError(f"'{pasta}' não é uma pasta")
+    
+    relatorio = {'arquivos': 0, 'inalterados': 0, 'lidos': 0, 'importados': 0, 'duplicados': 0,
+                 'removidos': 0, 'erros': []}
+    indice = ler_indice_sincronizacao(pasta)
+    limite_mtime = time.time_ns() - IDADE_MINIMA_SINCRONIZACAO * 10 ** 9
+    alterados = {}
+    for caminho, tamanho, mtime_ns, inode in varrer_pdfs(pasta):
+        relatorio['arquivos'] += 1
+        if indice.pop(caminho, None) == (tamanho, mtime_ns, inode):
+            relatorio['inalterados'] += 1
+        elif mtime_ns < limite_mtime:
+            alterados[(caminho, None)] = (tamanho, mtime_ns, inode)
+    yield 'varredura', relatorio['arquivos'], relatorio['arquivos'], relatorio
+    
+    # O que sobrou no índice não existe mais na pasta (os livros continuam na biblioteca)
+    if indice:
+        with conexao_escrita() as conn:
+            conn.executemany('DELETE FROM arquivos_sincronizados WHERE caminho = ?', [(caminho,) for caminho in indice])
+        relatorio['removidos'] = len(indice)
+    if not alterados:
+        return
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    def entrada(item, hash_arquivo=None, erro=None):
+        return (item[0], *alterados[item], hash_arquivo, erro)
+    
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=limitar_memoria_processo,
+                             mp_context=contexto_processos()) as executor:
+        # Etapa 1: hashes; arquivos já cadastrados (ou repetidos na pasta) só entram no índice
+        hashes = {}
+        vistos = set()
+        conhecidos = []
+        repetidos = []
+        for atual, (item, hash_arquivo, tamanho_kb, erro) in enumerate(
+            executor.map(hash_item, list(alterados), chunksize=8), start=1
+        ):
+            relatorio['lidos'] += 1
+            if erro:
+                relatorio['erros'].append((item[0], erro))
+                conhecidos.append(entrada(item, erro=erro))
+            elif hash_arquivo in vistos:
+                relatorio['duplicados'] += 1
+                repetidos.append(entrada(item, hash_arquivo))
+            else:
+                vistos.add(hash_arquivo)
+                hashes[item] = (hash_arquivo, tamanho_kb)
+            yield 'hash', atual, len(alterados), relatorio
+        
+        existentes = hashes_existentes(hash_arquivo for hash_arquivo, _ in hashes.values())
+        novos = []
+        for item, (hash_arquivo, _) in hashes.items():
+            if hash_arquivo in existentes:
+                conhecidos.append(entrada(item, hash_arquivo))
+            else:
+                novos.append(item)
+        relatorio['duplicados'] += len(hashes) - len(novos)
+        with conexao_escrita() as conn:
+            gravar_indice_sincronizacao(conn, conhecidos)
+        
+        # Etapa 2: metadados e gravação em lotes, pelo mesmo caminho da importação em lote
+        lote = []
+        falhas = []
+        for atual, (item, metadata, erro) in enumerate(executor.map(metadata_item, novos, chunksize=4), start=1):
+            if erro:
+                relatorio['erros'].append((item[0], erro))
+                falhas.append(entrada(item, hashes[item][0], erro))
+            else:
+                lote.append((item, dados_livro_importado(item, metadata, *hashes[item])))
+            
+            if len(lote) >= tamanho_lote or (atual == len(novos) and (lote or falhas)):
+                try:
+                    if lote:
+                        inseridos = gravar_lote_importacao(lote)
+                        relatorio['importados'] += inseridos
+                        relatorio['duplicados'] += len(lote) - inseridos
+                    with conexao_escrita() as conn:
+                        gravar_indice_sincronizacao(conn, [entrada(item_lote, dados['hash_arquivo']) for item_lote, dados in lote] + falhas)
+                except Exception as e:
+                    relatorio['erros'].extend((item_lote[0], str(e)) for item_lote, _ in lote)
+                lote = []
+                falhas = []
+            
+            yield 'metadados', atual, len(novos), relatorio
+    
+    # Cópias repetidas na pasta só entram no índice se o livro foi gravado (senão são lidas de novo)
+    if repetidos:
+        gravados = hashes_existentes(repetido[4] for repetido in repetidos)
+        with conexao_escrita() as conn:
+            gravar_indice_sincronizacao(conn, [repetido for repetido in repetidos if repetido[4] in gravados])
+
+# Sincronizar a pasta monitorada periodicamente com a biblioteca atual, em uma thread deste processo
+# (uma por biblioteca e pasta)
+def iniciar_sincronizacao_periodica(pasta, intervalo=60):
+    """Retorna o estado da última execução: {'inicio', 'fim', 'relatorio', 'erro'}"""
+    return _iniciar_sincronizacao_periodica(nome_biblioteca_atual(), pasta, intervalo)
+
+@functools.lru_cache(maxsize=None)
+def _iniciar_sincronizacao_periodica(nome, pasta, intervalo):
+    estado = {'inicio': None, 'fim': None, 'relatorio': None, 'erro': None}
+    
+    def executar():
+        selecionar_biblioteca(nome)
+        while True:
+            estado['inicio'] = time.time()
+            try:
+                for _, _, _, relatorio in sincronizar_pasta(pasta):
+                    estado['relatorio'] = relatorio
+                estado['erro'] = None
+            except Exception as e:
+                estado['erro'] = str(e)
+            estado['fim'] = time.time()
+            time.sleep(intervalo)
+    
+    threading.Thread(target=executar, name='sincronizacao-pasta', daemon=True).start()
+    return estado
+
+# Consulta de buscar_livros: (sql, parametros)
+def sql_buscar_livros(filtro='', categoria='Todas'):
+    consulta_fts = montar_consulta_fts(filtro)
+    condicoes = []
+    parametros = []
+    
+    if consulta_fts:
+        condicoes.append('livros_fts MATCH ?')
+        parametros.append(consulta_fts)
+    if categoria != 'Todas':
+        condicoes.append('livros.categoria = ?')
+        parametros.append(categoria)
+    
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+    
+    if consulta_fts:
+        return f'''
+            SELECT livros.* FROM livros_fts
+            JOIN livros ON livros.id = livros_fts.rowid
+            {where}
+            ORDER BY bm25(livros_fts, {PESOS_BM25}), livros.id
+        ''', parametros
+    return f'''
+        SELECT * FROM livros
+        {where}
+        ORDER BY data_adicao DESC
+    ''', parametros
+
+# Buscar livros
+@cache_por_geracao
+def buscar_livros(filtro='', categoria='Todas'):
+    sql, parametros = sql_buscar_livros(filtro, categoria)
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute(sql, parametros)
+        livros = c.fetchall()
+    return livros
+
+# Colunas usadas pela listagem da biblioteca
+COLUNAS_LISTAGEM = '''livros.id, livros.titulo, livros.autor, livros.ano, livros.categoria, livros.idioma,
+    livros.hash_arquivo, livros.nome_arquivo, livros.notas, livros.data_adicao'''
+
+# Facetas da listagem: nome -> coluna de livros (a década é agrupada a partir do ano)
+FACETAS = {'categoria': 'categoria', 'idioma': 'idioma', 'decada': 'ano', 'autor': 'autor'}
+
+# Autores mostrados na faceta (os mais frequentes, além dos selecionados)
+MAX_AUTORES_FACETA = 30
+
+# Seleção das facetas como tupla ordenada ((nome, (valores...)), ...), usável como chave de cache
+def normalizar_facetas(selecionadas):
+    """selecionadas: {nome: valores}; None entre os valores seleciona os livros sem valor na faceta"""
+    return tuple(
+        (nome, tuple(sorted(set(valores), key=lambda valor: (valor is None, valor))))
+        for nome, valores in sorted(selecionadas.items()) if valores
+    )
+
+# Filtro de uma faceta: os valores são alternativas (OU); retorna (sql, parametros)
+def condicao_faceta(nome, valores):
+    coluna = f'livros.{FACETAS[nome]}'
+    presentes = [valor for valor in valores if valor is not None]
+    alternativas = []
+    parametros = []
+    if nome == 'decada':
+        for decada in presentes:
+            alternativas.append(f'{coluna} BETWEEN ? AND ?')
+            parametros.extend((decada, decada + 9))
+    elif presentes:
+        alternativas.append(f"{coluna} IN ({', '.join('?' * len(presentes))})")
+        parametros.extend(presentes)
+    if len(presentes) < len(valores):
+        alternativas.append(f'{coluna} IS NULL' if nome == 'decada' else f"({coluna} IS NULL OR {coluna} = '')")
+    return f"({' OR '.join(alternativas)})", parametros
+
+# Filtros das facetas selecionadas (todas precisam ser atendidas), exceto a faceta `ignorar`
+def condicoes_facetas(facetas, ignorar=None):
+    condicoes = []
+    parametros = []
+    for nome, valores in facetas:
+        if nome != ignorar:
+            condicao, parametros_condicao = condicao_faceta(nome, valores)
+            condicoes.append(condicao)
+            parametros.extend(parametros_condicao)
+    return condicoes, parametros
+
+# Consulta única com a contagem de todas as facetas: (sql, parametros)
+def sql_contar_facetas(filtro='', facetas=()):
+    """Cada faceta é contada com o texto da busca e as outras facetas aplicados (mas não a própria
+    seleção, para que as alternativas continuem visíveis). Sem texto, cada ramo agrupa pelo índice
+    de cobertura da faceta; com texto, os livros encontrados são lidos uma vez (a CTE usada em
+    vários ramos é materializada) e agrupados a partir dela."""
+    consulta_fts = montar_consulta_fts(filtro)
+    parametros = []
+    inicio = ''
+    origem = 'livros'
+    if consulta_fts:
+        inicio = '''
+            WITH encontrados AS (
+                SELECT livros.categoria, livros.idioma, livros.ano, livros.autor
+                FROM livros_fts JOIN livros ON livros.id = livros_fts.rowid
+                WHERE livros_fts MATCH ?
+            )
+        '''
+        origem = 'encontrados AS livros'
+        parametros.append(consulta_fts)
+    
+    selecionados = dict(facetas)
+    ramos = []
+    for nome, coluna in FACETAS.items():
+        condicoes, parametros_ramo = condicoes_facetas(facetas, ignorar=nome)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        parametros.extend(parametros_ramo)
+        if nome == 'autor':
+            # Só os autores mais frequentes, com os selecionados sempre incluídos
+            autores = [autor for autor in selecionados.get('autor', ()) if autor is not None]
+            primeiro = f"livros.autor IN ({', '.join('?' * len(autores))}) DESC, " if autores else ''
+            parametros.extend(autores)
+            ramos.append(f'''
+                SELECT * FROM (
+                    SELECT 'autor', livros.autor, COUNT(*) FROM {origem} {where}
+                    GROUP BY livros.autor ORDER BY {primeiro}COUNT(*) DESC LIMIT {MAX_AUTORES_FACETA}
+                )
+            ''')
+        else:
+            ramos.append(f"SELECT '{nome}', livros.{coluna}, COUNT(*) FROM {origem} {where} GROUP BY livros.{coluna}")
+    return inicio + ' UNION ALL '.join(ramos), parametros
+
+# Contagens das facetas para a busca atual: {nome: [(valor, total)]}
+@cache_por_geracao
+def contar_facetas(filtro='', facetas=()):
+    """None é o valor dos livros sem categoria, idioma, ano ou autor. As décadas vêm da mais
+    recente para a mais antiga; as outras facetas, da mais para a menos frequente."""
+    sql, parametros = sql_contar_facetas(filtro, facetas)
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute(sql, parametros)
+        linhas = c.fetchall()
+    
+    # Texto vazio conta como sem valor; os anos são somados por década
+    totais = {nome: {} for nome in FACETAS}
+    for nome, valor, total in linhas:
+        if valor == '':
+            valor = None
+        elif nome == 'decada' and valor is not None:
+            valor = valor // 10 * 10
+        totais[nome][valor] = totais[nome].get(valor, 0) + total
+    
+    contagens = {}
+    for nome, valores in totais.items():
+        if nome == 'decada':
+            chave = lambda item: (item[0] is None, -(item[0] or 0))
+        else:
+            chave = lambda item: (-item[1], item[0] is None, item[0] or '')
+        contagens[nome] = sorted(valores.items(), key=chave)
+    return contagens
+
+# Consulta de uma página da listagem: (sql, parametros), com uma linha a mais que o limite
+def sql_buscar_livros_pagina(filtro='', categoria='Todas', limite=20, cursor=None, direcao='proxima', facetas=()):
+    consulta_fts = montar_consulta_fts(filtro)
+    condicoes = []
+    parametros = []
+    
+    if consulta_fts:
+        chave = f'bm25(livros_fts, {PESOS_BM25})'
+        origem = 'livros_fts JOIN livros ON livros.id = livros_fts.rowid'
+        condicoes.append('livros_fts MATCH ?')
+        parametros.append(consulta_fts)
+        ordem_proxima = 'ASC'
+    else:
+        chave = 'livros.data_adicao'
+        origem = 'livros'
+        ordem_proxima = 'DESC'
+    
+    if categoria != 'Todas':
+        condicoes.append('livros.categoria = ?')
+        parametros.append(categoria)
+    
+    condicoes_selecionadas, parametros_selecionados = condicoes_facetas(facetas)
+    condicoes.extend(condicoes_selecionadas)
+    parametros.extend(parametros_selecionados)
+    
+    # Percorrer no sentido contrário para a página anterior
+    if direcao == 'proxima':
+        ordem = ordem_proxima
+    else:
+        ordem = 'ASC' if ordem_proxima == 'DESC' else 'DESC'
+    
+    if cursor is not None:
+        operador = '<' if ordem == 'DESC' else '>'
+        condicoes.append(f'({chave}, livros.id) {operador} (?, ?)')
+        parametros.extend(cursor)
+    
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+    
+    return f'''
+        SELECT {COLUNAS_LISTAGEM}, {chave} FROM {origem}
+        {where}
+        ORDER BY {chave} {ordem}, livros.id {ordem}
+        LIMIT ?
+    ''', parametros + [limite + 1]
+
+# Buscar uma página de livros (paginação por chave)
+@cache_por_geracao
+def buscar_livros_pagina(filtro='', categoria='Todas', limite=20, cursor=None, direcao='proxima', facetas=()):
+    """Retorna (livros, tem_anterior, tem_proxima) a partir do cursor (chave, id).
+    
+    A última coluna de cada livro é a chave de ordenação: a relevância bm25
+    quando há texto de busca, ou data_adicao caso contrário. `facetas` vem
+    de normalizar_facetas.
+    """
+    sql, parametros = sql_buscar_livros_pagina(filtro, categoria, limite, cursor, direcao, facetas)
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute(sql, parametros)
+        livros = c.fetchall()
+    
+    # Uma linha extra indica se existe outra página na direção pedida
+    ha_mais = len(livros) > limite
+    livros = livros[:limite]
+    
+    if direcao == 'proxima':
+        return livros, cursor is not None, ha_mais
+    
+    livros.reverse()
+    return livros, ha_mais, True
+
+# Categorias distintas, em ordem alfabética
+SQL_CATEGORIAS = 'SELECT DISTINCT categoria FROM livros WHERE categoria IS NOT NULL ORDER BY categoria'
+
+# Obter categorias únicas
+@cache_por_geracao
+def obter_categorias():
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute(SQL_CATEGORIAS)
+        categorias = [row[0] for row in c.fetchall()]
+    return categorias
+
+# Deletar livro
+def deletar_livro(livro_id):
+    with conexao_escrita() as conn:
+        c = conn.cursor()
+    
+        # Obter hash do arquivo antes de deletar
+        c.execute('SELECT hash_arquivo FROM livros WHERE id = ?', (livro_id,))
+        resultado = c.fetchone()
+    
+        if resultado:
+            hash_arquivo = resultado[0]
+            # Deletar arquivo PDF se existir
+            caminho_arquivo = localizar_pdf(hash_arquivo)
+            if caminho_arquivo is not None:
+                os.remove(caminho_arquivo)
+    
+        c.execute('DELETE FROM livros WHERE id = ?', (livro_id,))
+    invalidar_consultas()
+
+# Atualizar livro
+def atualizar_livro(livro_id, dados_livro):
+    with conexao_escrita() as conn:
+        c = conn.cursor()
+        c.execute('''
+            UPDATE livros 
+            SET titulo=?, autor=?, ano=?, categoria=?, idioma=?, notas=?
+            WHERE id=?
+        ''', (
+            dados_livro['titulo'],
+            dados_livro['autor'],
+            dados_livro['ano'],
+            dados_livro['categoria'],
+            dados_livro['idioma'],
+            dados_livro['notas'],
+            livro_id
+        ))
+        c.execute('SELECT hash_arquivo FROM livros WHERE id = ?', (livro_id,))
+        row = c.fetchone()
+        if row and row[0]:
+            registrar_assinatura(c, row[0], 'metadados',
+                                 duplicatas.assinatura_metadados(dados_livro['titulo'], dados_livro['autor']))
+    invalidar_consultas()
+
+# Obter estatísticas
+@cache_por_geracao
+def obter_estatisticas():
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute('''
+            SELECT total_livros, total_paginas, total_autores, total_categorias
+            FROM estatisticas_totais WHERE id = 1
+        ''')
+        total_livros, total_paginas, total_autores, total_categorias = c.fetchone() or (0, 0, 0, 0)
+    
+    return {
+        'total_livros': total_livros,
+        'total_paginas': total_paginas,
+        'total_autores': total_autores,
+        'total_categorias': total_categorias
+    }
+
+# Livros por categoria (da mais para a menos frequente)
+@cache_por_geracao
+def obter_livros_por_categoria():
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute('SELECT categoria, total FROM estatisticas_categorias ORDER BY total DESC')
+        return c.fetchall()
+
+# Livros por ano de publicação (do mais recente para o mais antigo)
+@cache_por_geracao
+def obter_livros_por_ano():
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute('SELECT ano, total FROM estatisticas_anos ORDER BY ano DESC')
+        return c.fetchall()
+
+# Ler a tabela livros em blocos (colunas de exportacao.COLUNAS, por id)
+def iterar_livros(tamanho_bloco=exportacao.TAMANHO_BLOCO):
+    """Uma única consulta lida com fetchmany: um instantâneo consistente, com um bloco por vez na memória"""
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT {', '.join(exportacao.COLUNAS)} FROM livros ORDER BY id")
+        while True:
+            bloco = c.fetchmany(tamanho_bloco)
+            if not bloco:
+                return
+            yield bloco
+
+# Exportar o catálogo para CSV, JSONL ou Parquet (formato pela extensão); retorna o número de livros
+def exportar_livros(caminho, formato=None, tamanho_bloco=exportacao.TAMANHO_BLOCO, progresso=None):
+    formato = formato or exportacao.formato_por_extensao(caminho)
+    total = obter_estatisticas()['total_livros']
+    
+    def blocos():
+        exportados = 0
+        for bloco in iterar_livros(tamanho_bloco):
+            yield bloco
+            exportados += len(bloco)
+            if progresso:
+                progresso(exportados, total)
+    
+    # O arquivo só aparece no destino depois de completo
+    temporario = f'{caminho}.tmp'
+    try:
+        exportados = exportacao.ESCRITORES[formato](blocos(), temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return exportados
+
+# Importar um catálogo exportado (livros com hash já cadastrado são ignorados)
+def importar_livros(caminho, formato=None, tamanho_bloco=exportacao.TAMANHO_BLOCO, progresso=None):
+    """Cada bloco é gravado em uma transação. Os ids do arquivo não são
+    mantidos (a biblioteca de destino pode já ter livros). Linhas sem título ou que não puderam ser lidas
+    são puladas e contadas como inválidas. Retorna {'importados', 'duplicados', 'invalidos'}"""
+    formato = formato or exportacao.formato_por_extensao(caminho)
+    relatorio = {'importados': 0, 'duplicados': 0, 'invalidos': 0}
+    lidos = 0
+    try:
+        for bloco in exportacao.LEITORES[formato](caminho, tamanho_bloco):
+            lidos += len(bloco)
+            validos = [linha for linha in bloco if linha is not None and linha['titulo']]
+            relatorio['invalidos'] += len(bloco) - len(validos)
+            existentes = hashes_existentes(linha['hash_arquivo'] for linha in validos if linha['hash_arquivo'])
+            novos = [linha for linha in validos if linha['hash_arquivo'] not in existentes]
+            
+            inseridos = 0
+            with conexao_escrita() as conn:
+                c = conn.cursor()
+                for linha in novos:
+                    c.execute('''
+                        INSERT OR IGNORE INTO livros (titulo, autor, ano, categoria, idioma, num_paginas,
+                                                      tamanho_kb, hash_arquivo, nome_arquivo, data_adicao, notas)
+                        VALUES (:titulo, :autor, :ano, :categoria, :idioma, :num_paginas,
+                                :tamanho_kb, :hash_arquivo, :nome_arquivo, COALESCE(:data_adicao, CURRENT_TIMESTAMP), :notas)
+                    ''', linha)
+                    # Hash repetido no próprio arquivo: a linha é ignorada e a assinatura da primeira fica
+                    if c.rowcount == 1:
+                        inseridos += 1
+                        if linha['hash_arquivo']:
+                            registrar_assinatura(c, linha['hash_arquivo'], 'metadados',
+                                                 duplicatas.assinatura_metadados(linha['titulo'], linha['autor']))
+            relatorio['importados'] += inseridos
+            relatorio['duplicados'] += len(validos) - inseridos
+            if progresso:
+                progresso(lidos, relatorio)
+    finally:
+        # Blocos já gravados continuam no banco mesmo se um bloco posterior falhar
+        invalidar_consultas()
+    return relatorio
+
+# Cópia do banco pela API de backup online do SQLite (consistente mesmo com o app em uso)
+def fazer_backup(destino):
+    """Grava um único arquivo (sem -wal ao lado) e retorna o seu tamanho em bytes"""
+    temporario = f'{destino}.tmp'
+    if os.path.exists(temporario):
+        os.remove(temporario)
+    copia = sqlite3.connect(temporario)
+    try:
+        with conexao_leitura() as conn:
+            conn.backup(copia)
+        copia.execute('PRAGMA journal_mode=DELETE')
+        copia.close()
+        os.replace(temporario, destino)
+    except BaseException:
+        copia.close()
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return os.path.getsize(destino)
+
+# Copiar os PDFs para `destino` (mesmas subpastas de pdfs/), só os que ainda não estão lá
+def arquivar_pdfs(destino):
+    """Gerador que produz (atual, total, relatorio); relatorio: {'copiados', 'existentes', 'bytes'}.
+    
+    Os arquivos são endereçados pelo hash do conteúdo, então um arquivo com o mesmo nome
+    no destino é o mesmo PDF. Cada cópia é gravada em um temporário e renomeada.
+    """
+    import shutil
+    
+    armazenados = sorted(listar_pdfs_armazenados().items())
+    relatorio = {'copiados': 0, 'existentes': 0, 'bytes': 0}
+    yield 0, len(armazenados), relatorio
+    for atual, (hash_arquivo, caminho_arquivo) in enumerate(armazenados, start=1):
+        alvo = os.path.join(destino, hash_arquivo[:2], hash_arquivo[2:4], f'{hash_arquivo}.pdf')
+        if os.path.exists(alvo):
+            relatorio['existentes'] += 1
+        else:
+            os.makedirs(os.path.dirname(alvo), exist_ok=True)
+            temporario = f'{alvo}.tmp'
+            shutil.copyfile(caminho_arquivo, temporario)
+            os.replace(temporario, alvo)
+            relatorio['copiados'] += 1
+            relatorio['bytes'] += os.path.getsize(alvo)
+        yield atual, len(armazenados), relatorio
+
+# Consultas frequentes cujo plano de execução deve usar índices: (nome, sql, parametros)
+def consultas_frequentes():
+    cursor = ('2000-01-01 00:00:00', 1)
+    consultas = [
+        ('listagem', *sql_buscar_livros_pagina()),
+        ('listagem, próxima página', *sql_buscar_livros_pagina(cursor=cursor)),
+        ('listagem, página anterior', *sql_buscar_livros_pagina(cursor=cursor, direcao='anterior')),
+        ('listagem por categoria', *sql_buscar_livros_pagina(categoria='Romance')),
+        ('listagem por categoria, próxima página', *sql_buscar_livros_pagina(categoria='Romance', cursor=cursor)),
+        ('listagem por texto e categoria', *sql_buscar_livros_pagina('machado', 'Romance')),
+        ('busca completa', *sql_buscar_livros()),
+        ('busca completa por categoria', *sql_buscar_livros(categoria='Romance')),
+        ('categorias', SQL_CATEGORIAS, ()),
+        ('facetas', *sql_contar_facetas()),
+        ('facetas com seleção', *sql_contar_facetas(facetas=normalizar_facetas(
+            {'categoria': ['Romance'], 'idioma': ['Português', None], 'decada': [1990]}))),
+    ]
+    for _, coluna, condicao in GRUPOS_ESTATISTICAS:
+        consultas.append((f'recálculo das estatísticas por {coluna}', sql_contagem_grupo(coluna, condicao), ()))
+    return consultas
+
+# Passo do plano que percorre uma tabela inteira (sem índice)
+PADRAO_VARREDURA = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+# Conferir com EXPLAIN QUERY PLAN que as consultas frequentes não varrem tabelas inteiras
+def verificar_planos_consultas():
+    """Retorna [(nome, passos do plano, tabelas varridas)]; a lista de tabelas varridas deve ficar vazia"""
+    resultados = []
+    with conexao_leitura() as conn:
+        c = conn.cursor()
+        for nome, sql, parametros in consultas_frequentes():
+            c.execute(f'EXPLAIN QUERY PLAN {sql}', parametros)
+            passos = [linha[3] for linha in c.fetchall()]
+            varridas = [m.group(1) for m in map(PADRAO_VARREDURA.match, passos) if m]
+            resultados.append((nome, passos, varridas))
+    return resultados
@@ -0,0 +1,395 @@
+"""Linha de comando da biblioteca (sem Streamlit).
+
+Uso:
+    python cli.py add livro.pdf --titulo "Dom Casmurro" --autor "Machado de Assis"
+    python cli.py import /caminho/da/pasta_ou_arquivo.zip
+    python cli.py sync /pasta/compartilhada [--intervalo 60]
+    python cli.py search "machado" [--categoria Romance] [--idioma Português] [--decada 1890] [--facetas] [--json]
+    python cli.py stats [--json]
+    python cli.py reindex
+    python cli.py enrich [--limite 100] [--taxa 1] [--intervalo 3600] [--credenciais conta.json | --api-key CHAVE]
+    python cli.py explain
+    python cli.py export catalogo.csv|catalogo.jsonl|catalogo.parquet
+    python cli.py import-catalog catalogo.jsonl
+    python cli.py backup /backups/biblioteca.db [--pdfs /backups/pdfs]
+    python cli.py libraries [--criar NOME]
+
+Use --pasta para apontar a pasta da biblioteca (onde ficam biblioteca.db e pdfs/)
+e --biblioteca para usar uma das bibliotecas do modo multiusuário (bibliotecas/<nome>/).
+O núcleo é importado só depois de ler os argumentos, e as dependências pesadas
+(PyPDF2, requests) só quando o comando precisa delas.
+"""
+import argparse
+import json
+import os
+import sys
+
+# Adicionar um PDF (copiado para pdfs/; o arquivo original não é alterado)
+def comando_add(args):
+    import biblioteca
+    from ingestao import gravar_temporario_com_hash
+
+    if not os.path.isfile(args.arquivo):
+        print(f'Arquivo não encontrado: {args.arquivo}', file=sys.stderr)
+        return 1
+
+    with open(args.arquivo, 'rb') as origem:
+        temporario, hash_arquivo, tamanho = gravar_temporario_com_hash(origem, biblioteca.pasta_uploads())
+    try:
+        try:
+            metadata = biblioteca.extrair_metadata_pdf(temporario)
+        except Exception as e:
+            print(f'Aviso: não foi possível ler os metadados ({e})', file=sys.stderr)
+            metadata = {'num_paginas': 0, 'titulo': '', 'autor': ''}
+
+        nome_arquivo = os.path.basename(args.arquivo)
+        dados_livro = {
+            'titulo': args.titulo or metadata['titulo'] or os.path.splitext(nome_arquivo)[0],
+            'autor': args.autor or metadata['autor'] or None,
+            'ano': args.ano,
+            'categoria': args.categoria,
+            'idioma': args.idioma,
+            'num_paginas': metadata['num_paginas'],
+            'tamanho_kb': tamanho // 1024,
+            'hash_arquivo': hash_arquivo,
+            'nome_arquivo': nome_arquivo,
+            'notas': args.notas
+        }
+        if not biblioteca.adicionar_livro(dados_livro, caminho_temporario=temporario):
+            print(f'Este livro já existe na biblioteca ({hash_arquivo}).', file=sys.stderr)
+            return 1
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+    print(f"Adicionado: {dados_livro['titulo']} ({hash_arquivo})")
+    return 0
+
+# Importar em lote uma pasta ou um arquivo ZIP
+def comando_import(args):
+    import biblioteca
+
+    relatorio = None
+    try:
+        for etapa, atual, total, relatorio in biblioteca.importar_em_lote(args.origem, max_workers=args.processos):
+            descricao = 'hashes' if etapa == 'hash' else 'metadados'
+            print(f'\r{descricao}: {atual}/{total}', end='', file=sys.stderr)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+
+    if relatorio is None:
+        print('Nenhum PDF encontrado.')
+        return 0
+    print(f"{relatorio['importados']} importado(s), {relatorio['duplicados']} duplicado(s), "
+          f"{len(relatorio['erros'])} erro(s)")
+    for arquivo, erro in relatorio['erros']:
+        print(f'  {arquivo}: {erro}', file=sys.stderr)
+    return 1 if relatorio['erros'] else 0
+
+# Sincronizar uma pasta monitorada (uma vez ou a cada --intervalo segundos)
+def comando_sync(args):
+    import time
+    import biblioteca
+
+    while True:
+        inicio = time.perf_counter()
+        relatorio = None
+        try:
+            for etapa, atual, total, relatorio in biblioteca.sincronizar_pasta(args.pasta_monitorada, args.processos):
+                if etapa != 'varredura':
+                    descricao = 'hashes' if etapa == 'hash' else 'metadados'
+                    print(f'\r{descricao}: {atual}/{total}', end='', file=sys.stderr)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        if relatorio['lidos']:
+            print(file=sys.stderr)
+        print(f"{relatorio['arquivos']} arquivo(s), {relatorio['inalterados']} inalterado(s), "
+              f"{relatorio['lidos']} lido(s), {relatorio['importados']} importado(s), "
+              f"{relatorio['duplicados']} duplicado(s), {relatorio['removidos']} removido(s), "
+              f"{len(relatorio['erros'])} erro(s) em {time.perf_counter() - inicio:.1f} s")
+        for caminho, erro in relatorio['erros']:
+            print(f'  {caminho}: {erro}', file=sys.stderr)
+        if not args.intervalo:
+            return 1 if relatorio['erros'] else 0
+        time.sleep(args.intervalo)
+
+# Buscar livros pelos metadados ou trechos no conteúdo dos PDFs
+def comando_search(args):
+    import biblioteca
+
+    if args.conteudo:
+        resultados = biblioteca.buscar_conteudo(args.termo, args.limite)
+        if args.json:
+            print(json.dumps([
+                {'id': livro_id, 'titulo': titulo, 'autor': autor,
+                 'trechos': [{'pagina': pagina, 'trecho': trecho} for pagina, trecho in trechos]}
+                for livro_id, titulo, autor, trechos in resultados
+            ], ensure_ascii=False, indent=2))
+            return 0
+        for livro_id, titulo, autor, trechos in resultados:
+            print(f'{livro_id}\t{titulo}\t{autor or ""}')
+            for pagina, trecho in trechos:
+                print(f'\tp. {pagina}: {trecho}')
+        return 0
+
+    facetas = biblioteca.normalizar_facetas({'idioma': args.idioma, 'decada': args.decada, 'autor': args.autor})
+    if args.facetas:
+        contagens = biblioteca.contar_facetas(args.termo, biblioteca.normalizar_facetas({
+            'categoria': [] if args.categoria == 'Todas' else [args.categoria], **dict(facetas)
+        }))
+        if args.json:
+            print(json.dumps({nome: [[valor, total] for valor, total in valores] for nome, valores in contagens.items()},
+                             ensure_ascii=False, indent=2))
+            return 0
+        for nome, valores in contagens.items():
+            print(nome)
+            for valor, total in valores:
+                print(f'\t{total}\t{"" if valor is None else valor}')
+        return 0
+
+    livros, _, tem_proxima = biblioteca.buscar_livros_pagina(args.termo, args.categoria, args.limite, facetas=facetas)
+    if args.json:
+        colunas = ['id', 'titulo', 'autor', 'ano', 'categoria', 'idioma', 'hash_arquivo', 'nome_arquivo', 'notas', 'data_adicao']
+        print(json.dumps([dict(zip(colunas, livro)) for livro in livros], ensure_ascii=False, indent=2))
+        return 0
+    for livro in livros:
+        print('\t'.join('' if valor is None else str(valor) for valor in livro[:5]))
+    if tem_proxima:
+        print(f'… mais resultados; use --limite para ver mais de {args.limite}', file=sys.stderr)
+    return 0
+
+# Estatísticas da biblioteca
+def comando_stats(args):
+    import biblioteca
+
+    estatisticas = biblioteca.obter_estatisticas()
+    if args.json:
+        estatisticas['categorias'] = dict(biblioteca.obter_livros_por_categoria())
+        print(json.dumps(estatisticas, ensure_ascii=False, indent=2))
+        return 0
+    print(f"Livros:     {estatisticas['total_livros']}")
+    print(f"Páginas:    {estatisticas['total_paginas']}")
+    print(f"Autores:    {estatisticas['total_autores']}")
+    print(f"Categorias: {estatisticas['total_categorias']}")
+    return 0
+
+# Indexar o conteúdo dos PDFs pendentes
+def comando_reindex(args):
+    import biblioteca
+
+    total = erros = 0
+    for atual, total, hash_arquivo, erro in biblioteca.reindexar_conteudo():
+        print(f'\r{atual}/{total} PDFs', end='', file=sys.stderr)
+        if erro:
+            erros += 1
+            print(f'\n{hash_arquivo}: {erro}', file=sys.stderr)
+    if total:
+        print(file=sys.stderr)
+    print(f'{total - erros} de {total} PDF(s) indexado(s).' if total else 'Todos os PDFs já estão indexados.')
+    return 1 if erros else 0
+
+# Completar os metadados dos livros incompletos pela Google Books API (uma vez ou a cada --intervalo segundos)
+def comando_enrich(args):
+    import time
+    import biblioteca
+
+    service_account_info = None
+    if args.credenciais:
+        try:
+            with open(args.credenciais, encoding='utf-8') as f:
+                service_account_info = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f'Não foi possível ler as credenciais: {e}', file=sys.stderr)
+            return 1
+
+    while True:
+        inicio = time.perf_counter()
+        relatorio = biblioteca.enriquecer_biblioteca(
+            args.limite, args.taxa, args.repetir_sem_resultado,
+            progresso=lambda atual, total, _: print(f'\r{atual}/{total} livros', end='', file=sys.stderr),
+            service_account_info=service_account_info, api_key=args.api_key or ''
+        )
+        if sum(relatorio.values()):
+            print(file=sys.stderr)
+        print(f"{relatorio['atualizados']} atualizado(s), {relatorio['sem_resultado']} sem resultado, "
+              f"{relatorio['erros']} erro(s) em {time.perf_counter() - inicio:.1f} s")
+        if not args.intervalo:
+            return 1 if relatorio['erros'] else 0
+        time.sleep(args.intervalo)
+
+# Conferir se as consultas frequentes usam índices (sai com erro se alguma varrer uma tabela inteira)
+def comando_explain(args):
+    import biblioteca
+
+    falhas = 0
+    for nome, passos, varridas in biblioteca.verificar_planos_consultas():
+        print(f"{'ERRO' if varridas else 'ok'}\t{nome}")
+        for passo in passos:
+            print(f'\t{passo}')
+        falhas += bool(varridas)
+    print(f'Esquema na versão {biblioteca.MIGRACOES[-1][0]}; {falhas} consulta(s) varrendo tabelas inteiras.')
+    return 1 if falhas else 0
+
+# Exportar o catálogo (formato pela extensão do arquivo)
+def comando_export(args):
+    import biblioteca
+
+    def progresso(exportados, total):
+        print(f'\r{exportados}/{total} livros', end='', file=sys.stderr)
+    try:
+        exportados = biblioteca.exportar_livros(args.arquivo, args.formato, progresso=progresso)
+    except (ValueError, ImportError) as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+    print(f'{exportados} livro(s) exportado(s) para {args.arquivo}')
+    return 0
+
+# Importar um catálogo exportado por `export`
+def comando_import_catalog(args):
+    import biblioteca
+
+    def progresso(lidos, relatorio):
+        print(f'\r{lidos} linhas lidas', end='', file=sys.stderr)
+    try:
+        relatorio = biblioteca.importar_livros(args.arquivo, args.formato, progresso=progresso)
+    except (ValueError, ImportError) as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+    print(f"{relatorio['importados']} importado(s), {relatorio['duplicados']} duplicado(s), "
+          f"{relatorio['invalidos']} inválido(s) (sem título ou ilegíveis)")
+    return 0
+
+# Backup do banco e, opcionalmente, cópia incremental dos PDFs
+def comando_backup(args):
+    import biblioteca
+
+    tamanho = biblioteca.fazer_backup(args.destino)
+    print(f'Banco copiado para {args.destino} ({tamanho // 1024} KB)')
+    if args.pdfs:
+        relatorio = None
+        for atual, total, relatorio in biblioteca.arquivar_pdfs(args.pdfs):
+            print(f'\r{atual}/{total} PDFs', end='', file=sys.stderr)
+        print(file=sys.stderr)
+        print(f"{relatorio['copiados']} PDF(s) copiado(s) ({relatorio['bytes'] // (1024 * 1024)} MB), "
+              f"{relatorio['existentes']} já no destino")
+    return 0
+
+# Listar (ou criar) as bibliotecas do modo multiusuário
+def comando_libraries(args):
+    import biblioteca
+
+    if args.criar:
+        try:
+            criada = biblioteca.criar_biblioteca(args.criar)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            return 2
+        print(f"Biblioteca '{args.criar}' {'criada' if criada else 'já existe'}.")
+        return 0
+    for nome in biblioteca.listar_bibliotecas():
+        print(nome)
+    return 0
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='Biblioteca de livros PDF')
+    parser.add_argument('--pasta', default='.', help='pasta da biblioteca (biblioteca.db e pdfs/)')
+    parser.add_argument('--biblioteca', help='nome de uma biblioteca do modo multiusuário (criada com libraries --criar)')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    add = comandos.add_parser('add', help='adicionar um PDF')
+    add.add_argument('arquivo')
+    add.add_argument('--titulo')
+    add.add_argument('--autor')
+    add.add_argument('--ano', type=int)
+    add.add_argument('--categoria')
+    add.add_argument('--idioma')
+    add.add_argument('--notas')
+    add.set_defaults(funcao=comando_add)
+
+    importar = comandos.add_parser('import', help='importar uma pasta ou um arquivo ZIP de PDFs')
+    importar.add_argument('origem')
+    importar.add_argument('--processos', type=int, help='processos em paralelo (padrão: número de CPUs)')
+    importar.set_defaults(funcao=comando_import)
+
+    sync = comandos.add_parser('sync', help='importar os PDFs novos ou alterados de uma pasta monitorada')
+    sync.add_argument('pasta_monitorada')
+    sync.add_argument('--intervalo', type=int, help='repetir a cada N segundos (padrão: uma vez)')
+    sync.add_argument('--processos', type=int, help='processos em paralelo (padrão: número de CPUs)')
+    sync.set_defaults(funcao=comando_sync)
+
+    search = comandos.add_parser('search', help='buscar livros')
+    search.add_argument('termo', nargs='?', default='')
+    search.add_argument('--categoria', default='Todas')
+    search.add_argument('--idioma', action='append', default=[], help='pode ser repetido (qualquer um dos idiomas)')
+    search.add_argument('--decada', action='append', default=[], type=int, help='ex.: 1990; pode ser repetido')
+    search.add_argument('--autor', action='append', default=[], help='pode ser repetido')
+    search.add_argument('--facetas', action='store_true', help='mostrar as contagens das facetas em vez dos livros')
+    search.add_argument('--conteudo', action='store_true', help='buscar no texto dos PDFs')
+    search.add_argument('--limite', type=int, default=50)
+    search.add_argument('--json', action='store_true')
+    search.set_defaults(funcao=comando_search)
+
+    stats = comandos.add_parser('stats', help='estatísticas da biblioteca')
+    stats.add_argument('--json', action='store_true')
+    stats.set_defaults(funcao=comando_stats)
+
+    reindex = comandos.add_parser('reindex', help='indexar o conteúdo dos PDFs pendentes')
+    reindex.set_defaults(funcao=comando_reindex)
+
+    enrich = comandos.add_parser('enrich', help='completar autor, categoria e ano pela Google Books API')
+    enrich.add_argument('--limite', type=int, help='livros por execução (padrão: todos os pendentes)')
+    enrich.add_argument('--taxa', type=float, help='requisições por segundo (padrão: 1)')
+    enrich.add_argument('--repetir-sem-resultado', action='store_true',
+                        help='consultar de novo os livros que não tiveram resultado')
+    enrich.add_argument('--intervalo', type=int, help='repetir a cada N segundos (padrão: uma vez)')
+    credenciais = enrich.add_mutually_exclusive_group()
+    credenciais.add_argument('--credenciais', help='arquivo JSON de uma conta de serviço do Google Cloud')
+    credenciais.add_argument('--api-key', default=os.environ.get('GOOGLE_BOOKS_API_KEY'),
+                             help='chave da API (padrão: variável GOOGLE_BOOKS_API_KEY)')
+    enrich.set_defaults(funcao=comando_enrich)
+
+    explain = comandos.add_parser('explain', help='conferir os planos de execução das consultas frequentes')
+    explain.set_defaults(funcao=comando_explain)
+
+    exportar = comandos.add_parser('export', help='exportar o catálogo para CSV, JSONL ou Parquet')
+    exportar.add_argument('arquivo')
+    exportar.add_argument('--formato', choices=['csv', 'jsonl', 'parquet'], help='padrão: pela extensão')
+    exportar.set_defaults(funcao=comando_export)
+
+    importar_catalogo = comandos.add_parser('import-catalog', help='importar um catálogo exportado')
+    importar_catalogo.add_argument('arquivo')
+    importar_catalogo.add_argument('--formato', choices=['csv', 'jsonl', 'parquet'], help='padrão: pela extensão')
+    importar_catalogo.set_defaults(funcao=comando_import_catalog)
+
+    backup = comandos.add_parser('backup', help='copiar o banco (backup online) e os PDFs novos')
+    backup.add_argument('destino', help='arquivo .db de destino')
+    backup.add_argument('--pdfs', help='pasta onde manter a cópia incremental dos PDFs')
+    backup.set_defaults(funcao=comando_backup)
+
+    libraries = comandos.add_parser('libraries', help='listar as bibliotecas do modo multiusuário')
+    libraries.add_argument('--criar', metavar='NOME', help='criar uma biblioteca')
+    libraries.set_defaults(funcao=comando_libraries)
+    return parser
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    # O núcleo fica no mesmo diretório deste arquivo; os caminhos da biblioteca são relativos à pasta
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(args.pasta)
+
+    import biblioteca
+    try:
+        biblioteca.selecionar_biblioteca(args.biblioteca)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    biblioteca.init_database()
+    return args.funcao(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Assinaturas MinHash e bandas LSH para encontrar livros quase duplicados.
+
+Não depende do Streamlit nem do banco: as funções daqui calculam assinaturas
+e chaves de banda; o biblioteca.py guarda as bandas em SQLite e procura candidatos
+por igualdade de banda, sem comparar o livro novo com toda a biblioteca.
+"""
+import hashlib
+import heapq
+import random
+import re
+import struct
+import unicodedata
+
+from ingestao import extrair_paginas_pdf
+
+# Número de permutações da assinatura, dividido em bandas de LINHAS_POR_BANDA valores
+NUM_PERMUTACOES = 128
+LINHAS_POR_BANDA = 4
+NUM_BANDAS = NUM_PERMUTACOES // LINHAS_POR_BANDA
+
+# Tamanho dos shingles: palavras para o texto, caracteres para título e autor
+PALAVRAS_POR_SHINGLE = 5
+CARACTERES_POR_SHINGLE = 3
+
+# Páginas com texto usadas na assinatura e máximo de shingles amostrados (os de menor hash)
+MAX_PAGINAS_ASSINATURA = 40
+MAX_SHINGLES = 5000
+
+# Primo de Mersenne usado nas permutações (a * x + b) mod PRIMO
+PRIMO = (1 << 61) - 1
+
+# Coeficientes fixos: assinaturas calculadas em execuções diferentes continuam comparáveis
+_gerador = random.Random(20240615)
+PERMUTACOES = [(_gerador.randrange(1, PRIMO), _gerador.randrange(0, PRIMO)) for _ in range(NUM_PERMUTACOES)]
+del _gerador
+
+# Normalizar texto: minúsculas, sem acentos e sem pontuação
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(ch for ch in texto if not unicodedata.combining(ch))
+    return re.sub(r'[\W_]+', ' ', texto.lower()).strip()
+
+# Hash estável de 64 bits (o hash() do Python muda a cada execução)
+def _hash64(texto):
+    return int.from_bytes(hashlib.blake2b(texto.encode('utf-8'), digest_size=8).digest(), 'big')
+
+# Shingles do texto: sequências de PALAVRAS_POR_SHINGLE palavras
+def shingles_texto(paginas):
+    """paginas: textos das páginas, em ordem; retorna um conjunto de hashes"""
+    palavras = normalizar(' '.join(paginas)).split()
+    if len(palavras) < PALAVRAS_POR_SHINGLE:
+        return {_hash64(' '.join(palavras))} if palavras else set()
+    return {
+        _hash64(' '.join(palavras[i:i + PALAVRAS_POR_SHINGLE]))
+        for i in range(len(palavras) - PALAVRAS_POR_SHINGLE + 1)
+    }
+
+# Shingles de título e autor: sequências de CARACTERES_POR_SHINGLE caracteres
+def shingles_metadados(titulo, autor):
+    texto = ' '.join(filter(None, (normalizar(titulo), normalizar(autor))))
+    if len(texto) < CARACTERES_POR_SHINGLE:
+        return {_hash64(texto)} if texto else set()
+    return {
+        _hash64(texto[i:i + CARACTERES_POR_SHINGLE])
+        for i in range(len(texto) - CARACTERES_POR_SHINGLE + 1)
+    }
+
+# Calcular a assinatura MinHash de um conjunto de shingles
+def calcular_assinatura(shingles):
+    """Retorna uma tupla de NUM_PERMUTACOES inteiros, ou None se não houver shingles.
+
+    Livros grandes são amostrados pelos MAX_SHINGLES menores hashes; a amostra
+    é a mesma para shingles iguais, então a similaridade estimada se mantém.
+    """
+    if not shingles:
+        return None
+    if len(shingles) > MAX_SHINGLES:
+        shingles = heapq.nsmallest(MAX_SHINGLES, shingles)
+    valores = [x % PRIMO for x in shingles]
+    return tuple(min((a * x + b) % PRIMO for x in valores) for a, b in PERMUTACOES)
+
+# Assinatura do texto de um PDF (primeiras MAX_PAGINAS_ASSINATURA páginas com texto)
+def assinatura_texto_pdf(caminho_arquivo):
+    paginas = []
+    for _, texto in extrair_paginas_pdf(caminho_arquivo):
+        paginas.append(texto)
+        if len(paginas) >= MAX_PAGINAS_ASSINATURA:
+            break
+    return calcular_assinatura(shingles_texto(paginas))
+
+# Assinatura de título e autor
+def assinatura_metadados(titulo, autor):
+    return calcular_assinatura(shingles_metadados(titulo, autor))
+
+# Chaves das bandas LSH: (banda, valor) com o valor em um inteiro de 64 bits com sinal (INTEGER do SQLite)
+def bandas(assinatura):
+    chaves = []
+    for banda in range(NUM_BANDAS):
+        linhas = assinatura[banda * LINHAS_POR_BANDA:(banda + 1) * LINHAS_POR_BANDA]
+        resumo = hashlib.blake2b(struct.pack(f'<{LINHAS_POR_BANDA}Q', *linhas), digest_size=8).digest()
+        chaves.append((banda, int.from_bytes(resumo, 'big', signed=True)))
+    return chaves
+
+# Similaridade de Jaccard estimada pela fração de valores iguais nas assinaturas
+def similaridade(assinatura_a, assinatura_b):
+    iguais = sum(1 for a, b in zip(assinatura_a, assinatura_b) if a == b)
+    return iguais / NUM_PERMUTACOES
+
+# Converter a assinatura para BLOB e de volta
+def serializar(assinatura):
+    return struct.pack(f'<{NUM_PERMUTACOES}Q', *assinatura)
+
+def desserializar(blob):
+    return struct.unpack(f'<{NUM_PERMUTACOES}Q', blob)
@@ -0,0 +1,170 @@
+"""Enriquecimento em lote dos metadados dos livros pela Google Books API.
+
+Não depende do Streamlit nem do banco: biblioteca.py fornece a função que
+consulta a API, com cache e autenticação (criar_consulta_enriquecimento), e a
+que grava os lotes (gravar_enriquecimento); enriquecer_biblioteca junta as
+duas, tanto para o app quanto para o `cli.py enrich`. As consultas rodam em
+paralelo com asyncio, limitadas por um balde de fichas (token bucket) para
+respeitar a quota da API.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+
+from duplicatas import normalizar
+
+# Padrões: requisições por segundo, rajada máxima, consultas simultâneas e livros por lote gravado
+TAXA_REQUISICOES = 1.0
+RAJADA_REQUISICOES = 5
+CONSULTAS_SIMULTANEAS = 4
+TAMANHO_LOTE_ENRIQUECIMENTO = 20
+
+# Similaridade mínima de título (e de autor, quando conhecido) para aceitar um resultado
+LIMITE_SIMILARIDADE_TITULO = 0.85
+LIMITE_SIMILARIDADE_AUTOR = 0.6
+
+# Balde de fichas: até `capacidade` requisições de uma vez, repostas a `taxa` por segundo
+class BaldeFichas:
+    def __init__(self, taxa=TAXA_REQUISICOES, capacidade=RAJADA_REQUISICOES, relogio=time.monotonic):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.fichas = capacidade
+        self._relogio = relogio
+        self._atualizado = relogio()
+        self._trava = None
+
+    async def adquirir(self):
+        """Espera até haver uma ficha; quem chega primeiro é atendido primeiro"""
+        # A trava é criada dentro do laço de eventos que vai usá-la
+        if self._trava is None:
+            self._trava = asyncio.Lock()
+        async with self._trava:
+            while True:
+                agora = self._relogio()
+                self.fichas = min(self.capacidade, self.fichas + (agora - self._atualizado) * self.taxa)
+                self._atualizado = agora
+                if self.fichas >= 1:
+                    self.fichas -= 1
+                    return
+                await asyncio.sleep((1 - self.fichas) / self.taxa)
+
+# Consulta da Google Books API para um livro
+def montar_consulta(livro):
+    consulta = f'intitle:{livro["titulo"]}'
+    if livro.get('autor'):
+        consulta += f' inauthor:{livro["autor"]}'
+    return consulta
+
+# Similaridade entre dois textos normalizados (0 a 1)
+def similaridade_textos(a, b):
+    a, b = normalizar(a), normalizar(b)
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+# Escolher, entre os resultados da API, o volume que corresponde ao livro
+def escolher_volume(livro, itens):
+    """Retorna (volumeInfo, pontuacao) do melhor resultado aceito, ou (None, 0)"""
+    melhor, melhor_pontuacao = None, 0.0
+    for item in itens:
+        info = item.get('volumeInfo', {})
+        sim_titulo = similaridade_textos(livro['titulo'], info.get('title', ''))
+        # Títulos com subtítulo ("Título: subtítulo") também são comparados sem ele
+        if info.get('subtitle'):
+            sim_titulo = max(sim_titulo, similaridade_textos(livro['titulo'], f"{info['title']} {info['subtitle']}"))
+        if sim_titulo < LIMITE_SIMILARIDADE_TITULO:
+            continue
+
+        pontuacao = sim_titulo
+        if livro.get('autor'):
+            sim_autor = max((similaridade_textos(livro['autor'], autor) for autor in info.get('authors', [])), default=0.0)
+            if sim_autor < LIMITE_SIMILARIDADE_AUTOR:
+                continue
+            pontuacao = (sim_titulo + sim_autor) / 2
+        if pontuacao > melhor_pontuacao:
+            melhor, melhor_pontuacao = info, pontuacao
+    return melhor, melhor_pontuacao
+
+# Campos que faltam no livro e que o volume encontrado preenche
+def campos_para_preencher(livro, info):
+    campos = {}
+    if not livro.get('autor') and info.get('authors'):
+        campos['autor'] = ', '.join(info['authors'])
+    if not livro.get('categoria') and info.get('categories'):
+        campos['categoria'] = ', '.join(info['categories'])
+    if livro.get('ano_incompleto') and info.get('publishedDate', '')[:4].isdigit():
+        campos['ano'] = int(info['publishedDate'][:4])
+    return campos
+
+# Consultar e escolher o volume de um livro: (livro_id, status, campos)
+async def _enriquecer_livro(livro, consultar, balde, semaforo, executor):
+    async with semaforo:
+        await balde.adquirir()
+        loop = asyncio.get_running_loop()
+        try:
+            itens = await loop.run_in_executor(executor, consultar, montar_consulta(livro))
+        except Exception as e:
+            return livro['id'], 'erro', {'erro': str(e)}
+
+    info, _ = escolher_volume(livro, itens)
+    campos = campos_para_preencher(livro, info) if info else {}
+    return livro['id'], 'atualizado' if campos else 'sem_resultado', campos
+
+# Enriquecer os livros: consultas em paralelo, gravação em lotes
+async def enriquecer_livros_async(livros, consultar, gravar_lote, taxa=TAXA_REQUISICOES,
+                                  rajada=RAJADA_REQUISICOES, concorrencia=CONSULTAS_SIMULTANEAS,
+                                  tamanho_lote=TAMANHO_LOTE_ENRIQUECIMENTO, progresso=None):
+    """livros: dicts com id, titulo, autor, categoria e ano_incompleto.
+
+    consultar(consulta) devolve os itens da API (ou levanta exceção) e roda em
+    threads; gravar_lote([(livro_id, status, campos)]) roda no laço de eventos.
+    Cada lote é gravado assim que completa, então uma execução interrompida
+    perde no máximo um lote. Retorna {'atualizados', 'sem_resultado', 'erros'}.
+    """
+    relatorio = {'atualizados': 0, 'sem_resultado': 0, 'erros': 0}
+    if not livros:
+        return relatorio
+
+    balde = BaldeFichas(taxa, rajada)
+    semaforo = asyncio.Semaphore(concorrencia)
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        tarefas = [
+            asyncio.ensure_future(_enriquecer_livro(livro, consultar, balde, semaforo, executor))
+            for livro in livros
+        ]
+        lote = []
+        try:
+            for atual, tarefa in enumerate(asyncio.as_completed(tarefas), start=1):
+                resultado = await tarefa
+                status = resultado[1]
+                relatorio['atualizados' if status == 'atualizado' else 'sem_resultado' if status == 'sem_resultado' else 'erros'] += 1
+                lote.append(resultado)
+                if len(lote) >= tamanho_lote:
+                    gravar_lote(lote)
+                    lote = []
+                if progresso:
+                    progresso(atual, len(livros), relatorio)
+        finally:
+            # Gravar o que já foi consultado, mesmo se a execução for interrompida
+            for tarefa in tarefas:
+                tarefa.cancel()
+            if lote:
+                gravar_lote(lote)
+    return relatorio
+
+# Versão síncrona de enriquecer_livros_async (cria o próprio laço de eventos)
+def enriquecer_livros(livros, consultar, gravar_lote, **opcoes):
+    return asyncio.run(enriquecer_livros_async(livros, consultar, gravar_lote, **opcoes))
+
+# Consulta HTTP à API de volumes, sem cache (usada pelo app e por testes contra uma API local)
+def criar_consulta_http(sessao, url, params=None, obter_headers=None, max_results=5, timeout=10):
+    """Retorna consultar(consulta) -> itens; respostas diferentes de 200 levantam RuntimeError"""
+    def consultar(consulta):
+        headers = obter_headers() if obter_headers else None
+        response = sessao.get(url, params={**(params or {}), 'q': consulta, 'maxResults': max_results},
+                              headers=headers, timeout=timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f'HTTP {response.status_code}')
+        return response.json().get('items', [])
+    return consultar
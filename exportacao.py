@@ -0,0 +1,141 @@
+"""Leitura e escrita do catálogo em CSV, JSONL e Parquet, em blocos.
+
+Não depende do banco: biblioteca.py fornece os blocos de linhas lidos com
+fetchmany e grava os blocos lidos daqui, um bloco por transação. Os dois lados
+trabalham um bloco por vez, então a memória usada não cresce com o tamanho
+da biblioteca. O Parquet precisa do pyarrow (opcional).
+"""
+import csv
+import json
+
+# Colunas exportadas da tabela livros, na ordem dos arquivos
+COLUNAS = ['id', 'titulo', 'autor', 'ano', 'categoria', 'idioma', 'num_paginas', 'tamanho_kb',
+           'hash_arquivo', 'nome_arquivo', 'data_adicao', 'notas']
+
+# Colunas inteiras (no CSV tudo é texto; na leitura de qualquer formato são convertidas)
+COLUNAS_INTEIRAS = {'id', 'ano', 'num_paginas', 'tamanho_kb'}
+
+# Extensões reconhecidas de cada formato
+FORMATOS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.parquet': 'parquet'}
+
+# Linhas por bloco na leitura e na escrita
+TAMANHO_BLOCO = 1000
+
+# Formato do arquivo pela extensão
+def formato_por_extensao(caminho):
+    for extensao, formato in FORMATOS.items():
+        if caminho.lower().endswith(extensao):
+            return formato
+    raise ValueError(f'Formato não reconhecido: {caminho} (use .csv, .jsonl ou .parquet)')
+
+def _importar_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Exportar e importar Parquet requer o pyarrow: pip install pyarrow') from None
+    return pyarrow, pyarrow.parquet
+
+# Gravar blocos de tuplas (na ordem de `colunas`) em CSV; retorna o número de linhas
+def escrever_csv(blocos, caminho, colunas=COLUNAS):
+    total = 0
+    with open(caminho, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(colunas)
+        for bloco in blocos:
+            escritor.writerows(bloco)
+            total += len(bloco)
+    return total
+
+# Gravar blocos de tuplas em JSON Lines (um objeto por linha); retorna o número de linhas
+def escrever_jsonl(blocos, caminho, colunas=COLUNAS):
+    total = 0
+    with open(caminho, 'w', encoding='utf-8') as f:
+        for bloco in blocos:
+            f.writelines(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + '\n' for linha in bloco)
+            total += len(bloco)
+    return total
+
+# Gravar blocos de tuplas em Parquet (um grupo de linhas por bloco); retorna o número de linhas
+def escrever_parquet(blocos, caminho, colunas=COLUNAS):
+    pa, pq = _importar_pyarrow()
+    esquema = pa.schema([(coluna, pa.int64() if coluna in COLUNAS_INTEIRAS else pa.string()) for coluna in colunas])
+    total = 0
+    with pq.ParquetWriter(caminho, esquema) as escritor:
+        for bloco in blocos:
+            arrays = [pa.array(valores, type=campo.type) for valores, campo in zip(zip(*bloco), esquema)]
+            escritor.write_table(pa.Table.from_arrays(arrays, schema=esquema))
+            total += len(bloco)
+    return total
+
+# Valor de uma coluna inteira (None se vazio ou se não for um número inteiro, ex.: 's.d.' ou 1999.5)
+def _inteiro(valor):
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, int):
+        return valor
+    if isinstance(valor, float):
+        return int(valor) if valor.is_integer() else None
+    try:
+        return int(str(valor).strip())
+    except ValueError:
+        return None
+
+# Normalizar uma linha lida de qualquer formato (texto vazio é nulo; colunas inteiras viram int).
+# Só as colunas de COLUNAS são mantidas; retorna None se a linha não puder ser gravada (ex.: JSON
+# que não é um objeto, ou uma lista no lugar de um texto)
+def normalizar_linha(linha):
+    if not isinstance(linha, dict):
+        return None
+    normalizada = {}
+    for coluna in COLUNAS:
+        valor = linha.get(coluna)
+        if valor == '' or valor is None:
+            normalizada[coluna] = None
+        elif coluna in COLUNAS_INTEIRAS:
+            normalizada[coluna] = _inteiro(valor)
+        elif isinstance(valor, str):
+            normalizada[coluna] = valor
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            normalizada[coluna] = str(valor)
+        else:
+            return None
+    return normalizada
+
+def _ler_json(linha):
+    try:
+        return json.loads(linha)
+    except ValueError:
+        return None
+
+def _em_blocos(linhas, tamanho_bloco):
+    bloco = []
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) >= tamanho_bloco:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+# Os leitores produzem blocos de linhas normalizadas; uma linha inválida vem como None
+
+# Ler blocos de dicts de um CSV exportado
+def ler_csv(caminho, tamanho_bloco=TAMANHO_BLOCO):
+    with open(caminho, newline='', encoding='utf-8') as f:
+        yield from _em_blocos(map(normalizar_linha, csv.DictReader(f)), tamanho_bloco)
+
+# Ler blocos de dicts de um arquivo JSON Lines (linhas em branco são ignoradas)
+def ler_jsonl(caminho, tamanho_bloco=TAMANHO_BLOCO):
+    with open(caminho, encoding='utf-8') as f:
+        yield from _em_blocos((normalizar_linha(_ler_json(linha)) for linha in f if linha.strip()), tamanho_bloco)
+
+# Ler blocos de dicts de um Parquet, um lote de linhas por vez
+def ler_parquet(caminho, tamanho_bloco=TAMANHO_BLOCO):
+    _, pq = _importar_pyarrow()
+    arquivo = pq.ParquetFile(caminho)
+    for lote in arquivo.iter_batches(batch_size=tamanho_bloco):
+        yield [normalizar_linha(linha) for linha in lote.to_pylist()]
+
+ESCRITORES = {'csv': escrever_csv, 'jsonl': escrever_jsonl, 'parquet': escrever_parquet}
+LEITORES = {'csv': ler_csv, 'jsonl': ler_jsonl, 'parquet': ler_parquet}
@@ -0,0 +1,300 @@
+"""Etapas de ingestão de PDFs sem dependência do Streamlit.
+
+As funções deste módulo rodam também em processos auxiliares (importação em
+lote), por isso não usam st.* e devolvem os erros em vez de exibi-los.
+"""
+import hashlib
+import io
+import os
+import signal
+from contextlib import contextmanager
+
+# Tamanho dos blocos lidos ao calcular hashes e copiar arquivos
+TAMANHO_BLOCO = 1024 * 1024
+
+# Limites de tempo e de memória (acima do uso atual do processo) para ler metadados
+TEMPO_LIMITE_METADATA = 20
+MEMORIA_LIMITE_METADATA_MB = 1024
+
+# Calcular hash do arquivo (bytes ou arquivo aberto, lido em blocos)
+def calcular_hash(file_bytes):
+    if isinstance(file_bytes, (bytes, bytearray, memoryview)):
+        return hashlib.md5(file_bytes).hexdigest()
+
+    md5 = hashlib.md5()
+    for bloco in iter(lambda: file_bytes.read(TAMANHO_BLOCO), b''):
+        md5.update(bloco)
+    return md5.hexdigest()
+
+# Valor de uma entrada do dicionário Info como texto
+def _texto_info(info, chave):
+    valor = info.get(chave)
+    if valor is None:
+        return ''
+    if hasattr(valor, 'get_object'):
+        valor = valor.get_object()
+    return str(valor)
+
+# Sondar metadados do PDF: só o trailer, o dicionário Info e o /Count da árvore de páginas
+def sondar_metadata_pdf(pdf_file):
+    """Levanta exceção se o arquivo não puder ser lido.
+
+    O PdfReader resolve objetos sob demanda, então só o catálogo, o nó raiz
+    das páginas e o Info são lidos. A leitura completa das páginas só é feita
+    se o /Count estiver ausente ou inválido.
+    """
+    import PyPDF2
+
+    pdf_file.seek(0)
+    pdf_reader = PyPDF2.PdfReader(pdf_file, strict=False)
+
+    try:
+        num_paginas = int(pdf_reader.trailer['/Root']['/Pages']['/Count'])
+        if num_paginas < 0:
+            raise ValueError('/Count negativo')
+    except Exception:
+        num_paginas = len(pdf_reader.pages)
+
+    metadata = {
+        'num_paginas': num_paginas,
+        'titulo': '',
+        'autor': ''
+    }
+
+    try:
+        info = pdf_reader.trailer.get('/Info')
+        info = info.get_object() if info is not None else None
+    except Exception:
+        info = None
+    if info:
+        metadata['titulo'] = _texto_info(info, '/Title')
+        metadata['autor'] = _texto_info(info, '/Author')
+
+    return metadata
+
+# Limitar a memória do processo atual a (uso atual + limite_mb); só em sistemas com RLIMIT_AS
+def limitar_memoria_processo(limite_mb=MEMORIA_LIMITE_METADATA_MB):
+    try:
+        import resource
+        with open('/proc/self/statm') as f:
+            uso_atual = int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (ImportError, OSError, ValueError):
+        return
+    limite = uso_atual + limite_mb * 1024 * 1024
+    _, maximo = resource.getrlimit(resource.RLIMIT_AS)
+    if maximo != resource.RLIM_INFINITY:
+        limite = min(limite, maximo)
+    resource.setrlimit(resource.RLIMIT_AS, (limite, maximo))
+
+# Interromper o bloco com TimeoutError após alguns segundos (thread principal, sistemas com SIGALRM)
+@contextmanager
+def tempo_limite(segundos):
+    if not hasattr(signal, 'SIGALRM'):
+        yield
+        return
+
+    def estourar(signum, frame):
+        raise TimeoutError(f'tempo limite de {segundos} s excedido')
+
+    anterior = signal.signal(signal.SIGALRM, estourar)
+    signal.setitimer(signal.ITIMER_REAL, segundos)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, anterior)
+
+# Extrair o texto do PDF página por página, sem manter o livro inteiro em memória
+def extrair_paginas_pdf(caminho_arquivo):
+    import PyPDF2
+
+    # Passar o arquivo aberto evita que o PyPDF2 copie o PDF inteiro para a memória
+    with open(caminho_arquivo, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        for numero, pagina in enumerate(pdf_reader.pages, start=1):
+            try:
+                texto = pagina.extract_text() or ''
+            except Exception:
+                texto = ''
+            if texto.strip():
+                yield numero, texto
+
+# Sondar os metadados de um PDF pelo caminho
+def sondar_metadata_arquivo(caminho):
+    with open(caminho, 'rb') as f:
+        return sondar_metadata_pdf(f)
+
+# Contexto dos processos auxiliares: forkserver (ou spawn), nunca fork. O fork copiaria o processo do
+# Streamlit com as travas das outras threads (logging, imports, malloc) como estivessem, e o filho
+# poderia travar. O servidor do forkserver importa o módulo principal, este e o PyPDF2 uma única
+# vez, então os filhos não os reimportam.
+def contexto_processos():
+    import multiprocessing
+
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context('forkserver')
+        contexto.set_forkserver_preload(['__main__', 'ingestao', 'PyPDF2'])
+        return contexto
+    return multiprocessing.get_context('spawn')
+
+# Executado no processo auxiliar de executar_com_limites
+def _executar_no_processo(funcao, caminho, memoria_mb, conexao):
+    try:
+        limitar_memoria_processo(memoria_mb)
+        conexao.send((funcao(caminho), None))
+    except BaseException as e:
+        conexao.send((None, f'{type(e).__name__}: {e}'))
+    finally:
+        conexao.close()
+
+# Executar funcao(caminho) em um processo separado, com limites de tempo e de memória
+def executar_com_limites(funcao, caminho, tempo=TEMPO_LIMITE_METADATA, memoria_mb=MEMORIA_LIMITE_METADATA_MB):
+    """Levanta TimeoutError se o tempo acabar e RuntimeError se a função falhar.
+
+    funcao precisa ser importável pelo processo filho (uma função de módulo, como as deste).
+    """
+    contexto = contexto_processos()
+    receptor, emissor = contexto.Pipe(duplex=False)
+    processo = contexto.Process(target=_executar_no_processo, args=(funcao, caminho, memoria_mb, emissor), daemon=True)
+    processo.start()
+    emissor.close()
+
+    try:
+        if not receptor.poll(tempo):
+            raise TimeoutError(f'leitura do PDF excedeu {tempo} s')
+        try:
+            resultado, erro = receptor.recv()
+        except EOFError:
+            raise RuntimeError('o processo de leitura do PDF terminou inesperadamente')
+    finally:
+        receptor.close()
+        if processo.is_alive():
+            processo.kill()
+        processo.join()
+
+    if erro:
+        raise RuntimeError(erro)
+    return resultado
+
+# Sondar metadados em um processo separado, com limites de tempo e de memória
+def sondar_metadata_com_limites(caminho, tempo=TEMPO_LIMITE_METADATA, memoria_mb=MEMORIA_LIMITE_METADATA_MB):
+    return executar_com_limites(sondar_metadata_arquivo, caminho, tempo, memoria_mb)
+
+# Listar os PDFs de uma pasta (recursivamente) ou de um arquivo ZIP
+def listar_pdfs(origem):
+    """Retorna itens (caminho, membro); membro é None para arquivos fora de ZIP"""
+    import zipfile
+
+    if os.path.isdir(origem):
+        itens = []
+        for raiz, _, arquivos in os.walk(origem):
+            for nome in sorted(arquivos):
+                if nome.lower().endswith('.pdf'):
+                    itens.append((os.path.join(raiz, nome), None))
+        return itens
+
+    if zipfile.is_zipfile(origem):
+        with zipfile.ZipFile(origem) as zf:
+            return [
+                (origem, info.filename) for info in zf.infolist()
+                if not info.is_dir() and info.filename.lower().endswith('.pdf')
+            ]
+
+    raise ValueError(f"'{origem}' não é uma pasta nem um arquivo ZIP")
+
+# Percorrer os PDFs de uma pasta (recursivamente) só com os dados do sistema de arquivos, sem abrir os arquivos
+def varrer_pdfs(pasta):
+    """Gera (caminho, tamanho, mtime_ns, inode). Arquivos e pastas ocultos (ex.: cópias em andamento) são ignorados"""
+    pendentes = [pasta]
+    while pendentes:
+        atual = pendentes.pop()
+        try:
+            with os.scandir(atual) as entradas:
+                for entrada in entradas:
+                    if entrada.name.startswith('.'):
+                        continue
+                    if entrada.is_dir(follow_symlinks=False):
+                        pendentes.append(entrada.path)
+                    elif entrada.name.lower().endswith('.pdf') and entrada.is_file():
+                        estado = entrada.stat()
+                        yield entrada.path, estado.st_size, estado.st_mtime_ns, estado.st_ino
+        except OSError:
+            # Pasta removida ou sem permissão durante a varredura
+            continue
+
+# Nome original do arquivo de um item
+def nome_item(item):
+    caminho, membro = item
+    return os.path.basename(membro if membro is not None else caminho)
+
+# Abrir um item para leitura binária
+@contextmanager
+def abrir_item(item):
+    import zipfile
+
+    caminho, membro = item
+    if membro is None:
+        with open(caminho, 'rb') as f:
+            yield f
+    else:
+        with zipfile.ZipFile(caminho) as zf, zf.open(membro) as f:
+            yield f
+
+# Etapa 1 (processo auxiliar): hash e tamanho de um item
+def hash_item(item):
+    """Retorna (item, hash, tamanho_kb, erro)"""
+    import zipfile
+
+    try:
+        with abrir_item(item) as f:
+            hash_arquivo = calcular_hash(f)
+        caminho, membro = item
+        if membro is None:
+            tamanho = os.path.getsize(caminho)
+        else:
+            with zipfile.ZipFile(caminho) as zf:
+                tamanho = zf.getinfo(membro).file_size
+        return item, hash_arquivo, tamanho // 1024, None
+    except Exception as e:
+        return item, None, 0, str(e)
+
+# Etapa 2 (processo auxiliar): metadados de um item, dentro do limite de tempo
+def metadata_item(item, tempo=TEMPO_LIMITE_METADATA):
+    """Retorna (item, metadata, erro)"""
+    try:
+        with tempo_limite(tempo), abrir_item(item) as f:
+            # Membros de ZIP não suportam seek eficiente; ler em memória (um arquivo por processo)
+            if item[1] is not None:
+                f = io.BytesIO(f.read())
+            return item, sondar_metadata_pdf(f), None
+    except (Exception, MemoryError) as e:
+        return item, None, f'{type(e).__name__}: {e}'
+
+# Copiar um item para o destino (escrita em arquivo temporário e renomeação)
+def copiar_item(item, destino):
+    import shutil
+
+    temporario = destino + '.tmp'
+    with abrir_item(item) as origem, open(temporario, 'wb') as f:
+        shutil.copyfileobj(origem, f, TAMANHO_BLOCO)
+    os.replace(temporario, destino)
+
+# Gravar um arquivo aberto em um temporário, calculando o hash durante a cópia
+def gravar_temporario_com_hash(origem, diretorio):
+    """Retorna (caminho_temporario, hash, tamanho_em_bytes)"""
+    import tempfile
+
+    os.makedirs(diretorio, exist_ok=True)
+    md5 = hashlib.md5()
+    tamanho = 0
+    with tempfile.NamedTemporaryFile(dir=diretorio, suffix='.part', delete=False) as destino:
+        try:
+            for bloco in iter(lambda: origem.read(TAMANHO_BLOCO), b''):
+                md5.update(bloco)
+                destino.write(bloco)
+                tamanho += len(bloco)
+        except BaseException:
+            destino.close()
+            os.remove(destino.name)
+            raise
+    return destino.name, md5.hexdigest(), tamanho
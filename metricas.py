@@ -0,0 +1,266 @@
+"""Instrumentação leve dos pontos quentes: consultas SQLite, E/S de arquivos, PDFs e HTTP.
+
+A coleta é por thread: só é feita enquanto houver um coletor ativo na thread
+atual (app.py ativa um por execução do script quando o painel de desempenho
+está ligado). Desligada, cada ponto instrumentado custa só a leitura de um
+atributo de threading.local. Tudo o que é coletado também vai para um
+coletor do processo, exportado em JSON ou no formato texto do Prometheus.
+"""
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Categorias das operações medidas
+SQLITE = 'sqlite'
+ARQUIVO = 'arquivo'
+PDF = 'pdf'
+HTTP = 'http'
+
+# Agregado de operações: (categoria, operacao) -> [contagem, segundos, maior duração]
+class Coletor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operacoes = {}
+
+    def registrar(self, categoria, operacao, segundos, contar=True):
+        """contar=False só soma o tempo (ex.: leitura das linhas de uma consulta já contada)"""
+        with self._lock:
+            dados = self.operacoes.get((categoria, operacao))
+            if dados is None:
+                self.operacoes[(categoria, operacao)] = [int(contar), segundos, segundos if contar else 0.0]
+            else:
+                dados[0] += contar
+                dados[1] += segundos
+                if contar and segundos > dados[2]:
+                    dados[2] = segundos
+
+    def incorporar(self, outro):
+        """Somar as operações de outro coletor (ex.: a execução atual no total da sessão)"""
+        with self._lock:
+            for chave, (contagem, segundos, maximo) in list(outro.operacoes.items()):
+                dados = self.operacoes.setdefault(chave, [0, 0.0, 0.0])
+                dados[0] += contagem
+                dados[1] += segundos
+                dados[2] = max(dados[2], maximo)
+
+    def totais_por_categoria(self):
+        """{categoria: (contagem, segundos)}"""
+        totais = {}
+        with self._lock:
+            for (categoria, _), (contagem, segundos, _) in self.operacoes.items():
+                anterior = totais.get(categoria, (0, 0.0))
+                totais[categoria] = (anterior[0] + contagem, anterior[1] + segundos)
+        return totais
+
+    def linhas(self):
+        """[(categoria, operacao, contagem, segundos, maximo)], mais demoradas primeiro"""
+        with self._lock:
+            linhas = [(cat, op, cont, seg, maximo) for (cat, op), (cont, seg, maximo) in self.operacoes.items()]
+        return sorted(linhas, key=lambda linha: linha[3], reverse=True)
+
+# Coletor do processo (exportado) e coletor da thread atual
+_processo = Coletor()
+_local = threading.local()
+
+def coletor_processo():
+    return _processo
+
+# Coletor ativo na thread atual (None se a coleta estiver desligada)
+def coletor_atual():
+    return getattr(_local, 'coletor', None)
+
+# Ativar a coleta nesta thread com um coletor novo; retorna o coletor
+def iniciar_coleta():
+    _local.coletor = Coletor()
+    return _local.coletor
+
+# Desativar a coleta nesta thread; retorna o coletor que estava ativo
+def encerrar_coleta():
+    coletor = coletor_atual()
+    _local.coletor = None
+    return coletor
+
+def registrar(categoria, operacao, segundos, coletor=None, contar=True):
+    coletor = coletor or coletor_atual()
+    if coletor is None:
+        return
+    coletor.registrar(categoria, operacao, segundos, contar)
+    _processo.registrar(categoria, operacao, segundos, contar)
+
+# Medir um bloco (só se houver coleta ativa na thread)
+@contextmanager
+def medir(categoria, operacao):
+    coletor = coletor_atual()
+    if coletor is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(categoria, operacao, time.perf_counter() - inicio, coletor)
+
+# Decorador: medir cada chamada da função
+def instrumentar(categoria, operacao=None):
+    def decorador(funcao):
+        nome = operacao or funcao.__name__
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            coletor = getattr(_local, 'coletor', None)
+            if coletor is None:
+                return funcao(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                registrar(categoria, nome, time.perf_counter() - inicio, coletor)
+        return envoltorio
+    return decorador
+
+# Levar o coletor da thread atual para funções executadas em outras threads (ex.: executor.map)
+def propagar(funcao):
+    coletor = coletor_atual()
+    if coletor is None:
+        return funcao
+
+    @functools.wraps(funcao)
+    def envoltorio(*args, **kwargs):
+        anterior = coletor_atual()
+        _local.coletor = coletor
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            _local.coletor = anterior
+    return envoltorio
+
+# Nome de uma consulta nas métricas: SQL em uma linha, com listas de parâmetros resumidas
+def nome_consulta(sql, limite=120):
+    sql = ' '.join(sql.split())
+    sql = re.sub(r'\?(\s*,\s*\?)+', '?…', sql)
+    return sql if len(sql) <= limite else sql[:limite - 1] + '…'
+
+# Cursor que mede execute/executemany e a leitura dos resultados
+class CursorInstrumentado(sqlite3.Cursor):
+    _consulta = None
+
+    def execute(self, sql, parametros=()):
+        coletor = getattr(_local, 'coletor', None)
+        if coletor is None:
+            return super().execute(sql, parametros)
+        self._consulta = nome_consulta(sql)
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            registrar(SQLITE, self._consulta, time.perf_counter() - inicio, coletor)
+
+    def executemany(self, sql, sequencia):
+        coletor = getattr(_local, 'coletor', None)
+        if coletor is None:
+            return super().executemany(sql, sequencia)
+        self._consulta = nome_consulta(sql)
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, sequencia)
+        finally:
+            registrar(SQLITE, self._consulta, time.perf_counter() - inicio, coletor)
+
+    def executescript(self, script):
+        with medir(SQLITE, nome_consulta(script)):
+            return super().executescript(script)
+
+    # O SQLite calcula as linhas sob demanda: a leitura conta como parte da consulta
+    def _ler(self, leitura, *args):
+        coletor = getattr(_local, 'coletor', None)
+        if coletor is None or self._consulta is None:
+            return leitura(*args)
+        inicio = time.perf_counter()
+        try:
+            return leitura(*args)
+        finally:
+            registrar(SQLITE, self._consulta, time.perf_counter() - inicio, coletor, contar=False)
+
+    def fetchone(self):
+        return self._ler(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._ler(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._ler(super().fetchall)
+
+# Conexão cujos cursores (inclusive os de conn.execute) são instrumentados
+class ConexaoInstrumentada(sqlite3.Connection):
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return self.cursor().executemany(sql, sequencia)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+# Medir as requisições de uma sessão do requests (por método, servidor e caminho)
+def instrumentar_sessao_http(sessao):
+    from urllib.parse import urlsplit
+    requisitar = sessao.request
+
+    @functools.wraps(requisitar)
+    def request(method, url, *args, **kwargs):
+        coletor = getattr(_local, 'coletor', None)
+        if coletor is None:
+            return requisitar(method, url, *args, **kwargs)
+        partes = urlsplit(url)
+        inicio = time.perf_counter()
+        try:
+            return requisitar(method, url, *args, **kwargs)
+        finally:
+            registrar(HTTP, f'{method.upper()} {partes.netloc}{partes.path}', time.perf_counter() - inicio, coletor)
+    sessao.request = request
+    return sessao
+
+# Exportar as métricas em JSON
+def exportar_json(coletor):
+    return json.dumps({
+        'gerado_em': time.time(),
+        'operacoes': [
+            {'categoria': cat, 'operacao': op, 'contagem': cont, 'segundos': round(seg, 6), 'maximo_segundos': round(maximo, 6)}
+            for cat, op, cont, seg, maximo in coletor.linhas()
+        ]
+    }, ensure_ascii=False, indent=2)
+
+def _rotulo(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+# Exportar as métricas no formato texto do Prometheus
+def exportar_prometheus(coletor, prefixo='biblioteca'):
+    linhas_metricas = coletor.linhas()
+    saida = []
+    for sufixo, tipo, ajuda, indice in (
+        ('operacoes_total', 'counter', 'Número de operações', 2),
+        ('operacoes_segundos_total', 'counter', 'Tempo total das operações em segundos', 3),
+        ('operacoes_segundos_max', 'gauge', 'Maior duração de uma operação em segundos', 4),
+    ):
+        saida.append(f'# HELP {prefixo}_{sufixo} {ajuda}')
+        saida.append(f'# TYPE {prefixo}_{sufixo} {tipo}')
+        for linha in linhas_metricas:
+            saida.append(f'{prefixo}_{sufixo}{{categoria="{_rotulo(linha[0])}",operacao="{_rotulo(linha[1])}"}} {linha[indice]}')
+    return '\n'.join(saida) + '\n'
+
+# Gravar as métricas do processo em um arquivo (.json em JSON, qualquer outra extensão no formato do Prometheus)
+def gravar_metricas(caminho, coletor=None):
+    coletor = coletor or _processo
+    conteudo = exportar_json(coletor) if caminho.endswith('.json') else exportar_prometheus(coletor)
+    temporario = f'{caminho}.{threading.get_ident()}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write(conteudo)
+    os.replace(temporario, caminho)
@@ -0,0 +1,269 @@
+"""Servidor HTTP dos PDFs armazenados, com suporte a Range, ETag e GET condicional.
+
+O st.download_button envia o arquivo inteiro pelo websocket do Streamlit; por
+este servidor o navegador abre o PDF direto e pede só os trechos de que
+precisa (o visualizador de PDF usa requisições Range). Os links são assinados
+com HMAC e expiram, então o servidor pode ficar exposto sem listar a
+biblioteca. No modo multiusuário o link leva o nome da biblioteca, coberto
+pela assinatura. O corpo das respostas é enviado com sendfile (sem cópia para o
+espaço do usuário) quando o sistema permite.
+
+Uso:
+    python servidor_pdfs.py --pasta /caminho/da/biblioteca --porta 8502
+"""
+import email.utils
+import hashlib
+import hmac
+import http.server
+import os
+import re
+import secrets
+import sys
+import time
+from urllib.parse import parse_qs, quote, urlencode, urlsplit
+
+# Validade padrão dos links assinados (segundos)
+VALIDADE_LINKS = 3600
+
+# Caminho de um PDF no servidor: /pdf/<md5>
+PADRAO_CAMINHO = re.compile(r'^/pdf/([0-9a-f]{32})$')
+
+# Cabeçalho Range com um único intervalo: bytes=inicio-fim, bytes=inicio- ou bytes=-sufixo
+PADRAO_RANGE = re.compile(r'^bytes=\s*(\d*)\s*-\s*(\d*)\s*$')
+
+# Threads atendendo conexões ao mesmo tempo
+MAX_CONEXOES = 16
+
+# Chave dos links: lida do arquivo ou criada na primeira vez (compartilhada entre o app e o servidor)
+def obter_chave(caminho):
+    try:
+        with open(caminho, 'rb') as f:
+            chave = f.read()
+        if chave:
+            return chave
+    except FileNotFoundError:
+        pass
+    chave = secrets.token_bytes(32)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    descritor = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descritor, 'wb') as f:
+        f.write(chave)
+    os.replace(temporario, caminho)
+    return chave
+
+def assinar(chave, hash_arquivo, expira, biblioteca=None):
+    mensagem = f'{hash_arquivo}:{expira}' if biblioteca is None else f'{biblioteca}/{hash_arquivo}:{expira}'
+    return hmac.new(chave, mensagem.encode(), hashlib.sha256).hexdigest()
+
+# Link assinado para um PDF, válido por `validade` segundos
+def gerar_link(url_base, chave, hash_arquivo, nome_arquivo=None, validade=VALIDADE_LINKS, biblioteca=None):
+    expira = int(time.time()) + validade
+    parametros = {'expira': expira, 'assinatura': assinar(chave, hash_arquivo, expira, biblioteca)}
+    if biblioteca is not None:
+        parametros['biblioteca'] = biblioteca
+    if nome_arquivo:
+        parametros['nome'] = nome_arquivo
+    return f"{url_base.rstrip('/')}/pdf/{hash_arquivo}?{urlencode(parametros)}"
+
+# Conferir a assinatura e a validade de um link
+def link_valido(chave, hash_arquivo, expira, assinatura, agora=None, biblioteca=None):
+    if not expira.isdigit() or int(expira) < (agora or time.time()):
+        return False
+    return hmac.compare_digest(assinar(chave, hash_arquivo, int(expira), biblioteca), assinatura)
+
+# Intervalo pedido no cabeçalho Range: (inicio, fim) inclusivo, None para o arquivo inteiro, ou False se não satisfazível
+def interpretar_range(valor, tamanho):
+    """Pedidos com vários intervalos são atendidos com o arquivo inteiro (permitido pela RFC 9110)"""
+    correspondencia = PADRAO_RANGE.match(valor)
+    if correspondencia is None:
+        return None
+    inicio, fim = correspondencia.groups()
+    if not inicio:
+        if not fim:
+            return None
+        # Sufixo: os últimos N bytes
+        sufixo = int(fim)
+        if sufixo == 0 or tamanho == 0:
+            return False
+        return max(0, tamanho - sufixo), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        return False
+    return inicio, fim
+
+class ManipuladorPDFs(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'BibliotecaPDFs/1.0'
+    # Conexões keep-alive ociosas liberam a thread depois deste tempo
+    timeout = 30
+
+    def do_GET(self):
+        self.responder(enviar_corpo=True)
+
+    def do_HEAD(self):
+        self.responder(enviar_corpo=False)
+
+    def log_message(self, formato, *args):
+        if not self.server.silencioso:
+            super().log_message(formato, *args)
+
+    def responder_erro(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def responder(self, enviar_corpo):
+        url = urlsplit(self.path)
+        correspondencia = PADRAO_CAMINHO.match(url.path)
+        if correspondencia is None:
+            return self.responder_erro(404)
+        hash_arquivo = correspondencia.group(1)
+        parametros = parse_qs(url.query)
+        expira = parametros.get('expira', [''])[0]
+        assinatura = parametros.get('assinatura', [''])[0]
+        biblioteca = parametros.get('biblioteca', [None])[0]
+        if not link_valido(self.server.chave, hash_arquivo, expira, assinatura, biblioteca=biblioteca):
+            return self.responder_erro(403)
+
+        try:
+            caminho_arquivo = self.server.localizar(hash_arquivo, biblioteca)
+        except ValueError:
+            return self.responder_erro(404)
+        if caminho_arquivo is None:
+            return self.responder_erro(404)
+        try:
+            arquivo = open(caminho_arquivo, 'rb')
+        except OSError:
+            return self.responder_erro(404)
+
+        with arquivo:
+            estado = os.fstat(arquivo.fileno())
+            tamanho = estado.st_size
+            # O nome do arquivo é o hash do conteúdo, então ele serve de ETag forte
+            etag = f'"{hash_arquivo}"'
+            ultima_modificacao = email.utils.formatdate(estado.st_mtime, usegmt=True)
+
+            if self.nao_modificado(etag, estado.st_mtime):
+                self.send_response(304)
+                self.enviar_cabecalhos_cache(etag, ultima_modificacao, int(expira))
+                self.end_headers()
+                return
+
+            intervalo = None
+            range_pedido = self.headers.get('Range')
+            if range_pedido and self.if_range_confere(etag, estado.st_mtime):
+                intervalo = interpretar_range(range_pedido, tamanho)
+            if intervalo is False:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{tamanho}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            inicio, fim = intervalo or (0, tamanho - 1)
+            self.send_response(206 if intervalo else 200)
+            if intervalo:
+                self.send_header('Content-Range', f'bytes {inicio}-{fim}/{tamanho}')
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(fim - inicio + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            nome = parametros.get('nome', [f'{hash_arquivo}.pdf'])[0]
+            self.send_header('Content-Disposition', f"inline; filename*=UTF-8''{quote(nome)}")
+            self.enviar_cabecalhos_cache(etag, ultima_modificacao, int(expira))
+            self.end_headers()
+
+            if enviar_corpo and tamanho:
+                # socket.sendfile usa os.sendfile quando disponível e cai para send() caso contrário
+                self.connection.sendfile(arquivo, inicio, fim - inicio + 1)
+
+    def enviar_cabecalhos_cache(self, etag, ultima_modificacao, expira):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', ultima_modificacao)
+        # O navegador pode reaproveitar a resposta enquanto o link for válido
+        self.send_header('Cache-Control', f'private, max-age={max(0, expira - int(time.time()))}')
+
+    # If-None-Match tem precedência sobre If-Modified-Since
+    def nao_modificado(self, etag, mtime):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            valores = [valor.strip() for valor in if_none_match.split(',')]
+            # Comparação fraca: W/"x" confere com "x" (sem str.removeprefix, que exige Python 3.9)
+            return '*' in valores or etag in [valor[2:] if valor.startswith('W/') else valor for valor in valores]
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                data = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= data.timestamp()
+        return False
+
+    # If-Range: o intervalo só vale se o arquivo for o mesmo que o navegador já tem
+    def if_range_confere(self, etag, mtime):
+        if_range = self.headers.get('If-Range')
+        if not if_range:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"'):
+            return if_range == etag
+        try:
+            return int(mtime) <= email.utils.parsedate_to_datetime(if_range).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+# Servidor com um número limitado de threads (cada conexão ocupa uma thread enquanto estiver aberta)
+class ServidorPDFs(http.server.HTTPServer):
+    def __init__(self, endereco, localizar, chave, max_conexoes=MAX_CONEXOES, silencioso=False):
+        """localizar(hash_arquivo, biblioteca) devolve o caminho do PDF no disco, ou None
+
+        biblioteca é o nome assinado no link (None fora do modo multiusuário).
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        super().__init__(endereco, ManipuladorPDFs)
+        self.localizar = localizar
+        self.chave = chave
+        self.silencioso = silencioso
+        self._executor = ThreadPoolExecutor(max_workers=max_conexoes, thread_name_prefix='servidor-pdfs')
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Servidor HTTP dos PDFs da biblioteca')
+    parser.add_argument('--pasta', default='.', help='pasta da biblioteca (biblioteca.db, pdfs/ e bibliotecas/)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8502)
+    parser.add_argument('--conexoes', type=int, default=MAX_CONEXOES, help='conexões atendidas ao mesmo tempo')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(args.pasta)
+    import biblioteca
+
+    servidor = ServidorPDFs((args.host, args.porta), biblioteca.localizar_pdf_biblioteca,
+                            obter_chave(biblioteca.CAMINHO_CHAVE_LINKS), args.conexoes)
+    print(f'Servindo os PDFs em http://{args.host}:{args.porta}/pdf/<hash>', file=sys.stderr)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import http.server
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+# Os módulos da biblioteca ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import biblioteca
+
+
+# Biblioteca vazia em `pasta`, selecionada na thread atual
+@contextmanager
+def biblioteca_em(pasta):
+    registro = biblioteca.RegistroBibliotecas(pasta=str(pasta))
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(biblioteca, 'obter_registro_bibliotecas', lambda: registro)
+        biblioteca.criar_biblioteca('teste')
+        with biblioteca.usar_biblioteca('teste'):
+            yield registro.obter('teste')
+    for aberta in list(registro._bibliotecas.values()):
+        aberta.conexoes.fechar()
+
+
+@pytest.fixture
+def biblioteca_temporaria(tmp_path):
+    with biblioteca_em(tmp_path) as aberta:
+        yield aberta
+
+
+# Servidor HTTP local em uma thread: responder(manipulador) trata cada GET ou POST; produz a URL base
+@contextmanager
+def servidor_local(responder):
+    class Manipulador(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            responder(self)
+
+        do_POST = do_GET
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Manipulador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{servidor.server_address[1]}'
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def responder_json(manipulador, dados, status=200):
+    corpo = json.dumps(dados).encode()
+    manipulador.send_response(status)
+    manipulador.send_header('Content-Type', 'application/json')
+    manipulador.send_header('Content-Length', str(len(corpo)))
+    manipulador.end_headers()
+    manipulador.wfile.write(corpo)
@@ -0,0 +1,38 @@
+"""Modo multiusuário: registro de bibliotecas e conexões."""
+import sqlite3
+
+import pytest
+
+import biblioteca
+
+
+def test_biblioteca_inexistente_nao_e_criada(biblioteca_temporaria, tmp_path):
+    with pytest.raises(ValueError, match='não encontrada'):
+        biblioteca.selecionar_biblioteca('outra')
+    assert not (tmp_path / 'outra').exists()
+    with pytest.raises(ValueError, match='inválido'):
+        biblioteca.criar_biblioteca('../fora')
+
+
+def test_criar_biblioteca(biblioteca_temporaria, tmp_path):
+    assert biblioteca.criar_biblioteca('outra') is True
+    assert (tmp_path / 'outra' / biblioteca.CAMINHO_BANCO).exists()
+    assert biblioteca.criar_biblioteca('outra') is False
+    with biblioteca.usar_biblioteca('outra'):
+        assert biblioteca.obter_estatisticas()['total_livros'] == 0
+
+
+def test_falha_ao_abrir_conexao_nao_conta_no_limite(tmp_path, monkeypatch):
+    registro = biblioteca.RegistroBibliotecas(pasta=str(tmp_path))
+    registro.criar('teste')
+    gerenciador = registro.obter('teste').conexoes
+
+    def conectar_com_erro(*args, **kwargs):
+        raise sqlite3.OperationalError('unable to open database file')
+
+    monkeypatch.setattr(biblioteca.sqlite3, 'connect', conectar_com_erro)
+    for _ in range(3):
+        with pytest.raises(sqlite3.OperationalError):
+            with gerenciador.leitura():
+                pass
+    assert registro.estatisticas()['conexoes_abertas'] == 0
@@ -0,0 +1,64 @@
+"""Cache de consultas: alterações feitas por outro processo também descartam os resultados guardados."""
+import sqlite3
+
+import biblioteca
+
+
+# Conexão independente das do módulo, como a de um `cli.py add` rodando em outro processo
+def inserir_por_fora(aberta, titulo, hash_arquivo):
+    conn = sqlite3.connect(aberta.caminho(biblioteca.CAMINHO_BANCO))
+    with conn:
+        conn.execute('INSERT INTO livros (titulo, categoria, hash_arquivo) VALUES (?, ?, ?)',
+                     (titulo, 'Romance', hash_arquivo))
+    conn.close()
+
+
+# Fazer a próxima consulta conferir a geração do banco, como se o intervalo tivesse passado
+def vencer_intervalo():
+    biblioteca.obter_cache_consultas().verificado_em = float('-inf')
+
+
+def test_alteracao_de_outro_processo_invalida_o_cache(biblioteca_temporaria):
+    inserir_por_fora(biblioteca_temporaria, 'Dom Casmurro', 'a' * 32)
+    assert biblioteca.obter_estatisticas()['total_livros'] == 1
+    assert len(biblioteca.buscar_livros_pagina()[0]) == 1
+
+    inserir_por_fora(biblioteca_temporaria, 'Memórias Póstumas', 'b' * 32)
+    # Dentro do intervalo o resultado guardado ainda vale
+    assert biblioteca.obter_estatisticas()['total_livros'] == 1
+    vencer_intervalo()
+    assert biblioteca.obter_estatisticas()['total_livros'] == 2
+    assert len(biblioteca.buscar_livros_pagina()[0]) == 2
+    assert biblioteca.contar_facetas()['categoria'] == [('Romance', 2)]
+
+
+def test_sem_alteracoes_o_resultado_vem_do_cache(biblioteca_temporaria, monkeypatch):
+    inserir_por_fora(biblioteca_temporaria, 'Dom Casmurro', 'a' * 32)
+    cache = biblioteca.obter_cache_consultas()
+    biblioteca.obter_estatisticas()
+    acertos = cache.acertos
+
+    def sem_banco():
+        raise AssertionError('um acerto dentro do intervalo não deve usar o banco')
+
+    monkeypatch.setattr(biblioteca, 'conexao_leitura', sem_banco)
+    biblioteca.obter_estatisticas()
+    assert cache.acertos == acertos + 1
+
+
+def test_geracao_inalterada_mantem_o_cache(biblioteca_temporaria):
+    inserir_por_fora(biblioteca_temporaria, 'Dom Casmurro', 'a' * 32)
+    cache = biblioteca.obter_cache_consultas()
+    biblioteca.obter_estatisticas()
+    vencer_intervalo()
+    acertos = cache.acertos
+    biblioteca.obter_estatisticas()
+    assert cache.acertos == acertos + 1
+
+
+def test_alteracao_deste_processo_invalida_na_hora(biblioteca_temporaria):
+    assert biblioteca.obter_estatisticas()['total_livros'] == 0
+    with biblioteca.conexao_escrita() as conn:
+        conn.execute("INSERT INTO livros (titulo, hash_arquivo) VALUES ('Iracema', 'c')")
+    biblioteca.invalidar_consultas()
+    assert biblioteca.obter_estatisticas()['total_livros'] == 1
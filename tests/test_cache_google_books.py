@@ -0,0 +1,37 @@
+"""Cache persistente das respostas da Google Books API."""
+import biblioteca
+
+
+def contadores_gravados():
+    with biblioteca.conexao_leitura() as conn:
+        return dict(conn.execute('SELECT nome, valor FROM contadores_cache').fetchall())
+
+
+def test_leitura_nao_usa_conexao_de_escrita(biblioteca_temporaria, monkeypatch):
+    biblioteca.gravar_cache_google_books('machado|5', [{'id': 1}])
+
+    def sem_escrita():
+        raise AssertionError('a leitura do cache não deve usar a conexão de escrita')
+
+    monkeypatch.setattr(biblioteca, 'conexao_escrita', sem_escrita)
+    assert biblioteca.ler_cache_google_books('machado|5') == [{'id': 1}]
+    assert biblioteca.ler_cache_google_books('assis|5') is None
+    estatisticas = biblioteca.obter_estatisticas_cache_google_books()
+    assert (estatisticas['acertos'], estatisticas['falhas'], estatisticas['entradas']) == (1, 1, 1)
+
+
+def test_acessos_gravados_em_lote(biblioteca_temporaria, monkeypatch):
+    monkeypatch.setattr(biblioteca, 'MAX_ACESSOS_PENDENTES_GOOGLE_BOOKS', 3)
+    biblioteca.gravar_cache_google_books('machado|5', [])
+    with biblioteca.conexao_leitura() as conn:
+        antes = conn.execute("SELECT ultimo_acesso FROM cache_google_books WHERE chave = 'machado|5'").fetchone()[0]
+
+    biblioteca.ler_cache_google_books('machado|5')
+    biblioteca.ler_cache_google_books('outra|5')
+    assert contadores_gravados() == {}
+    biblioteca.ler_cache_google_books('machado|5')
+    assert contadores_gravados() == {'google_books_acertos': 2, 'google_books_falhas': 1}
+    with biblioteca.conexao_leitura() as conn:
+        depois = conn.execute("SELECT ultimo_acesso FROM cache_google_books WHERE chave = 'machado|5'").fetchone()[0]
+    assert depois > antes
+    assert biblioteca.obter_estatisticas_cache_google_books()['acertos'] == 2
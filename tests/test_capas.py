@@ -0,0 +1,95 @@
+"""Cache de capas contra um servidor de imagens local."""
+import os
+import threading
+import time
+
+import pytest
+
+import biblioteca
+from conftest import servidor_local
+
+pytest.importorskip('requests')
+
+PNG = b'\x89PNG\r\n\x1a\n'
+
+
+# Servidor de capas: /capa/<n> (PNG), /ausente (404), /lenta (demora), /grande e /grande-sem-tamanho
+@pytest.fixture
+def servidor_capas():
+    estado = {'pedidos': [], 'simultaneos': 0, 'maximo_simultaneos': 0, 'atraso': 0.0}
+    lock = threading.Lock()
+
+    def responder(manipulador):
+        caminho = manipulador.path
+        with lock:
+            estado['pedidos'].append(caminho)
+            estado['simultaneos'] += 1
+            estado['maximo_simultaneos'] = max(estado['maximo_simultaneos'], estado['simultaneos'])
+        try:
+            if caminho == '/ausente':
+                manipulador.send_response(404)
+                manipulador.send_header('Content-Length', '0')
+                manipulador.end_headers()
+                return
+            if caminho == '/lenta':
+                time.sleep(1.5)
+            time.sleep(estado['atraso'])
+            corpo = PNG + (b'\0' * 1024 * 1024 if caminho.startswith('/grande') else caminho.encode())
+            manipulador.send_response(200)
+            manipulador.send_header('Content-Type', 'image/png')
+            if caminho == '/grande-sem-tamanho':
+                manipulador.send_header('Connection', 'close')
+            else:
+                manipulador.send_header('Content-Length', str(len(corpo)))
+            manipulador.end_headers()
+            manipulador.wfile.write(corpo)
+        finally:
+            with lock:
+                estado['simultaneos'] -= 1
+
+    with servidor_local(responder) as url:
+        yield url, estado
+
+
+def test_capa_em_cache_nao_usa_a_rede(biblioteca_temporaria, servidor_capas):
+    url, estado = servidor_capas
+    primeira = biblioteca.obter_capas([f'{url}/capa/1'])
+    assert os.path.exists(primeira[f'{url}/capa/1'])
+    assert estado['pedidos'] == ['/capa/1']
+
+    assert biblioteca.obter_capas([f'{url}/capa/1']) == primeira
+    assert estado['pedidos'] == ['/capa/1']
+
+
+def test_downloads_simultaneos(biblioteca_temporaria, servidor_capas):
+    url, estado = servidor_capas
+    estado['atraso'] = 0.3
+    urls = [f'{url}/capa/{n}' for n in range(biblioteca.MAX_DOWNLOADS_CAPAS)]
+
+    inicio = time.perf_counter()
+    capas = biblioteca.obter_capas(urls)
+    duracao = time.perf_counter() - inicio
+
+    assert sorted(capas) == sorted(urls)
+    assert len(set(capas.values())) == len(urls)
+    assert 1 < estado['maximo_simultaneos'] <= biblioteca.MAX_DOWNLOADS_CAPAS
+    assert duracao < 0.3 * len(urls) / 2
+
+
+def test_capa_ausente_fica_de_fora(biblioteca_temporaria, servidor_capas):
+    url, _ = servidor_capas
+    capas = biblioteca.obter_capas([f'{url}/ausente', f'{url}/capa/1'])
+    assert list(capas) == [f'{url}/capa/1']
+
+
+def test_tempo_limite(biblioteca_temporaria, servidor_capas, monkeypatch):
+    url, _ = servidor_capas
+    monkeypatch.setattr(biblioteca, 'TEMPO_LIMITE_CAPAS', 0.2)
+    assert biblioteca.obter_capas([f'{url}/lenta']) == {}
+
+
+@pytest.mark.parametrize('caminho', ['/grande', '/grande-sem-tamanho'])
+def test_capa_maior_que_o_limite_e_recusada(biblioteca_temporaria, servidor_capas, caminho):
+    url, _ = servidor_capas
+    assert biblioteca.obter_capas([f'{url}{caminho}']) == {}
+    assert not os.path.exists(biblioteca_temporaria.caminho(biblioteca.PASTA_CAPAS))
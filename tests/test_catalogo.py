@@ -0,0 +1,82 @@
+"""Importação de catálogos exportados (CSV/JSONL/Parquet)."""
+import json
+
+import pytest
+
+import biblioteca
+import duplicatas
+
+
+def escrever_jsonl(caminho, linhas):
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        for linha in linhas:
+            arquivo.write(json.dumps(linha) + '\n')
+
+
+def test_hash_repetido_no_arquivo_mantem_primeira_assinatura(biblioteca_temporaria, tmp_path):
+    caminho = str(tmp_path / 'catalogo.jsonl')
+    escrever_jsonl(caminho, [
+        {'titulo': 'Primeiro', 'autor': 'Autora A', 'hash_arquivo': 'abc'},
+        {'titulo': 'Segundo', 'autor': 'Autor B', 'hash_arquivo': 'abc'},
+        {'titulo': 'Sem hash', 'autor': None, 'hash_arquivo': None},
+        {'titulo': None, 'hash_arquivo': 'def'},
+    ])
+    relatorio = biblioteca.importar_livros(caminho)
+    assert relatorio == {'importados': 2, 'duplicados': 1, 'invalidos': 1}
+
+    with biblioteca.conexao_leitura() as conn:
+        assinatura = conn.execute("SELECT assinatura FROM assinaturas WHERE hash_arquivo = 'abc' AND tipo = 'metadados'").fetchone()[0]
+    assert assinatura == duplicatas.serializar(duplicatas.assinatura_metadados('Primeiro', 'Autora A'))
+
+
+def test_blocos_gravados_invalidam_cache_mesmo_com_erro(biblioteca_temporaria, tmp_path, monkeypatch):
+    assert biblioteca.obter_estatisticas()['total_livros'] == 0
+
+    def leitor_com_erro(caminho, tamanho_bloco):
+        yield [biblioteca.exportacao.normalizar_linha({'titulo': 'Gravado', 'hash_arquivo': 'h1'})]
+        raise ValueError('arquivo corrompido')
+
+    monkeypatch.setitem(biblioteca.exportacao.LEITORES, 'jsonl', leitor_com_erro)
+    with pytest.raises(ValueError):
+        biblioteca.importar_livros(str(tmp_path / 'catalogo.jsonl'))
+    assert biblioteca.obter_estatisticas()['total_livros'] == 1
+
+
+def anos_importados():
+    with biblioteca.conexao_leitura() as conn:
+        return dict(conn.execute('SELECT titulo, ano FROM livros'))
+
+
+def test_jsonl_normaliza_colunas_inteiras(biblioteca_temporaria, tmp_path):
+    caminho = tmp_path / 'catalogo.jsonl'
+    escrever_jsonl(str(caminho), [
+        {'titulo': 'Vazio', 'ano': '', 'hash_arquivo': 'zz'},
+        {'titulo': 'Sem data', 'ano': 's.d.', 'num_paginas': 'muitas', 'hash_arquivo': 'sd'},
+        {'titulo': 'Fração', 'ano': 1999.5, 'hash_arquivo': 'fr'},
+        {'titulo': 'Texto', 'ano': ' 2001 ', 'num_paginas': 120.0, 'hash_arquivo': 'tx'},
+        {'titulo': ['não', 'é', 'texto'], 'hash_arquivo': 'ls'},
+        [1, 2, 3],
+    ])
+    with open(caminho, 'a', encoding='utf-8') as arquivo:
+        arquivo.write('{"titulo": "cortado\n')
+
+    relatorio = biblioteca.importar_livros(str(caminho))
+    assert relatorio == {'importados': 4, 'duplicados': 0, 'invalidos': 3}
+    assert anos_importados() == {'Vazio': None, 'Sem data': None, 'Fração': None, 'Texto': 2001}
+    assert biblioteca.obter_estatisticas()['total_paginas'] == 120
+
+
+def test_csv_com_ano_invalido_nao_aborta(biblioteca_temporaria, tmp_path):
+    caminho = tmp_path / 'catalogo.csv'
+    caminho.write_text('titulo,ano,hash_arquivo\nA,abc,a\nB,1990,b\n', encoding='utf-8')
+    assert biblioteca.importar_livros(str(caminho))['importados'] == 2
+    assert anos_importados() == {'A': None, 'B': 1990}
+
+
+def test_parquet_normaliza_linhas(biblioteca_temporaria, tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    caminho = str(tmp_path / 'catalogo.parquet')
+    pq.write_table(pa.table({'titulo': ['A', 'B'], 'ano': ['1990', 's.d.'], 'hash_arquivo': ['a', 'b']}), caminho)
+    assert biblioteca.importar_livros(caminho)['importados'] == 2
+    assert anos_importados() == {'A': 1990, 'B': None}
@@ -0,0 +1,162 @@
+"""Enriquecimento em lote contra uma API de volumes local, com respostas 429 e lentas."""
+import argparse
+import asyncio
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import biblioteca
+import cli
+import enriquecimento
+from conftest import responder_json, servidor_local
+
+requests = pytest.importorskip('requests')
+
+
+# API de volumes: cada consulta recebe um 429 nas primeiras `erros_429` vezes (sempre, para os livros em
+# `sempre_429`) e depois o volume do livro
+@pytest.fixture
+def api_volumes():
+    estado = {'pedidos': 0, 'simultaneos': 0, 'maximo_simultaneos': 0, 'atraso': 0.05, 'erros_429': 1,
+              'sempre_429': set(), 'tentativas': {}}
+    lock = threading.Lock()
+
+    def responder(manipulador):
+        consulta = parse_qs(urlsplit(manipulador.path).query)['q'][0]
+        with lock:
+            estado['pedidos'] += 1
+            estado['simultaneos'] += 1
+            estado['maximo_simultaneos'] = max(estado['maximo_simultaneos'], estado['simultaneos'])
+            tentativa = estado['tentativas'][consulta] = estado['tentativas'].get(consulta, 0) + 1
+        titulo = consulta[len('intitle:'):]
+        numero = int(titulo.split()[-1])
+        try:
+            time.sleep(estado['atraso'])
+            if tentativa <= estado['erros_429'] or numero in estado['sempre_429']:
+                manipulador.send_response(429)
+                manipulador.send_header('Retry-After', '0')
+                manipulador.send_header('Content-Length', '0')
+                manipulador.end_headers()
+                return
+            # Os livros ímpares não existem na API
+            itens = [] if numero % 2 else [{'volumeInfo': {
+                'title': titulo, 'authors': [f'Autor {numero}'], 'categories': ['Romance'], 'publishedDate': '1899'
+            }}]
+            responder_json(manipulador, {'items': itens})
+        finally:
+            with lock:
+                estado['simultaneos'] -= 1
+
+    with servidor_local(responder) as url:
+        yield f'{url}/volumes', estado
+
+
+def livros(quantidade):
+    return [{'id': numero, 'titulo': f'Livro {numero}', 'autor': None, 'categoria': None, 'ano_incompleto': True}
+            for numero in range(1, quantidade + 1)]
+
+
+def test_balde_limita_a_taxa():
+    balde = enriquecimento.BaldeFichas(taxa=20, capacidade=2)
+
+    async def adquirir(vezes):
+        for _ in range(vezes):
+            await balde.adquirir()
+
+    inicio = time.monotonic()
+    asyncio.run(adquirir(10))
+    # 2 fichas de início e as outras 8 repostas a 20 por segundo
+    assert 0.38 <= time.monotonic() - inicio < 0.8
+
+
+def test_balde_com_relogio_controlado():
+    agora = [0.0]
+    balde = enriquecimento.BaldeFichas(taxa=1, capacidade=3, relogio=lambda: agora[0])
+
+    async def adquirir(vezes):
+        for _ in range(vezes):
+            await balde.adquirir()
+
+    asyncio.run(adquirir(3))
+    assert balde.fichas < 1
+    agora[0] = 2.0
+    asyncio.run(adquirir(2))
+    assert balde.fichas < 1
+
+
+def test_consulta_http_sem_novas_tentativas_levanta_erro_no_429(api_volumes):
+    url, _ = api_volumes
+    consultar = enriquecimento.criar_consulta_http(requests.Session(), url)
+    with pytest.raises(RuntimeError, match='429'):
+        consultar('intitle:Livro 2')
+    assert consultar('intitle:Livro 2')[0]['volumeInfo']['title'] == 'Livro 2'
+
+
+def test_consulta_http_repete_depois_do_429(api_volumes):
+    url, estado = api_volumes
+    consultar = enriquecimento.criar_consulta_http(biblioteca.obter_sessao_http(), url)
+    assert consultar('intitle:Livro 4')[0]['volumeInfo']['authors'] == ['Autor 4']
+    assert estado['tentativas']['intitle:Livro 4'] == 2
+
+
+def test_enriquecimento_respeita_concorrencia_e_taxa(api_volumes):
+    url, estado = api_volumes
+    consultar_api = enriquecimento.criar_consulta_http(biblioteca.obter_sessao_http(), url)
+    inicios = []
+
+    def consultar(consulta):
+        inicios.append(time.monotonic())
+        return consultar_api(consulta)
+
+    gravados = []
+    relatorio = enriquecimento.enriquecer_livros(
+        livros(12), consultar, gravados.extend, taxa=10, rajada=2, concorrencia=3, tamanho_lote=5
+    )
+
+    assert estado['maximo_simultaneos'] <= 3
+    # Depois da rajada, no máximo `taxa` consultas por segundo
+    inicios.sort()
+    for i in range(2, len(inicios)):
+        assert inicios[i] - inicios[0] >= (i - 2) / 10 - 0.02
+    assert relatorio == {'atualizados': 6, 'sem_resultado': 6, 'erros': 0}
+
+
+def test_cada_livro_recebe_um_resultado(api_volumes):
+    url, estado = api_volumes
+    # Sem novas tentativas, os livros múltiplos de 4 recebem 429 e viram erro
+    estado['erros_429'] = 0
+    estado['sempre_429'] = {4, 8, 12, 16, 20}
+    consultar = enriquecimento.criar_consulta_http(requests.Session(), url)
+
+    gravados = []
+    relatorio = enriquecimento.enriquecer_livros(
+        livros(20), consultar, gravados.extend, taxa=100, rajada=20, concorrencia=4, tamanho_lote=3
+    )
+
+    assert sorted(livro_id for livro_id, _, _ in gravados) == list(range(1, 21))
+    status = {livro_id: status for livro_id, status, _ in gravados}
+    assert status[2] == 'atualizado' and status[3] == 'sem_resultado' and status[4] == 'erro'
+    assert relatorio == {'atualizados': 5, 'sem_resultado': 10, 'erros': 5}
+    campos = {livro_id: campos for livro_id, _, campos in gravados}
+    assert campos[2] == {'autor': 'Autor 2', 'categoria': 'Romance', 'ano': 1899}
+
+
+def test_comando_enrich(api_volumes, biblioteca_temporaria, monkeypatch, capsys):
+    url, estado = api_volumes
+    estado['atraso'] = 0
+    monkeypatch.setattr(biblioteca, 'URL_GOOGLE_BOOKS', url)
+    with biblioteca.conexao_escrita() as conn:
+        conn.executemany('INSERT INTO livros (titulo, hash_arquivo) VALUES (?, ?)',
+                         [(f'Livro {numero}', f'h{numero}') for numero in (2, 3)])
+    args = argparse.Namespace(limite=None, taxa=100.0, repetir_sem_resultado=False, intervalo=None,
+                              credenciais=None, api_key=None)
+
+    assert cli.comando_enrich(args) == 0
+    assert '1 atualizado(s), 1 sem resultado, 0 erro(s)' in capsys.readouterr().out
+    with biblioteca.conexao_leitura() as conn:
+        assert conn.execute("SELECT autor, ano FROM livros WHERE titulo = 'Livro 2'").fetchone() == ('Autor 2', 1899)
+    # Na próxima execução não há livros pendentes
+    assert cli.comando_enrich(args) == 0
+    assert '0 atualizado(s), 0 sem resultado' in capsys.readouterr().out
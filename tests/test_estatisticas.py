@@ -0,0 +1,62 @@
+"""Agregados das estatísticas mantidos por gatilhos."""
+import sqlite3
+
+import biblioteca
+
+
+def inserir(conn, titulo, autor, categoria, ano, num_paginas=10):
+    conn.execute('''
+        INSERT INTO livros (titulo, autor, categoria, ano, num_paginas, hash_arquivo)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (titulo, autor, categoria, ano, num_paginas, f'hash-{titulo}'))
+
+
+def povoar():
+    with biblioteca.conexao_escrita() as conn:
+        inserir(conn, 'A', 'Machado', 'Romance', 1899)
+        inserir(conn, 'B', 'Machado', 'Conto', '')
+        inserir(conn, 'C', 'Alencar', 'Romance', 's.d.')
+        inserir(conn, 'D', None, None, 1999.5)
+        inserir(conn, 'E', 'Lispector', 'Romance', None)
+
+
+def test_ano_nao_inteiro_nao_aborta_alteracao(biblioteca_temporaria):
+    povoar()
+    with biblioteca.conexao_escrita() as conn:
+        conn.execute("UPDATE livros SET ano = 's.d.' WHERE titulo = 'A'")
+    assert dict(biblioteca.obter_livros_por_ano()) == {'': 1, 's.d.': 2, 1999.5: 1}
+    assert biblioteca.obter_estatisticas()['total_livros'] == 5
+
+
+def test_recalcular_sobre_banco_povoado(biblioteca_temporaria):
+    povoar()
+    antes = (biblioteca.obter_estatisticas(), dict(biblioteca.obter_livros_por_categoria()),
+             dict(biblioteca.obter_livros_por_ano()))
+    assert antes[0] == {'total_livros': 5, 'total_paginas': 50, 'total_autores': 3, 'total_categorias': 2}
+
+    with biblioteca.conexao_escrita() as conn:
+        biblioteca.recalcular_estatisticas(conn.cursor())
+    biblioteca.invalidar_consultas()
+    depois = (biblioteca.obter_estatisticas(), dict(biblioteca.obter_livros_por_categoria()),
+              dict(biblioteca.obter_livros_por_ano()))
+    assert depois == antes
+
+
+def test_migracao_recria_estatisticas_anos(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'antigo.db'))
+    c = conn.cursor()
+    for _, migracao in biblioteca.MIGRACOES[:5]:
+        migracao(c)
+    # Tabela como era criada até a versão 5
+    c.executescript('''
+        DROP TABLE estatisticas_anos;
+        CREATE TABLE estatisticas_anos (ano INTEGER PRIMARY KEY, total INTEGER NOT NULL);
+        INSERT INTO livros (titulo, ano, hash_arquivo) VALUES ('A', 1990, 'a'), ('B', 1990, 'b');
+    ''')
+    c.execute('PRAGMA user_version = 5')
+    conn.commit()
+
+    biblioteca.aplicar_migracoes(c)
+    c.execute("INSERT INTO livros (titulo, ano, hash_arquivo) VALUES ('C', '', 'c')")
+    assert set(c.execute('SELECT ano, total FROM estatisticas_anos')) == {(1990, 2), ('', 1)}
+    conn.close()
@@ -0,0 +1,52 @@
+"""Importação em lote: processos auxiliares e gravação dos lotes."""
+import random
+
+import pytest
+
+import benchmark
+import biblioteca
+import duplicatas
+
+pytest.importorskip('PyPDF2')
+
+
+@pytest.fixture
+def pasta_pdfs(tmp_path):
+    pasta = tmp_path / 'entrada'
+    pasta.mkdir()
+    for numero in range(4):
+        (pasta / f'livro{numero}.pdf').write_bytes(
+            benchmark.gerar_pdf(2, f'Livro {numero}', f'Autor {numero}', random.Random(numero)))
+    # Cópia de um dos livros com outro nome
+    (pasta / 'copia.pdf').write_bytes((pasta / 'livro0.pdf').read_bytes())
+    return str(pasta)
+
+
+def test_importar_pasta(biblioteca_temporaria, pasta_pdfs):
+    for _, _, _, relatorio in biblioteca.importar_em_lote(pasta_pdfs, max_workers=2):
+        pass
+    assert relatorio['importados'] == 4
+    assert relatorio['duplicados'] == 1
+    assert relatorio['erros'] == []
+    assert biblioteca.obter_estatisticas()['total_livros'] == 4
+
+
+def test_lote_nao_sobrescreve_assinatura_de_livro_existente(biblioteca_temporaria, pasta_pdfs):
+    for _ in biblioteca.importar_em_lote(pasta_pdfs, max_workers=2):
+        pass
+    with biblioteca.conexao_leitura() as conn:
+        hash_arquivo, titulo, autor = conn.execute(
+            "SELECT hash_arquivo, titulo, autor FROM livros WHERE titulo = 'Livro 1'").fetchone()
+        original = conn.execute("SELECT assinatura FROM assinaturas WHERE hash_arquivo = ? AND tipo = 'metadados'",
+                                (hash_arquivo,)).fetchone()[0]
+
+    # O mesmo arquivo chega de novo com outros metadados: a linha é ignorada e a assinatura fica
+    dados = {'titulo': 'Outro título', 'autor': 'Outra pessoa', 'ano': None, 'categoria': None, 'idioma': None,
+             'num_paginas': 2, 'tamanho_kb': 1, 'hash_arquivo': hash_arquivo, 'nome_arquivo': 'x.pdf', 'notas': None}
+    assert biblioteca.gravar_lote_importacao([((biblioteca.localizar_pdf(hash_arquivo), None), dados)]) == 0
+
+    with biblioteca.conexao_leitura() as conn:
+        atual = conn.execute("SELECT assinatura FROM assinaturas WHERE hash_arquivo = ? AND tipo = 'metadados'",
+                             (hash_arquivo,)).fetchone()[0]
+    assert atual == original
+    assert duplicatas.serializar(duplicatas.assinatura_metadados(titulo, autor)) == original
@@ -0,0 +1,38 @@
+"""Leitura de PDFs em processos auxiliares, com limites de tempo e de memória."""
+import random
+import time
+
+import pytest
+
+import benchmark
+import ingestao
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    caminho = tmp_path / 'livro.pdf'
+    caminho.write_bytes(benchmark.gerar_pdf(3, 'Dom Casmurro', 'Machado de Assis', random.Random(1)))
+    return str(caminho)
+
+
+def test_processos_auxiliares_nao_usam_fork():
+    assert ingestao.contexto_processos().get_start_method() in ('forkserver', 'spawn')
+
+
+def test_metadados_lidos_em_processo_separado(pdf):
+    pytest.importorskip('PyPDF2')
+    metadata = ingestao.sondar_metadata_com_limites(pdf)
+    assert metadata['num_paginas'] == 3
+    assert metadata['titulo'] == 'Dom Casmurro'
+
+
+def test_tempo_limite():
+    inicio = time.monotonic()
+    with pytest.raises(TimeoutError):
+        ingestao.executar_com_limites(time.sleep, 30, tempo=1)
+    assert time.monotonic() - inicio < 10
+
+
+def test_erro_da_funcao_vira_runtime_error(tmp_path):
+    with pytest.raises(RuntimeError, match='FileNotFoundError'):
+        ingestao.executar_com_limites(ingestao.sondar_metadata_arquivo, str(tmp_path / 'ausente.pdf'))
@@ -0,0 +1,43 @@
+"""Planos de execução das consultas frequentes: nenhuma pode voltar a varrer a tabela livros."""
+import pytest
+
+import biblioteca
+from conftest import biblioteca_em
+
+NOMES_CONSULTAS = [nome for nome, _, _ in biblioteca.consultas_frequentes()]
+
+CATEGORIAS = ['Romance', 'Poesia', 'História', 'Ciência', None]
+IDIOMAS = ['Português', 'Inglês', None]
+
+
+# Alguns milhares de livros e estatísticas do planejador, como em uma biblioteca real
+@pytest.fixture(scope='module')
+def planos(tmp_path_factory):
+    with biblioteca_em(tmp_path_factory.mktemp('planos')):
+        with biblioteca.conexao_escrita() as conn:
+            conn.executemany(
+                'INSERT INTO livros (titulo, autor, ano, categoria, idioma, num_paginas, hash_arquivo, data_adicao) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(f'Livro {i}', f'Autor {i % 300}', 1900 + i % 120, CATEGORIAS[i % len(CATEGORIAS)],
+                  IDIOMAS[i % len(IDIOMAS)], 100 + i % 400, f'{i:032x}',
+                  f'2024-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}')
+                 for i in range(3000)]
+            )
+            conn.execute('ANALYZE')
+        return {nome: (passos, varridas) for nome, passos, varridas in biblioteca.verificar_planos_consultas()}
+
+@pytest.mark.parametrize('nome', NOMES_CONSULTAS)
+def test_consulta_nao_varre_livros(planos, nome):
+    passos, varridas = planos[nome]
+    assert 'livros' not in varridas, f'{nome}: {passos}'
+    assert varridas == [], f'{nome}: {passos}'
+
+
+@pytest.mark.parametrize('nome', NOMES_CONSULTAS)
+def test_consulta_usa_indice(planos, nome):
+    passos, _ = planos[nome]
+    assert any('USING' in passo or 'VIRTUAL TABLE' in passo for passo in passos), f'{nome}: {passos}'
+
+
+def test_todas_as_consultas_verificadas(planos):
+    assert sorted(planos) == sorted(NOMES_CONSULTAS)
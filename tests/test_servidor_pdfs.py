@@ -0,0 +1,146 @@
+"""Servidor de PDFs: links assinados, Range, If-Range e GET condicional."""
+import http.client
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import pytest
+
+import servidor_pdfs
+
+CHAVE = b'chave-de-teste'
+HASH = '0123456789abcdef0123456789abcdef'
+CONTEUDO = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def servidor(tmp_path):
+    caminho = tmp_path / f'{HASH}.pdf'
+    caminho.write_bytes(CONTEUDO)
+
+    def localizar(hash_arquivo, biblioteca):
+        return str(caminho) if hash_arquivo == HASH else None
+
+    servidor = servidor_pdfs.ServidorPDFs(('127.0.0.1', 0), localizar, CHAVE, max_conexoes=4, silencioso=True)
+    threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True).start()
+    try:
+        yield servidor.server_address[1]
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+@contextmanager
+def conexao(porta):
+    conn = http.client.HTTPConnection('127.0.0.1', porta, timeout=5)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def caminho_link(validade=60, hash_arquivo=HASH):
+    url = urlsplit(servidor_pdfs.gerar_link('http://x', CHAVE, hash_arquivo, validade=validade))
+    return f'{url.path}?{url.query}'
+
+
+def pedir(porta, cabecalhos=None, metodo='GET', caminho=None):
+    with conexao(porta) as conn:
+        conn.request(metodo, caminho or caminho_link(), headers=cabecalhos or {})
+        resposta = conn.getresponse()
+        return resposta, resposta.read()
+
+
+def test_arquivo_inteiro(servidor):
+    resposta, corpo = pedir(servidor)
+    assert resposta.status == 200
+    assert corpo == CONTEUDO
+    assert resposta.getheader('Accept-Ranges') == 'bytes'
+    assert resposta.getheader('ETag') == f'"{HASH}"'
+
+
+@pytest.mark.parametrize('pedido, inicio, fim', [
+    ('bytes=10-19', 10, 19),
+    ('bytes=10000-', 10000, len(CONTEUDO) - 1),
+    ('bytes=-100', len(CONTEUDO) - 100, len(CONTEUDO) - 1),
+    ('bytes=0-999999', 0, len(CONTEUDO) - 1),
+])
+def test_range(servidor, pedido, inicio, fim):
+    resposta, corpo = pedir(servidor, {'Range': pedido})
+    assert resposta.status == 206
+    assert resposta.getheader('Content-Range') == f'bytes {inicio}-{fim}/{len(CONTEUDO)}'
+    assert corpo == CONTEUDO[inicio:fim + 1]
+
+
+@pytest.mark.parametrize('pedido', ['bytes=99999-', 'bytes=-0', 'bytes=20-10'])
+def test_range_nao_satisfazivel(servidor, pedido):
+    resposta, corpo = pedir(servidor, {'Range': pedido})
+    assert resposta.status == 416
+    assert resposta.getheader('Content-Range') == f'bytes */{len(CONTEUDO)}'
+    assert corpo == b''
+
+
+@pytest.mark.parametrize('if_none_match', [f'"{HASH}"', f'W/"{HASH}"', f'"outro", "{HASH}"', '*'])
+def test_if_none_match(servidor, if_none_match):
+    resposta, corpo = pedir(servidor, {'If-None-Match': if_none_match})
+    assert resposta.status == 304
+    assert corpo == b''
+
+
+def test_if_none_match_diferente(servidor):
+    resposta, corpo = pedir(servidor, {'If-None-Match': '"outro"'})
+    assert resposta.status == 200
+    assert corpo == CONTEUDO
+
+
+def test_if_range(servidor):
+    resposta, corpo = pedir(servidor, {'Range': 'bytes=0-9', 'If-Range': f'"{HASH}"'})
+    assert resposta.status == 206
+    assert corpo == CONTEUDO[:10]
+
+    # Validador de uma versão anterior: o intervalo é ignorado e vai o arquivo inteiro
+    resposta, corpo = pedir(servidor, {'Range': 'bytes=0-9', 'If-Range': '"versao-antiga"'})
+    assert resposta.status == 200
+    assert corpo == CONTEUDO
+    resposta, corpo = pedir(servidor, {'Range': 'bytes=0-9', 'If-Range': 'Thu, 01 Jan 1970 00:00:00 GMT'})
+    assert resposta.status == 200
+    assert corpo == CONTEUDO
+
+
+def test_links_invalidos(servidor):
+    caminho = caminho_link()
+    adulterado = caminho.replace('assinatura=', 'assinatura=0')
+    assert pedir(servidor, caminho=adulterado)[0].status == 403
+    assert pedir(servidor, caminho=caminho.replace(HASH, 'f' * 32))[0].status == 403
+    assert pedir(servidor, caminho=caminho.split('?')[0])[0].status == 403
+
+    expirado = caminho_link(validade=-1)
+    assert pedir(servidor, caminho=expirado)[0].status == 403
+
+
+def test_link_expira(servidor, monkeypatch):
+    caminho = caminho_link(validade=1)
+    assert pedir(servidor, caminho=caminho)[0].status == 200
+    agora = time.time()
+    monkeypatch.setattr(servidor_pdfs.time, 'time', lambda: agora + 5)
+    assert pedir(servidor, caminho=caminho)[0].status == 403
+
+
+def test_pdf_inexistente(servidor):
+    outro = 'f' * 32
+    assert pedir(servidor, caminho=caminho_link(hash_arquivo=outro))[0].status == 404
+
+
+def test_head_sem_corpo(servidor):
+    with conexao(servidor) as conn:
+        conn.request('HEAD', caminho_link())
+        resposta = conn.getresponse()
+        assert resposta.status == 200
+        assert resposta.getheader('Content-Length') == str(len(CONTEUDO))
+        assert resposta.read() == b''
+        # Na mesma conexão (keep-alive): um corpo enviado pelo HEAD corromperia a próxima resposta
+        conn.request('GET', caminho_link(), headers={'Range': 'bytes=0-3'})
+        resposta = conn.getresponse()
+        assert resposta.status == 206
+        assert resposta.read() == CONTEUDO[:4]
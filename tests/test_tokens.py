@@ -0,0 +1,98 @@
+"""Cache de tokens da conta de serviço contra um endpoint OAuth local (token_uri)."""
+import threading
+import time
+from urllib.parse import parse_qs
+
+import pytest
+
+import biblioteca
+from conftest import responder_json, servidor_local
+
+jwt = pytest.importorskip('jwt')
+rsa = pytest.importorskip('cryptography.hazmat.primitives.asymmetric.rsa')
+serialization = pytest.importorskip('cryptography.hazmat.primitives.serialization')
+
+
+@pytest.fixture(scope='module')
+def chave_privada():
+    chave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = chave.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                              serialization.NoEncryption()).decode()
+    return chave.public_key(), pem
+
+
+# Endpoint de token: confere a asserção JWT e emite token-1, token-2, ... com a validade pedida
+@pytest.fixture
+def endpoint_token(chave_privada):
+    chave_publica, pem = chave_privada
+    estado = {'pedidos': 0, 'expires_in': 3600, 'atraso': 0.0}
+    lock = threading.Lock()
+
+    def responder(manipulador):
+        dados = parse_qs(manipulador.rfile.read(int(manipulador.headers['Content-Length'])).decode())
+        assert dados['grant_type'] == ['urn:ietf:params:oauth:grant-type:jwt-bearer']
+        claims = jwt.decode(dados['assertion'][0], chave_publica, algorithms=['RS256'],
+                            audience=f'{url}/token')
+        assert claims['iss'] == 'leitor@exemplo.iam.gserviceaccount.com'
+        time.sleep(estado['atraso'])
+        with lock:
+            estado['pedidos'] += 1
+            token = f"token-{estado['pedidos']}"
+        responder_json(manipulador, {'access_token': token, 'expires_in': estado['expires_in']})
+
+    with servidor_local(responder) as url:
+        conta = {
+            'client_email': 'leitor@exemplo.iam.gserviceaccount.com',
+            'private_key': pem,
+            'private_key_id': 'chave-teste',
+            'token_uri': f'{url}/token',
+        }
+        yield conta, estado
+
+
+def obter(cache, conta):
+    return cache.obter(biblioteca.chave_conta_servico(conta),
+                       lambda: biblioteca.solicitar_token_service_account(conta))
+
+
+def test_token_reutilizado_antes_de_expirar(endpoint_token):
+    conta, estado = endpoint_token
+    cache = biblioteca.CacheTokens()
+
+    assert obter(cache, conta) == 'token-1'
+    assert obter(cache, conta) == 'token-1'
+    assert estado['pedidos'] == 1
+
+
+def test_token_renovado_dentro_da_margem(endpoint_token):
+    conta, estado = endpoint_token
+    # Expira em 2 s com margem de 1,5 s: reutilizado no primeiro meio segundo e renovado depois
+    estado['expires_in'] = 2
+    cache = biblioteca.CacheTokens(margem=1.5)
+
+    assert obter(cache, conta) == 'token-1'
+    assert obter(cache, conta) == 'token-1'
+    time.sleep(0.6)
+    assert obter(cache, conta) == 'token-2'
+    assert estado['pedidos'] == 2
+
+
+def test_chamadas_simultaneas_fazem_uma_renovacao(endpoint_token):
+    conta, estado = endpoint_token
+    estado['atraso'] = 0.3
+    cache = biblioteca.CacheTokens()
+    barreira = threading.Barrier(10)
+    tokens = []
+
+    def sessao():
+        barreira.wait()
+        tokens.append(obter(cache, conta))
+
+    threads = [threading.Thread(target=sessao) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert tokens == ['token-1'] * 10
+    assert estado['pedidos'] == 1